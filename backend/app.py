@@ -1,20 +1,45 @@
+import os
+
+import click
 from flask import Flask
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 from routes.books_routes import books_bp
 from routes.users_routes import users_bp
+from routes.metrics_routes import metrics_bp
+from controllers.stats_controller import rebuild_all_stats
+from controllers import holds_controller
+from utils import cache
+from middleware import rate_limit
+from utils import metrics
+from utils import slow_queries
+from utils import events
 import database
 
 
-def create_app():
+def create_app(init_db=True):
+    """
+    init_db=False skips schema creation/migrations, for servers that run
+    database.init_db() once before starting their workers.
+    """
     app = Flask(__name__)
 
-    app.secret_key = "supersecretkey"
+    app.secret_key = os.environ.get("LIBRARY_SECRET_KEY", "supersecretkey")
 
     app.config.update(
         SESSION_COOKIE_HTTPONLY=True,
         SESSION_COOKIE_SAMESITE="Lax",
         SESSION_COOKIE_SECURE=False,
     )
+    # optional Python settings file, e.g. SECRET_KEY, SESSION_COOKIE_SECURE,
+    # CACHE_BACKEND, RATE_LIMIT_BACKEND, EVENTS_BACKEND, HOLD_PICKUP_HOURS,
+    # TRUSTED_PROXIES
+    app.config.from_envvar("LIBRARY_SETTINGS", silent=True)
+
+    # client address from X-Forwarded-For, for the per-IP rate limits
+    proxies = app.config.get("TRUSTED_PROXIES", rate_limit.TRUSTED_PROXIES)
+    if proxies:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies)
 
     CORS(
         app,
@@ -22,11 +47,26 @@ def create_app():
         origins=["http://localhost:5173", "http://127.0.0.1:5173"],
     )
 
-    database.init_db()
+    database.init_app(app)
+    if init_db:
+        database.init_db()
+    cache.init_app(app)
+    rate_limit.init_app(app)
+    metrics.init_app(app)
+    slow_queries.init_app(app)
+    events.init_app(app)
+    holds_controller.init_app(app)
 
     # Register blueprints
     app.register_blueprint(books_bp)
     app.register_blueprint(users_bp)
+    app.register_blueprint(metrics_bp)
+
+    @app.cli.command("rebuild-stats")
+    def rebuild_stats_command():
+        """Recompute the admin dashboard counters from checkout_history."""
+        rebuild_all_stats()
+        click.echo("Dashboard stats rebuilt")
 
     return app
 
@@ -0,0 +1,107 @@
+"""
+Async application factory: the read-heavy part of the API on Quart, served
+by an ASGI server so one process can hold thousands of idle or polling
+connections without a thread each.
+
+It serves only these endpoints (routes/async_routes.py):
+    GET  /books, /books/search, /books/<id>, /books/history/<id>
+    POST /books/checkout/<id>, /books/return/<id>, /books/return/<entry>/<id>
+    GET  /me, /users/history/<id>, /admin/history, /admin/dashboard
+    POST /register, /login, /logout
+Everything else (book and copy management, holds, bulk import/export, ETags,
+/books/changes, /books/events, user administration, profile and password
+changes) is only on the Flask app, so run the two side by side behind a
+proxy that routes the rest to Flask. Side by side they are separate
+processes: set LIBRARY_CACHE_BACKEND=sqlite and LIBRARY_EVENTS_BACKEND=sqlite
+for both, or writes through this app neither invalidate the Flask app's
+response cache nor reach its /books/events streams.
+
+    pip install quart hypercorn
+    hypercorn "async_app:create_async_app()" --bind 0.0.0.0:5000
+
+Database work runs on the DB executor (database.run_db); a long
+/admin/history stream gives its executor thread back between chunks, so it
+doesn't hold back short requests like /me. Executor threads wait at most
+DB_EXECUTOR_POOL_TIMEOUT for a pooled connection and the request gets a 503.
+"""
+
+import os
+
+from quart import Quart, jsonify, request
+
+import database
+from controllers import holds_controller
+from middleware import rate_limit
+from routes.async_routes import async_books_bp, async_users_bp
+from utils import cache, events
+
+CORS_ORIGINS = ("http://localhost:5173", "http://127.0.0.1:5173")
+
+# seconds a client should wait after a 503 for a full connection pool
+POOL_RETRY_AFTER = 1
+
+
+def _cors(response):
+    origin = request.headers.get("Origin")
+    if origin in CORS_ORIGINS:
+        response.headers["Access-Control-Allow-Origin"] = origin
+        response.headers["Access-Control-Allow-Credentials"] = "true"
+        response.headers["Access-Control-Allow-Headers"] = "Content-Type"
+        response.headers["Access-Control-Allow-Methods"] = (
+            "GET, POST, PUT, DELETE, OPTIONS"
+        )
+        response.headers["Vary"] = "Origin"
+    return response
+
+
+def create_async_app(init_db=True):
+    app = Quart(__name__)
+
+    app.secret_key = os.environ.get("LIBRARY_SECRET_KEY", "supersecretkey")
+
+    app.config.update(
+        SESSION_COOKIE_HTTPONLY=True,
+        SESSION_COOKIE_SAMESITE="Lax",
+        SESSION_COOKIE_SECURE=False,
+    )
+    app.config.from_envvar("LIBRARY_SETTINGS", silent=True)
+
+    # client address from X-Forwarded-For, for the per-IP rate limits
+    proxies = app.config.get("TRUSTED_PROXIES", rate_limit.TRUSTED_PROXIES)
+    if proxies:
+        from hypercorn.middleware import ProxyFixMiddleware
+
+        app.asgi_app = ProxyFixMiddleware(app.asgi_app, trusted_hops=proxies)
+
+    if init_db:
+        database.init_db()
+    # controllers still invalidate the response cache, look up the cached
+    # session user and publish /books/events, so these need configuring too
+    cache.init_app(app)
+    rate_limit.init_app(app)
+    events.init_app(app)
+
+    app.after_request(_cors)
+
+    @app.errorhandler(database.PoolTimeout)
+    async def pool_busy(e):
+        response = jsonify({"message": "Server busy, try again shortly"})
+        response.headers["Retry-After"] = str(POOL_RETRY_AFTER)
+        return response, 503
+
+    @app.before_serving
+    async def start_background():
+        if database.profile_pragmas().get("journal_mode", "").upper() == "WAL":
+            database.start_checkpointer()
+        holds_controller.start_sweeper()
+
+    @app.after_serving
+    async def stop_background():
+        holds_controller.stop_sweeper()
+        database.shutdown_db_executor()
+        database.close_pools()
+
+    app.register_blueprint(async_books_bp)
+    app.register_blueprint(async_users_bp)
+
+    return app
@@ -0,0 +1,287 @@
+"""
+Latency and throughput of the real endpoints on a seeded database.
+
+    python -m benchmarks.endpoints --loans 1000000 --concurrency 8 --out run.json
+
+Seeds a scratch database (or reuses --db), then drives each scenario at a
+fixed concurrency through the Flask test client and through a local WSGI
+server, and writes p50/p95/p99 latency and requests/sec as JSON so runs can
+be compared across commits.
+"""
+
+import argparse
+import http.cookiejar
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from werkzeug.serving import make_server
+
+import database
+import generate_data
+from app import create_app
+from middleware.rate_limit import limiter
+from utils.cache import cache
+
+# name -> (role, share of --requests, request(worker, i, ctx) -> (method, path, body))
+SCENARIOS = {
+    "books": ("member", 1.0, lambda w, i, ctx: ("GET", "/books?limit=50", None)),
+    "login": (
+        None,
+        0.25,
+        lambda w, i, ctx: (
+            "POST",
+            "/login",
+            {"email": ctx.emails[w], "password": generate_data.DEFAULT_PASSWORD},
+        ),
+    ),
+    "checkout": (
+        "member",
+        1.0,
+        lambda w, i, ctx: ("POST", f"/books/checkout/{ctx.book_for(w, i)}", None),
+    ),
+    "admin_dashboard": (
+        "admin",
+        1.0,
+        lambda w, i, ctx: ("GET", "/admin/dashboard", None),
+    ),
+    # streams the whole history; keep the count low on big datasets
+    "admin_history": (
+        "admin",
+        0.05,
+        lambda w, i, ctx: ("GET", "/admin/history", None),
+    ),
+}
+
+
+class TestClientSession:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None):
+        r = self.client.open(path, method=method, json=body)
+        r.get_data()
+        return r.status_code
+
+
+class HttpSession:
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        )
+
+    def request(self, method, path, body=None):
+        data = None
+        headers = {}
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        req = urllib.request.Request(
+            self.base_url + path, data=data, headers=headers, method=method
+        )
+        try:
+            with self.opener.open(req) as r:
+                r.read()
+                return r.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+
+class Context:
+    def __init__(self, concurrency, available_ids, emails):
+        self.concurrency = concurrency
+        self.available_ids = available_ids
+        self.emails = emails  # one active member per worker
+
+    def book_for(self, worker, i):
+        # workers never contend for the same copy
+        slots = len(self.available_ids)
+        return self.available_ids[(i * self.concurrency + worker) % slots]
+
+
+def _login(session, role, email):
+    if role is None:
+        return
+    if role == "admin":
+        email = generate_data.ADMIN_EMAIL
+    body = {"email": email, "password": generate_data.DEFAULT_PASSWORD}
+    status = session.request("POST", "/login", body)
+    if status != 200:
+        raise RuntimeError(f"Benchmark login failed for {email}: {status}")
+
+
+def _percentile(latencies, p):
+    return latencies[max(0, int(round(len(latencies) * p)) - 1)]
+
+
+def run_scenario(name, make_session, concurrency, requests, ctx):
+    role, share, build = SCENARIOS[name]
+    total = max(concurrency, int(requests * share))
+    per_worker = [
+        total // concurrency + (w < total % concurrency) for w in range(concurrency)
+    ]
+    latencies = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+    sessions = []
+    for w in range(concurrency):
+        session = make_session()
+        _login(session, role, ctx.emails[w])
+        sessions.append(session)
+    barrier = threading.Barrier(concurrency + 1)
+
+    def worker(w):
+        session = sessions[w]
+        barrier.wait()
+        for i in range(per_worker[w]):
+            method, path, body = build(w, i, ctx)
+            start = time.perf_counter()
+            status = session.request(method, path, body)
+            latencies[w].append(time.perf_counter() - start)
+            if status >= 400:
+                errors[w] += 1
+            if name == "checkout" and status == 200:
+                # untimed: put the copy back so the catalogue stays stable
+                session.request("POST", path.replace("checkout", "return"))
+
+    threads = [threading.Thread(target=worker, args=(w,)) for w in range(concurrency)]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    flat = sorted(x for chunk in latencies for x in chunk)
+    return {
+        "scenario": name,
+        "concurrency": concurrency,
+        "requests": len(flat),
+        "errors": sum(errors),
+        "p50_ms": round(_percentile(flat, 0.50) * 1000, 3),
+        "p95_ms": round(_percentile(flat, 0.95) * 1000, 3),
+        "p99_ms": round(_percentile(flat, 0.99) * 1000, 3),
+        "throughput_rps": round(len(flat) / elapsed, 1),
+    }
+
+
+def _context(concurrency):
+    conn = database.get_connection()
+    books = conn.execute(
+        "SELECT id FROM books WHERE available = 1 ORDER BY id"
+    ).fetchall()
+    members = conn.execute(
+        "SELECT email FROM users WHERE role = 'member' AND is_active = 1 "
+        "ORDER BY id LIMIT ?",
+        (concurrency,),
+    ).fetchall()
+    conn.close()
+    if len(members) < concurrency:
+        raise SystemExit("Not enough active members for this --concurrency")
+    return Context(concurrency, [r["id"] for r in books], [r["email"] for r in members])
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args, db_path):
+    database.close_pools()
+    database.DB_NAME = db_path
+    database.POOL_SIZE = args.concurrency + 2
+
+    dataset = None
+    if not (args.db and os.path.exists(args.db)):
+        dataset = generate_data.generate(
+            args.users, args.books, args.loans, seed=args.seed
+        )
+
+    app = create_app()
+    # measure the endpoints, not the login throttle
+    limiter.configure("none")
+    if args.no_cache:
+        cache.configure("none", 0)
+
+    ctx = _context(args.concurrency)
+    modes = {"test_client": lambda: TestClientSession(app)}
+    server = None
+    if "wsgi" in args.modes:
+        server = make_server("127.0.0.1", 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+        modes["wsgi"] = lambda: HttpSession(base_url)
+
+    results = []
+    try:
+        for mode in args.modes:
+            for name in args.scenarios:
+                result = run_scenario(
+                    name, modes[mode], args.concurrency, args.requests, ctx
+                )
+                results.append({"mode": mode, **result})
+    finally:
+        if server is not None:
+            server.shutdown()
+        database.close_pools()
+
+    return {
+        "commit": _commit(),
+        "dataset": dataset or {"db": args.db},
+        "cache": not args.no_cache,
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--books", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--loans", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--db", help="reuse (or create and keep) this database")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS)
+    )
+    parser.add_argument(
+        "--modes",
+        nargs="+",
+        choices=["test_client", "wsgi"],
+        default=["test_client", "wsgi"],
+    )
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    if args.db:
+        report = run(args, args.db)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            report = run(args, os.path.join(tmp, "bench.db"))
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
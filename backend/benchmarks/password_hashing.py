@@ -0,0 +1,121 @@
+"""
+Password hashing cost, and catalogue read latency during a login storm.
+
+    python -m benchmarks.password_hashing --storm-threads 16 --seconds 5
+
+Part 1 times one hash for each scrypt N / PBKDF2 iteration count.
+Part 2 runs validate_user() from many threads while another thread reads
+books, and reports the readers' p50/p95 latency with and without the storm.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+import database
+from utils import passwords
+from controllers.book_controllers import add_book, get_book
+from controllers.users_controller import create_user, validate_user
+
+
+def time_hash(scheme, **settings):
+    for name, value in settings.items():
+        setattr(passwords, name, value)
+    passwords.PASSWORD_SCHEME = scheme
+
+    samples = []
+    for _ in range(3):
+        start = time.perf_counter()
+        passwords._hash("correct horse battery staple")
+        samples.append(time.perf_counter() - start)
+    return {"scheme": scheme, **settings, "ms": round(min(samples) * 1000, 1)}
+
+
+def _read_latencies(seconds, stop_early):
+    latencies = []
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline and not stop_early.is_set():
+        start = time.perf_counter()
+        get_book(1)
+        latencies.append(time.perf_counter() - start)
+        time.sleep(0.001)
+    return latencies
+
+
+def _summary(latencies):
+    latencies = sorted(latencies)
+    return {
+        "reads": len(latencies),
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 3),
+    }
+
+
+def login_storm(threads, seconds):
+    with tempfile.TemporaryDirectory() as tmp:
+        database.close_pools()
+        database.DB_NAME = os.path.join(tmp, "bench.db")
+        database.init_db()
+        create_user("Bench", "bench@test.com", "pass", "member")
+        add_book("Book", "Author", 2000, "EN")
+
+        stop = threading.Event()
+        baseline = _summary(_read_latencies(seconds / 2, stop))
+
+        logins = [0]
+        rejected = [0]
+
+        def stormer():
+            while not stop.is_set():
+                try:
+                    validate_user("bench@test.com", "wrong")
+                    logins[0] += 1
+                except passwords.HashingBusy:
+                    rejected[0] += 1
+
+        workers = [threading.Thread(target=stormer) for _ in range(threads)]
+        for w in workers:
+            w.start()
+        during = _summary(_read_latencies(seconds, threading.Event()))
+        stop.set()
+        for w in workers:
+            w.join()
+
+        database.close_pools()
+
+    return {
+        "storm_threads": threads,
+        "hash_workers": passwords.HASH_WORKERS,
+        "reads_without_storm": baseline,
+        "reads_during_storm": during,
+        "login_attempts_per_sec": round(logins[0] / seconds, 1),
+        "rejected_busy": rejected[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--storm-threads", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    costs = [time_hash("scrypt", SCRYPT_N=2**n) for n in (13, 14, 15)]
+    costs += [
+        time_hash("pbkdf2_sha256", PBKDF2_ITERATIONS=i)
+        for i in (200000, 600000)
+    ]
+
+    # storm with the default settings
+    passwords.PASSWORD_SCHEME = "scrypt"
+    passwords.SCRYPT_N = 2**14
+    storm = login_storm(args.storm_threads, args.seconds)
+
+    print(json.dumps({"hash_cost": costs, "login_storm": storm}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
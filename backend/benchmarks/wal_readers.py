@@ -0,0 +1,105 @@
+"""
+Reader throughput while checkouts/returns are being written.
+
+    python -m benchmarks.wal_readers --readers 4 --seconds 5
+
+Runs the same workload once per storage profile against a scratch database
+and prints reads/sec and writes/sec for each.
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+import database
+from controllers.book_controllers import get_book
+from controllers.checkout_controllers import (
+    checkout_book,
+    get_open_checkout_entry,
+    return_book,
+)
+from controllers.users_controller import create_user, get_user_by_email
+
+
+def _seed(books):
+    database.init_db()
+    create_user("Bench", "bench@test.com", "pass", "member")
+    conn = database.get_connection()
+    conn.executemany(
+        "INSERT INTO books (title, author, year, language, available) "
+        "VALUES (?, ?, ?, ?, 1)",
+        [(f"Book {i}", f"Author {i % 97}", 1950 + i % 70, "EN") for i in range(books)],
+    )
+    conn.commit()
+    conn.close()
+    return get_user_by_email("bench@test.com")["id"]
+
+
+def run_profile(profile, readers, seconds, books):
+    with tempfile.TemporaryDirectory() as tmp:
+        database.close_pools()
+        database.DB_NAME = os.path.join(tmp, "bench.db")
+        database.STORAGE_PROFILE = profile
+        database.POOL_SIZE = readers + 2
+
+        user_id = _seed(books)
+        stop = threading.Event()
+        reads = [0] * readers
+        writes = [0]
+
+        def reader(slot):
+            i = 0
+            while not stop.is_set():
+                get_book(i % books + 1)
+                reads[slot] += 1
+                i += 7
+
+        def writer():
+            i = 0
+            while not stop.is_set():
+                book_id = i % books + 1
+                checkout_book(user_id, book_id)
+                return_book(get_open_checkout_entry(user_id, book_id), book_id)
+                writes[0] += 2
+                i += 1
+
+        threads = [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+        threads.append(threading.Thread(target=writer))
+        for t in threads:
+            t.start()
+        time.sleep(seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+
+        database.close_pools()
+
+    return {
+        "profile": profile,
+        "readers": readers,
+        "reads_per_sec": round(sum(reads) / seconds, 1),
+        "writes_per_sec": round(writes[0] / seconds, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--books", type=int, default=1000)
+    parser.add_argument(
+        "--profiles", nargs="+", default=["default", "wal", "wal-durable"]
+    )
+    args = parser.parse_args()
+
+    results = [
+        run_profile(p, args.readers, args.seconds, args.books) for p in args.profiles
+    ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Bulk catalogue import/export from the command line.
+
+    python books_cli.py import catalogue.csv --upsert isbn --batch-size 5000
+    python books_cli.py export snapshot.ndjson
+    python books_cli.py export - --format csv > books.csv
+    python books_cli.py merge-duplicates --dry-run
+
+The format defaults to the file extension (.csv / .ndjson / .jsonl).
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import database
+from controllers.book_controllers import find_duplicate_books, merge_books
+from controllers.bulk_controllers import (
+    import_books,
+    export_books,
+    DEFAULT_BATCH_SIZE,
+    UPSERT_MODES,
+)
+
+
+def _format_for(path, explicit):
+    if explicit:
+        return explicit
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return "csv"
+    if ext in (".ndjson", ".jsonl"):
+        return "ndjson"
+    raise SystemExit(f"Cannot tell the format of {path!r}; pass --format")
+
+
+def cmd_import(args):
+    fmt = _format_for(args.path, args.format)
+    if args.path == "-":
+        report = import_books(sys.stdin, fmt, args.upsert, args.batch_size)
+    else:
+        with open(args.path, encoding="utf-8-sig", newline="") as f:
+            report = import_books(f, fmt, args.upsert, args.batch_size)
+
+    print(json.dumps(report, indent=2))
+    return 1 if report["failed"] else 0
+
+
+def cmd_export(args):
+    fmt = _format_for(args.path, args.format)
+    if args.path == "-":
+        for chunk in export_books(fmt):
+            sys.stdout.write(chunk)
+    else:
+        with open(args.path, "w", encoding="utf-8", newline="") as f:
+            for chunk in export_books(fmt):
+                f.write(chunk)
+    return 0
+
+
+def cmd_merge_duplicates(args):
+    groups = find_duplicate_books()
+    if not args.dry_run:
+        for keep_id, duplicate_ids in groups:
+            merge_books(keep_id, duplicate_ids)
+
+    print(
+        json.dumps(
+            {
+                "titles": len(groups),
+                "rows_merged": sum(len(dups) for _, dups in groups),
+                "dry_run": args.dry_run,
+            },
+            indent=2,
+        )
+    )
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk book import/export")
+    parser.add_argument("--db", default=database.DB_NAME, help="SQLite file")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_import = sub.add_parser("import", help="load books from CSV/NDJSON")
+    p_import.add_argument("path", help="input file, or - for stdin")
+    p_import.add_argument("--format", choices=["csv", "ndjson"])
+    p_import.add_argument(
+        "--upsert",
+        choices=[m for m in UPSERT_MODES if m],
+        help="update existing books matched by ISBN or title+author",
+    )
+    p_import.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    p_import.set_defaults(func=cmd_import)
+
+    p_export = sub.add_parser("export", help="dump all books to CSV/NDJSON")
+    p_export.add_argument("path", help="output file, or - for stdout")
+    p_export.add_argument("--format", choices=["csv", "ndjson"])
+    p_export.set_defaults(func=cmd_export)
+
+    p_merge = sub.add_parser(
+        "merge-duplicates",
+        help="turn books entered once per copy into one book with copies",
+    )
+    p_merge.add_argument("--dry-run", action="store_true")
+    p_merge.set_defaults(func=cmd_merge_duplicates)
+
+    args = parser.parse_args(argv)
+    if getattr(args, "path", None) == "-" and not args.format:
+        parser.error("--format is required when using stdin/stdout")
+
+    database.DB_NAME = args.db
+    database.init_db()
+    try:
+        return args.func(args)
+    finally:
+        database.close_pools()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
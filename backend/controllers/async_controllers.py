@@ -0,0 +1,67 @@
+"""
+Async versions of the book, checkout and user controllers the async app's
+routes call (only those; see async_app for what it serves).
+
+Each one runs the blocking controller on the database executor
+(database.run_db), so the event loop never waits on SQLite. Calls that hash
+passwords run on the default thread pool instead, so a burst of logins
+can't take every DB thread.
+"""
+
+import asyncio
+from functools import wraps
+
+from database import iterate_db, run_db
+from controllers import book_controllers, checkout_controllers, users_controller
+
+
+def _on_db_executor(fn):
+    @wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await run_db(fn, *args, **kwargs)
+
+    return wrapper
+
+
+def _off_loop(fn):
+    @wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await asyncio.to_thread(fn, *args, **kwargs)
+
+    return wrapper
+
+
+# ---------- BOOKS ----------
+
+get_all_books = _on_db_executor(book_controllers.get_all_books)
+list_books = _on_db_executor(book_controllers.list_books)
+search_books = _on_db_executor(book_controllers.search_books)
+get_book = _on_db_executor(book_controllers.get_book)
+
+# ---------- CHECKOUT ----------
+
+checkout_book = _on_db_executor(checkout_controllers.checkout_book)
+return_book = _on_db_executor(checkout_controllers.return_book)
+return_book_for_user = _on_db_executor(checkout_controllers.return_book_for_user)
+
+
+def iter_user_history(user_id):
+    return iterate_db(checkout_controllers.iter_user_history(user_id))
+
+
+def iter_book_history(book_id):
+    return iterate_db(checkout_controllers.iter_book_history(book_id))
+
+
+def iter_all_history():
+    return iterate_db(checkout_controllers.iter_all_history())
+
+
+# ---------- USERS ----------
+
+get_session_user = _on_db_executor(users_controller.get_session_user)
+get_user_by_email = _on_db_executor(users_controller.get_user_by_email)
+admin_dashboard_data = _on_db_executor(users_controller.admin_dashboard_data)
+
+create_user = _off_loop(users_controller.create_user)
+validate_user = _off_loop(users_controller.validate_user)
@@ -1,4 +1,27 @@
-from database import get_connection
+from database import get_connection, run_in_transaction
+from controllers.versions_controller import bump, BOOK_TITLES
+from utils.cache import invalidate, TAG_BOOKS, TAG_LOANS
+from utils import events
+import base64
+import datetime
+import html
+import json
+import re
+import sqlite3
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# columns a listing can be ordered by (all NOT NULL, so keyset is well defined)
+SORT_COLUMNS = ("id", "title", "author")
+
+DEFAULT_CHANGES_LIMIT = 1000
+MAX_CHANGES_LIMIT = 5000
+
+MAX_COPIES_PER_CALL = 500
+# "<book id>-<n>" barcodes are handed out automatically (the first copy by a
+# trigger on books), so custom ones may not look like that
+AUTO_BARCODE = re.compile(r"\d+-\d+")
 
 
 def get_all_books():
@@ -10,7 +33,179 @@ def get_all_books():
     return rows
 
 
-def add_book(title, author, year, language):
+def encode_cursor(sort, value, book_id):
+    raw = json.dumps([sort, value, book_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor, sort):
+    try:
+        cursor_sort, value, book_id = json.loads(base64.urlsafe_b64decode(cursor))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if cursor_sort != sort or not isinstance(book_id, int):
+        raise ValueError("Cursor does not match sort order")
+    return value, book_id
+
+
+def list_books(
+    limit=DEFAULT_PAGE_SIZE,
+    cursor=None,
+    sort="id",
+    order="asc",
+    author=None,
+    language=None,
+    year_from=None,
+    year_to=None,
+    available=None,
+):
+    """
+    One page of books using keyset pagination.
+    returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    if sort not in SORT_COLUMNS:
+        raise ValueError(f"Invalid sort: {sort}")
+    if order not in ("asc", "desc"):
+        raise ValueError(f"Invalid order: {order}")
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    limit = min(limit, MAX_PAGE_SIZE)
+
+    where = []
+    params = []
+
+    if author:
+        where.append("author = ?")
+        params.append(author)
+    if language:
+        where.append("language = ?")
+        params.append(language)
+    if year_from is not None:
+        where.append("year >= ?")
+        params.append(year_from)
+    if year_to is not None:
+        where.append("year <= ?")
+        params.append(year_to)
+    if available is not None:
+        where.append("available = ?")
+        params.append(1 if available else 0)
+
+    op = ">" if order == "asc" else "<"
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort)
+        if sort == "id":
+            where.append(f"id {op} ?")
+            params.append(last_id)
+        else:
+            where.append(f"({sort}, id) {op} (?, ?)")
+            params.extend([value, last_id])
+
+    sql = "SELECT * FROM books"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    if sort == "id":
+        sql += f" ORDER BY id {order.upper()}"
+    else:
+        sql += f" ORDER BY {sort} {order.upper()}, id {order.upper()}"
+    sql += " LIMIT ?"
+    params.append(limit + 1)
+
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute(sql, params)
+    rows = cur.fetchall()
+    conn.close()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(sort, last[sort], last["id"])
+
+    return rows, next_cursor
+
+
+def fts_query(text):
+    """
+    Turn free text into an FTS5 MATCH expression: every word must match,
+    the last one as a prefix ("clean arch" -> "clean" "arch"*).
+    Words are quoted so FTS5 operators in user input are taken literally.
+    """
+    words = re.findall(r"\w+", text or "")
+    if not words:
+        return None
+    terms = [f'"{w}"' for w in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+# FTS5 wraps matches in these; _highlight() swaps them for <mark> tags
+# once the text around them is escaped
+MATCH_START, MATCH_END = "\x02", "\x03"
+
+
+def _highlight(text):
+    """
+    HTML-safe highlight: the catalogue text is escaped, so only the <mark>
+    tags around matches are markup.
+    """
+    if text is None:
+        return None
+    return (
+        html.escape(text)
+        .replace(MATCH_START, "<mark>")
+        .replace(MATCH_END, "</mark>")
+    )
+
+
+def search_books(text, limit=DEFAULT_PAGE_SIZE, offset=0):
+    """
+    Ranked (BM25) catalogue search. Title matches weigh more than author,
+    author more than language. Returns (rows, total); each row also has
+    title_highlight / author_highlight, HTML with the catalogue text
+    escaped and matches in <mark>.
+    """
+    match = fts_query(text)
+    if match is None:
+        raise ValueError("Search query is empty")
+    if limit < 1 or offset < 0:
+        raise ValueError("limit must be positive and offset not negative")
+    limit = min(limit, MAX_PAGE_SIZE)
+
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT COUNT(*) FROM books_fts WHERE books_fts MATCH ?", (match,))
+    total = cur.fetchone()[0]
+
+    cur.execute(
+        """
+        SELECT
+            b.*,
+            highlight(books_fts, 0, char(2), char(3)) AS title_highlight,
+            highlight(books_fts, 1, char(2), char(3)) AS author_highlight,
+            bm25(books_fts, 10.0, 5.0, 1.0) AS score
+        FROM books_fts
+        JOIN books b ON b.id = books_fts.rowid
+        WHERE books_fts MATCH ?
+        ORDER BY score, b.id
+        LIMIT ? OFFSET ?
+    """,
+        (match, limit, offset),
+    )
+    rows = []
+    for row in cur.fetchall():
+        row = dict(row)
+        row["title_highlight"] = _highlight(row["title_highlight"])
+        row["author_highlight"] = _highlight(row["author_highlight"])
+        rows.append(row)
+    conn.close()
+    return rows, total
+
+
+def add_book(title, author, year, language, copies=1):
+    if not 1 <= copies <= MAX_COPIES_PER_CALL:
+        raise ValueError(f"copies must be between 1 and {MAX_COPIES_PER_CALL}")
+
     conn = get_connection()
     cur = conn.cursor()
     cur.execute(
@@ -20,8 +215,12 @@ def add_book(title, author, year, language):
     """,
         (title, author, year, language),
     )
+    book_id = cur.lastrowid
+    stock_new_book(cur, book_id, copies)
     conn.commit()
     conn.close()
+    invalidate(TAG_BOOKS)
+    events.publish("book", action="added", book_id=book_id)
 
 
 def get_book(book_id):
@@ -44,21 +243,391 @@ def update_book(book_id, title, author, year, language):
     """,
         (title, author, year, language, book_id),
     )
+    bump(cur, BOOK_TITLES)
     conn.commit()
     conn.close()
+    invalidate(TAG_BOOKS)
+    events.publish("book", action="updated", book_id=book_id)
 
 
 def delete_book(book_id):
     conn = get_connection()
     cur = conn.cursor()
     cur.execute("DELETE FROM books WHERE id = ?", (book_id,))
+    bump(cur, BOOK_TITLES)
     conn.commit()
     conn.close()
+    invalidate(TAG_BOOKS)
+    events.publish("book", action="deleted", book_id=book_id)
 
 
 def set_availability(book_id, available):
+    """
+    Put every copy that isn't on loan back on the shelf, or take them all
+    off it (withdrawn, in repair, ...).
+    """
+    old, new = "unavailable", "available"
+    if not available:
+        old, new = new, old
     conn = get_connection()
     cur = conn.cursor()
-    cur.execute("UPDATE books SET available = ? WHERE id = ?", (available, book_id))
+    cur.execute(
+        "UPDATE copies SET status = ? WHERE book_id = ? AND status = ?",
+        (new, book_id, old),
+    )
+    _recount_copies(cur, book_id)
+    if available:
+        _dispatch_holds(cur, book_id)
     conn.commit()
     conn.close()
+    invalidate(TAG_BOOKS)
+    publish_availability([book_id])
+
+
+def publish_availability(book_ids):
+    """
+    Send each book's current copy counters to /books/events listeners.
+    Call after the change has committed.
+    """
+    # skip the read when no stream could get the result
+    if not book_ids or not events.has_listeners():
+        return
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute(
+        f"""
+        SELECT id, available, available_copies, total_copies
+        FROM books WHERE id IN ({','.join('?' * len(book_ids))})
+    """,
+        list(book_ids),
+    )
+    rows = cur.fetchall()
+    conn.close()
+    for row in rows:
+        events.publish(
+            "availability",
+            book_id=row["id"],
+            available=row["available"],
+            available_copies=row["available_copies"],
+            total_copies=row["total_copies"],
+        )
+
+
+# ---------- COPIES ----------
+# A title's physical copies (barcode + status). The checkout engine moves a
+# copy between 'available' and 'on_loan'; 'unavailable' copies are held back
+# by staff, and 'held' ones are set aside for a reader's hold.
+# books.total_copies / available_copies always match this table.
+
+
+def _dispatch_holds(cur, book_id):
+    # copies just put on the shelf go to readers queueing for the title first.
+    # Imported here: holds_controller builds on this module.
+    from controllers.holds_controller import dispatch_holds
+
+    return dispatch_holds(cur, book_id, datetime.datetime.now().isoformat())
+
+
+def _recount_copies(cur, book_id):
+    cur.execute(
+        """
+        SELECT COUNT(*) AS total, COALESCE(SUM(status = 'available'), 0) AS shelved
+        FROM copies WHERE book_id = ?
+    """,
+        (book_id,),
+    )
+    row = cur.fetchone()
+    cur.execute(
+        """
+        UPDATE books
+        SET total_copies = ?, available_copies = ?, available = ?
+        WHERE id = ?
+    """,
+        (row["total"], row["shelved"], 1 if row["shelved"] else 0, book_id),
+    )
+
+
+def _auto_barcodes(cur, book_id, count):
+    cur.execute("SELECT barcode FROM copies WHERE book_id = ?", (book_id,))
+    taken = {r["barcode"] for r in cur.fetchall()}
+    barcodes = []
+    n = 1
+    while len(barcodes) < count:
+        barcode = f"{book_id}-{n}"
+        if barcode not in taken:
+            barcodes.append(barcode)
+        n += 1
+    return barcodes
+
+
+def _add_copies(cur, book_id, barcodes):
+    cur.executemany(
+        "INSERT INTO copies (book_id, barcode, status) VALUES (?, ?, 'available')",
+        [(book_id, barcode) for barcode in barcodes],
+    )
+    cur.execute(
+        """
+        UPDATE books
+        SET total_copies = total_copies + ?,
+            available_copies = available_copies + ?,
+            available = 1
+        WHERE id = ?
+    """,
+        (len(barcodes), len(barcodes), book_id),
+    )
+
+
+def stock_new_book(cur, book_id, copies):
+    """
+    Bring a just-inserted book up to `copies` copies on the shelf; the
+    insert trigger already made the first one.
+    """
+    if copies > 1:
+        _add_copies(cur, book_id, _auto_barcodes(cur, book_id, copies - 1))
+
+
+def get_copies(book_id):
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT id, barcode, status FROM copies WHERE book_id = ? ORDER BY id",
+        (book_id,),
+    )
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+
+def add_copies(book_id, count=None, barcodes=None):
+    """
+    Shelve more copies of a book: `count` with generated barcodes, or the
+    given `barcodes`.
+    returns the new barcodes, or "not_found"
+    """
+    if barcodes is not None:
+        barcodes = [str(b).strip() for b in barcodes]
+        if not barcodes or not all(barcodes):
+            raise ValueError("barcodes must be non-empty strings")
+        if any(AUTO_BARCODE.fullmatch(b) for b in barcodes):
+            raise ValueError("Barcodes like '<id>-<n>' are reserved")
+        if len(set(barcodes)) != len(barcodes):
+            raise ValueError("Duplicate barcode in request")
+        count = len(barcodes)
+    if count is None or not 1 <= count <= MAX_COPIES_PER_CALL:
+        raise ValueError(f"count must be between 1 and {MAX_COPIES_PER_CALL}")
+
+    def work(cur):
+        cur.execute("SELECT 1 FROM books WHERE id = ?", (book_id,))
+        if cur.fetchone() is None:
+            return "not_found"
+        new = barcodes or _auto_barcodes(cur, book_id, count)
+        try:
+            _add_copies(cur, book_id, new)
+        except sqlite3.IntegrityError:
+            raise ValueError("Barcode already in use")
+        _dispatch_holds(cur, book_id)
+        return new
+
+    result = run_in_transaction(work)
+    if result != "not_found":
+        invalidate(TAG_BOOKS)
+        publish_availability([book_id])
+    return result
+
+
+def remove_copy(book_id, barcode):
+    """
+    returns True, "not_found", "on_loan", "held" (set aside for a hold), or
+    "last_copy" (delete the book instead)
+    """
+
+    def work(cur):
+        cur.execute(
+            "SELECT id, status FROM copies WHERE book_id = ? AND barcode = ?",
+            (book_id, barcode),
+        )
+        copy = cur.fetchone()
+        if copy is None:
+            return "not_found"
+        if copy["status"] in ("on_loan", "held"):
+            return copy["status"]
+        cur.execute("SELECT total_copies FROM books WHERE id = ?", (book_id,))
+        if cur.fetchone()["total_copies"] <= 1:
+            return "last_copy"
+
+        cur.execute("DELETE FROM copies WHERE id = ?", (copy["id"],))
+        shelved = 1 if copy["status"] == "available" else 0
+        cur.execute(
+            """
+            UPDATE books
+            SET total_copies = total_copies - 1,
+                available_copies = available_copies - ?,
+                available = available_copies - ? > 0
+            WHERE id = ?
+        """,
+            (shelved, shelved, book_id),
+        )
+        return True
+
+    result = run_in_transaction(work)
+    if result is True:
+        invalidate(TAG_BOOKS)
+        publish_availability([book_id])
+    return result
+
+
+def merge_books(keep_id, duplicate_ids):
+    """
+    Fold duplicate rows of one title into keep_id as extra copies: their
+    copies, loans and loan counts move over and the duplicate rows go.
+    returns True, or "not_found" if any id is missing
+    """
+    duplicate_ids = [d for d in dict.fromkeys(duplicate_ids) if d != keep_id]
+    if not duplicate_ids:
+        raise ValueError("Nothing to merge")
+    marks = ",".join("?" * len(duplicate_ids))
+
+    def work(cur):
+        cur.execute(
+            f"SELECT COUNT(*) FROM books WHERE id IN (?, {marks})",
+            [keep_id, *duplicate_ids],
+        )
+        if cur.fetchone()[0] != len(duplicate_ids) + 1:
+            return "not_found"
+
+        for table in ("copies", "checkout_history"):
+            cur.execute(
+                f"UPDATE {table} SET book_id = ? WHERE book_id IN ({marks})",
+                [keep_id, *duplicate_ids],
+            )
+        # queues merge in arrival order; a reader queueing for more than one
+        # of the rows keeps a single hold and the others are cancelled
+        cur.execute(
+            f"""
+            UPDATE OR IGNORE holds SET book_id = ?
+            WHERE book_id IN ({marks}) AND status IN ('waiting', 'ready')
+        """,
+            [keep_id, *duplicate_ids],
+        )
+        cur.execute(
+            f"""
+            UPDATE copies SET status = 'available'
+            WHERE id IN (
+                SELECT copy_id FROM holds
+                WHERE book_id IN ({marks}) AND status = 'ready'
+            )
+        """,
+            duplicate_ids,
+        )
+        cur.execute(
+            f"""
+            UPDATE holds SET status = 'cancelled'
+            WHERE book_id IN ({marks}) AND status IN ('waiting', 'ready')
+        """,
+            duplicate_ids,
+        )
+        cur.execute(
+            f"""
+            INSERT INTO stats_book_loans (book_id, count)
+            SELECT ?, SUM(count) FROM stats_book_loans
+            WHERE book_id IN ({marks})
+            HAVING COUNT(*) > 0
+            ON CONFLICT(book_id) DO UPDATE SET count = count + excluded.count
+        """,
+            [keep_id, *duplicate_ids],
+        )
+        cur.execute(
+            f"DELETE FROM stats_book_loans WHERE book_id IN ({marks})", duplicate_ids
+        )
+        cur.execute(f"DELETE FROM books WHERE id IN ({marks})", duplicate_ids)
+        _recount_copies(cur, keep_id)
+        _dispatch_holds(cur, keep_id)
+        bump(cur, BOOK_TITLES)
+        return True
+
+    result = run_in_transaction(work)
+    if result is True:
+        invalidate(TAG_BOOKS, TAG_LOANS)
+        for book_id in duplicate_ids:
+            events.publish("book", action="deleted", book_id=book_id)
+        publish_availability([keep_id])
+    return result
+
+
+def find_duplicate_books():
+    """
+    Titles entered once per copy: rows agreeing on title, author, year and
+    language (and not on different ISBNs).
+    returns [(keep_id, [duplicate ids])], keeping the oldest row
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT GROUP_CONCAT(id) AS ids
+        FROM books
+        GROUP BY title, author, year, language
+        HAVING COUNT(*) > 1 AND COUNT(DISTINCT isbn) <= 1
+    """
+    )
+    groups = [sorted(int(i) for i in r["ids"].split(",")) for r in cur.fetchall()]
+    conn.close()
+    return [(ids[0], ids[1:]) for ids in groups]
+
+
+# ---------- DELTA SYNC ----------
+
+
+def book_changes(since=0, limit=DEFAULT_CHANGES_LIMIT):
+    """
+    Books changed after catalogue version `since`, oldest change first, from
+    the book_changes log kept by triggers on books.
+    returns (books, deleted_ids, version, has_more); pass `version` back as
+    the next `since`. since=0 yields the whole catalogue.
+    """
+    if since < 0:
+        raise ValueError("since must not be negative")
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    limit = min(limit, MAX_CHANGES_LIMIT)
+
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT COALESCE(MAX(version), 0) FROM book_changes")
+    current = cur.fetchone()[0]
+    if since > current:
+        conn.close()
+        raise ValueError("since is ahead of the catalogue; sync again from 0")
+
+    cur.execute(
+        """
+        SELECT c.version, c.book_id, c.deleted, b.*
+        FROM book_changes c
+        LEFT JOIN books b ON b.id = c.book_id
+        WHERE c.version > ?
+        ORDER BY c.version
+        LIMIT ?
+    """,
+        (since, limit + 1),
+    )
+    rows = cur.fetchall()
+    conn.close()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    books, deleted = [], []
+    for row in rows:
+        if row["deleted"]:
+            deleted.append(row["book_id"])
+        else:
+            book = dict(row)
+            for key in ("version", "book_id", "deleted"):
+                book.pop(key)
+            books.append(book)
+
+    if has_more:
+        version = rows[-1]["version"]
+    else:
+        # a write may have landed between the two reads
+        version = max([current] + [row["version"] for row in rows[-1:]])
+    return books, deleted, version, has_more
@@ -0,0 +1,395 @@
+from database import get_connection, run_in_transaction
+from controllers.book_controllers import MAX_COPIES_PER_CALL, stock_new_book
+from controllers.versions_controller import bump, BOOK_TITLES
+from utils.cache import invalidate, TAG_BOOKS
+from utils import events
+import csv
+import io
+import json
+import sqlite3
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_BATCH_SIZE = 50000
+
+# stop collecting error details after this many (they are still counted)
+MAX_REPORTED_ERRORS = 1000
+
+FORMATS = ("csv", "ndjson")
+UPSERT_MODES = (None, "isbn", "title_author")
+
+EXPORT_COLUMNS = (
+    "id",
+    "title",
+    "author",
+    "year",
+    "language",
+    "available",
+    "isbn",
+    "total_copies",
+)
+
+
+# ---------- PARSING / VALIDATION ----------
+
+
+def parse_rows(text_stream, fmt):
+    """
+    Yield (line_no, dict) from a CSV (with header) or NDJSON text stream.
+    Unparseable NDJSON lines come through as (line_no, ValueError).
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(text_stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == "ndjson":
+        for line_no, line in enumerate(text_stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield line_no, ValueError("Invalid JSON")
+                continue
+            if not isinstance(row, dict):
+                yield line_no, ValueError("Expected a JSON object")
+                continue
+            yield line_no, row
+    else:
+        raise ValueError(f"Unsupported format: {fmt}")
+
+
+def _text(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def validate_row(row):
+    """
+    returns (title, author, year, language, isbn, copies) or raises ValueError
+    """
+    title = _text(row.get("title"))
+    author = _text(row.get("author"))
+    if not title:
+        raise ValueError("Missing field: title")
+    if not author:
+        raise ValueError("Missing field: author")
+
+    year = _text(row.get("year"))
+    if year is not None:
+        try:
+            year = int(year)
+        except ValueError:
+            raise ValueError(f"Invalid year: {year}")
+
+    isbn = _text(row.get("isbn"))
+    if isbn is not None:
+        isbn = isbn.replace("-", "").replace(" ", "")
+
+    copies = _text(row.get("total_copies"))
+    if copies is None:
+        copies = 1
+    else:
+        try:
+            copies = int(copies)
+        except ValueError:
+            raise ValueError(f"Invalid total_copies: {copies}")
+        if not 1 <= copies <= MAX_COPIES_PER_CALL:
+            raise ValueError(
+                f"total_copies must be between 1 and {MAX_COPIES_PER_CALL}"
+            )
+
+    return title, author, year, _text(row.get("language")), isbn, copies
+
+
+# ---------- WRITING ----------
+
+INSERT_SQL = """
+    INSERT INTO books (title, author, year, language, isbn, available)
+    VALUES (?, ?, ?, ?, ?, 1)
+"""
+
+UPSERT_ISBN_SQL = """
+    INSERT INTO books (title, author, year, language, isbn, available)
+    VALUES (?, ?, ?, ?, ?, 1)
+    ON CONFLICT(isbn) WHERE isbn IS NOT NULL DO UPDATE SET
+        title = excluded.title,
+        author = excluded.author,
+        year = excluded.year,
+        language = excluded.language
+"""
+
+UPDATE_TITLE_AUTHOR_SQL = """
+    UPDATE books SET year = ?, language = ?, isbn = COALESCE(?, isbn)
+    WHERE title = ? AND author = ?
+"""
+
+INSERT_MISSING_TITLE_AUTHOR_SQL = """
+    INSERT INTO books (title, author, year, language, isbn, available)
+    SELECT ?, ?, ?, ?, ?, 1
+    WHERE NOT EXISTS (SELECT 1 FROM books WHERE title = ? AND author = ?)
+"""
+
+
+def _existing_isbns(cur, isbns):
+    found = set()
+    isbns = list(isbns)
+    # stay well under SQLite's bound-parameter limit
+    for i in range(0, len(isbns), 500):
+        chunk = isbns[i : i + 500]
+        cur.execute(
+            f"SELECT isbn FROM books WHERE isbn IN ({','.join('?' * len(chunk))})",
+            chunk,
+        )
+        found.update(r["isbn"] for r in cur.fetchall())
+    return found
+
+
+def _write_batch(cur, rows, upsert):
+    """
+    rows: list of validated tuples. returns (inserted, updated)
+    Single-copy rows go through executemany; a row asking for more copies
+    is written on its own, since its new book id is needed for the copies.
+    """
+    inserted = updated = 0
+    run = []
+    for row in rows:
+        if row[5] == 1:
+            run.append(row[:5])
+            continue
+        i, u = _write_run(cur, run, upsert)
+        inserted, updated = inserted + i, updated + u
+        i, u = _write_stocked(cur, row, upsert)
+        inserted, updated = inserted + i, updated + u
+        run = []
+    i, u = _write_run(cur, run, upsert)
+    return inserted + i, updated + u
+
+
+def _write_stocked(cur, row, upsert):
+    """
+    One row with total_copies > 1. The copies are only made for a book the
+    import creates; an existing book keeps the copies it has.
+    """
+    title, author, year, language, isbn, copies = row
+    if upsert == "isbn" and isbn is not None:
+        if _existing_isbns(cur, [isbn]):
+            cur.execute(UPSERT_ISBN_SQL, row[:5])
+            return 0, 1
+    elif upsert == "title_author":
+        cur.execute(UPDATE_TITLE_AUTHOR_SQL, (year, language, isbn, title, author))
+        if cur.rowcount:
+            return 0, 1
+    cur.execute(INSERT_SQL, row[:5])
+    stock_new_book(cur, cur.lastrowid, copies)
+    return 1, 0
+
+
+def _write_run(cur, rows, upsert):
+    """
+    rows: (title, author, year, language, isbn) tuples for single-copy books
+    """
+    if not rows:
+        return 0, 0
+    if upsert is None:
+        cur.executemany(INSERT_SQL, rows)
+        return len(rows), 0
+
+    if upsert == "isbn":
+        keyed = [r for r in rows if r[4] is not None]
+        plain = [r for r in rows if r[4] is None]
+        existing = _existing_isbns(cur, {r[4] for r in keyed})
+        cur.executemany(UPSERT_ISBN_SQL, keyed)
+        cur.executemany(INSERT_SQL, plain)
+        updated = sum(1 for r in keyed if r[4] in existing)
+        return len(rows) - updated, updated
+
+    # title_author: update every existing copy, insert the ones that are new
+    updated = 0
+    for title, author, year, language, isbn in rows:
+        cur.execute(UPDATE_TITLE_AUTHOR_SQL, (year, language, isbn, title, author))
+        if cur.rowcount:
+            updated += 1
+        else:
+            cur.execute(
+                INSERT_MISSING_TITLE_AUTHOR_SQL,
+                (title, author, year, language, isbn, title, author),
+            )
+    return len(rows) - updated, updated
+
+
+def _write_rows_one_by_one(cur, numbered_rows, upsert):
+    """
+    Fallback after a batch hit a constraint: isolate the bad rows with
+    savepoints so the good ones in the batch still land.
+    returns (inserted, updated, [(line_no, error), ...])
+    """
+    inserted = updated = 0
+    errors = []
+    for line_no, row in numbered_rows:
+        cur.execute("SAVEPOINT import_row")
+        try:
+            i, u = _write_batch(cur, [row], upsert)
+            inserted += i
+            updated += u
+        except sqlite3.IntegrityError as e:
+            cur.execute("ROLLBACK TO import_row")
+            errors.append((line_no, str(e)))
+        cur.execute("RELEASE import_row")
+    return inserted, updated, errors
+
+
+def _add_error(report, line_no, message):
+    report["failed"] += 1
+    if len(report["errors"]) < MAX_REPORTED_ERRORS:
+        report["errors"].append({"line": line_no, "error": message})
+
+
+def _dedupe_isbns(batch):
+    """
+    Keep only the last row for each ISBN in the batch, so a repeat is
+    applied once (as a later batch would, last one wins) and counted as a
+    duplicate rather than a second insert. returns (batch, duplicates)
+    """
+    last = {row[4]: i for i, (_, row) in enumerate(batch) if row[4] is not None}
+    kept = [
+        (line_no, row)
+        for i, (line_no, row) in enumerate(batch)
+        if row[4] is None or last[row[4]] == i
+    ]
+    return kept, len(batch) - len(kept)
+
+
+def _flush(batch, upsert, report):
+    duplicates = 0
+    if upsert == "isbn":
+        batch, duplicates = _dedupe_isbns(batch)
+    rows = [row for _, row in batch]
+
+    # work() may run more than once (SQLITE_BUSY retries), so it only
+    # returns counts; the report is updated after the commit
+    def work(cur):
+        if upsert:
+            # upserts can retitle books that appear in loan histories
+            bump(cur, BOOK_TITLES)
+        cur.execute("SAVEPOINT import_batch")
+        try:
+            inserted, updated = _write_batch(cur, rows, upsert)
+            cur.execute("RELEASE import_batch")
+            return inserted, updated, []
+        except sqlite3.IntegrityError:
+            cur.execute("ROLLBACK TO import_batch")
+            cur.execute("RELEASE import_batch")
+            return _write_rows_one_by_one(cur, batch, upsert)
+
+    inserted, updated, errors = run_in_transaction(work)
+    report["inserted"] += inserted
+    report["updated"] += updated
+    report["duplicates"] += duplicates
+    for line_no, message in errors:
+        _add_error(report, line_no, message)
+
+
+def import_books(text_stream, fmt, upsert=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Stream rows from text_stream into books, one transaction per batch.
+    returns a report dict: rows, inserted, updated, duplicates, failed,
+    errors[]. With upsert="isbn", an ISBN repeated within a batch is written
+    once (the last row) and the others count as duplicates.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format: {fmt}")
+    if upsert not in UPSERT_MODES:
+        raise ValueError(f"Unsupported upsert mode: {upsert}")
+    if batch_size < 1:
+        raise ValueError("batch_size must be positive")
+    batch_size = min(batch_size, MAX_BATCH_SIZE)
+
+    report = {
+        "rows": 0,
+        "inserted": 0,
+        "updated": 0,
+        "duplicates": 0,
+        "failed": 0,
+        "errors": [],
+    }
+    batch = []
+
+    try:
+        for line_no, raw in parse_rows(text_stream, fmt):
+            report["rows"] += 1
+            if isinstance(raw, Exception):
+                _add_error(report, line_no, str(raw))
+                continue
+            try:
+                batch.append((line_no, validate_row(raw)))
+            except ValueError as e:
+                _add_error(report, line_no, str(e))
+                continue
+
+            if len(batch) >= batch_size:
+                _flush(batch, upsert, report)
+                batch = []
+
+        if batch:
+            _flush(batch, upsert, report)
+    finally:
+        if report["inserted"] or report["updated"]:
+            invalidate(TAG_BOOKS)
+            events.publish(
+                "catalogue",
+                action="imported",
+                inserted=report["inserted"],
+                updated=report["updated"],
+            )
+
+    return report
+
+
+# ---------- EXPORT ----------
+
+
+def iter_books(batch_size=DEFAULT_BATCH_SIZE):
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(f"SELECT {', '.join(EXPORT_COLUMNS)} FROM books ORDER BY id")
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(row)
+    finally:
+        conn.close()
+
+
+def export_books(fmt, rows=None, chunk_rows=DEFAULT_BATCH_SIZE):
+    """
+    Yield the catalogue as text chunks in CSV (with header) or NDJSON.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format: {fmt}")
+    rows = iter_books() if rows is None else rows
+
+    buf = io.StringIO()
+    writer = None
+    if fmt == "csv":
+        writer = csv.DictWriter(buf, fieldnames=EXPORT_COLUMNS)
+        writer.writeheader()
+
+    n = 0
+    for row in rows:
+        if writer is not None:
+            writer.writerow(row)
+        else:
+            buf.write(json.dumps(row) + "\n")
+        n += 1
+        if n % chunk_rows == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+
+    if buf.tell():
+        yield buf.getvalue()
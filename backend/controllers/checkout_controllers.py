@@ -1,10 +1,152 @@
-from database import get_connection
+from database import get_connection, run_in_transaction
+from controllers.stats_controller import record_checkout, record_return
+from controllers.versions_controller import bump, loans_key
+from utils.cache import invalidate, TAG_BOOKS, TAG_LOANS
+from controllers.book_controllers import publish_availability
+from controllers.holds_controller import claim_hold, release_copy
 import datetime
 
+# rows pulled from the cursor per fetchmany() while streaming history
+STREAM_BATCH_SIZE = 500
+
+USER_HISTORY_SQL = """
+    SELECT c.*, b.title
+    FROM checkout_history c
+    JOIN books b ON c.book_id = b.id
+    WHERE c.user_id = ?
+"""
+
+HISTORY_SELECT = """
+    SELECT
+        c.id,
+        c.user_id,
+        u.name AS user_name,
+        u.email AS email,
+        c.book_id,
+        b.title AS book_title,
+        c.checkout_date,
+        c.return_date
+    FROM checkout_history c
+    JOIN users u ON c.user_id = u.id
+    JOIN books b ON c.book_id = b.id
+"""
+
+BOOK_HISTORY_SQL = HISTORY_SELECT + """
+    WHERE c.book_id = ?
+    ORDER BY c.checkout_date DESC
+"""
+
+ALL_HISTORY_SQL = HISTORY_SELECT + """
+    ORDER BY c.checkout_date DESC
+"""
+
 
 def get_open_checkout_entry(user_id, book_id):
     conn = get_connection()
-    cur = conn.cursor()
+    entry_id = _open_entry_id(conn.cursor(), user_id, book_id)
+    conn.close()
+    return entry_id
+
+
+# ---------- CHECKOUT / RETURN ENGINE ----------
+# Each operation is one BEGIN IMMEDIATE transaction (run_in_transaction):
+# the availability check and every write commit together, and the
+# conditional UPDATEs make a second concurrent checkout lose cleanly.
+# Results follow the controllers' convention: True, or a reason string.
+# A loan takes one copy; books.available_copies / available move with it so
+# listings never have to count copies. A returned copy goes to the first
+# reader holding the title, if any (see holds_controller).
+
+
+def _checkout(cur, user_id, book_id, now):
+    # a reader whose hold is ready takes the copy set aside for them; it left
+    # available_copies when the hold became ready
+    copy_id = claim_hold(cur, user_id, book_id)
+    if copy_id is None:
+        # SET sees the old row: available stays 1 unless this was the last copy
+        cur.execute(
+            """
+            UPDATE books
+            SET available_copies = available_copies - 1,
+                available = available_copies > 1
+            WHERE id = ? AND available_copies > 0
+        """,
+            (book_id,),
+        )
+        if cur.rowcount == 0:
+            cur.execute("SELECT 1 FROM books WHERE id = ?", (book_id,))
+            return "unavailable" if cur.fetchone() else "not_found"
+
+        cur.execute(
+            """
+            SELECT id FROM copies
+            WHERE book_id = ? AND status = 'available'
+            ORDER BY id
+            LIMIT 1
+        """,
+            (book_id,),
+        )
+        copy = cur.fetchone()
+        if copy is None:
+            raise RuntimeError(f"Copy counters of book {book_id} are out of step")
+        copy_id = copy["id"]
+    cur.execute("UPDATE copies SET status = 'on_loan' WHERE id = ?", (copy_id,))
+
+    cur.execute(
+        """
+        INSERT INTO checkout_history (user_id, book_id, copy_id, checkout_date)
+        VALUES (?, ?, ?, ?)
+    """,
+        (user_id, book_id, copy_id, now),
+    )
+    record_checkout(cur, user_id, book_id, now)
+    bump(cur, loans_key(user_id))
+    return True
+
+
+def _return(cur, entry_id, book_id, now):
+    # only an open entry for this book can be returned
+    cur.execute(
+        """
+        UPDATE checkout_history
+        SET return_date = ?
+        WHERE id = ? AND book_id = ? AND return_date IS NULL
+    """,
+        (now, entry_id, book_id),
+    )
+    if cur.rowcount == 0:
+        return "not_open"
+
+    record_return(cur, entry_id)
+    cur.execute(
+        "SELECT user_id, copy_id FROM checkout_history WHERE id = ?", (entry_id,)
+    )
+    entry = cur.fetchone()
+    _shelve_copy(cur, book_id, entry["copy_id"], now)
+    bump(cur, loans_key(entry["user_id"]))
+    return True
+
+
+def _shelve_copy(cur, book_id, copy_id, now):
+    if copy_id is None:
+        # loan from before copies were tracked: any copy that is out will do
+        cur.execute(
+            "SELECT id FROM copies WHERE book_id = ? AND status = 'on_loan' LIMIT 1",
+            (book_id,),
+        )
+        row = cur.fetchone()
+        copy_id = row["id"] if row else None
+
+    cur.execute(
+        "UPDATE copies SET status = 'available' WHERE id = ? AND status = 'on_loan'",
+        (copy_id,),
+    )
+    if cur.rowcount:
+        # straight to the next reader in the queue, if there is one
+        release_copy(cur, book_id, copy_id, now)
+
+
+def _open_entry_id(cur, user_id, book_id):
     cur.execute(
         """
         SELECT id FROM checkout_history
@@ -16,59 +158,109 @@ def get_open_checkout_entry(user_id, book_id):
         (user_id, book_id),
     )
     row = cur.fetchone()
-    conn.close()
     return row["id"] if row else None
 
 
+def _now():
+    return datetime.datetime.now().isoformat()
+
+
 def checkout_book(user_id, book_id):
-    conn = get_connection()
-    cur = conn.cursor()
+    """
+    returns:
+      - True if checked out
+      - "unavailable" if the book is already out
+      - "not_found" if there is no such book
+    """
+    result = run_in_transaction(lambda cur: _checkout(cur, user_id, book_id, _now()))
+    if result is True:
+        invalidate(TAG_BOOKS, TAG_LOANS)
+        publish_availability([book_id])
+    return result
 
-    cur.execute(
-        """
-        INSERT INTO checkout_history (user_id, book_id, checkout_date)
-        VALUES (?, ?, ?)
-    """,
-        (user_id, book_id, datetime.datetime.now().isoformat()),
-    )
 
-    cur.execute("UPDATE books SET available = 0 WHERE id = ?", (book_id,))
+def return_book(entry_id, book_id):
+    """
+    returns True, or "not_open" if the entry is not an open loan of book_id
+    """
+    result = run_in_transaction(lambda cur: _return(cur, entry_id, book_id, _now()))
+    if result is True:
+        invalidate(TAG_BOOKS, TAG_LOANS)
+        publish_availability([book_id])
+    return result
+
 
-    conn.commit()
-    conn.close()
+def return_book_for_user(user_id, book_id):
+    """
+    Return the user's open loan of book_id (lookup + return in one transaction).
+    returns True, or "not_open" if the user has no open loan of that book
+    """
 
+    def work(cur):
+        entry_id = _open_entry_id(cur, user_id, book_id)
+        if entry_id is None:
+            return "not_open"
+        return _return(cur, entry_id, book_id, _now())
 
-def return_book(entry_id, book_id):
-    conn = get_connection()
-    cur = conn.cursor()
+    result = run_in_transaction(work)
+    if result is True:
+        invalidate(TAG_BOOKS, TAG_LOANS)
+        publish_availability([book_id])
+    return result
 
-    cur.execute(
-        """
-        UPDATE checkout_history
-        SET return_date = ?
-        WHERE id = ?
-    """,
-        (datetime.datetime.now().isoformat(), entry_id),
+
+# ---------- BATCH (circulation desk) ----------
+
+MAX_BATCH_ITEMS = 200
+
+
+def _run_batch(book_ids, step):
+    """
+    Apply step(cur, book_id, now) to every id inside one transaction.
+    returns [{"book_id", "status"}] with status "ok" or the reason string.
+    """
+    if not book_ids:
+        raise ValueError("book_ids must not be empty")
+    if len(book_ids) > MAX_BATCH_ITEMS:
+        raise ValueError(f"At most {MAX_BATCH_ITEMS} books per batch")
+
+    def work(cur):
+        now = _now()
+        results = []
+        for book_id in book_ids:
+            result = step(cur, book_id, now)
+            results.append(
+                {"book_id": book_id, "status": "ok" if result is True else result}
+            )
+        return results
+
+    results = run_in_transaction(work)
+    if any(r["status"] == "ok" for r in results):
+        invalidate(TAG_BOOKS, TAG_LOANS)
+    publish_availability([r["book_id"] for r in results if r["status"] == "ok"])
+    return results
+
+
+def checkout_books(user_id, book_ids):
+    return _run_batch(
+        book_ids, lambda cur, book_id, now: _checkout(cur, user_id, book_id, now)
     )
 
-    cur.execute("UPDATE books SET available = 1 WHERE id = ?", (book_id,))
 
-    conn.commit()
-    conn.close()
+def return_books_for_user(user_id, book_ids):
+    def step(cur, book_id, now):
+        entry_id = _open_entry_id(cur, user_id, book_id)
+        if entry_id is None:
+            return "not_open"
+        return _return(cur, entry_id, book_id, now)
+
+    return _run_batch(book_ids, step)
 
 
 def user_history(user_id):
     conn = get_connection()
     cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT c.*, b.title
-        FROM checkout_history c
-        JOIN books b ON c.book_id = b.id
-        WHERE c.user_id = ?
-    """,
-        (user_id,),
-    )
+    cur.execute(USER_HISTORY_SQL, (user_id,))
     rows = cur.fetchall()
     conn.close()
     return rows
@@ -77,25 +269,7 @@ def user_history(user_id):
 def book_history(book_id):
     conn = get_connection()
     cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT
-            c.id,
-            c.user_id,
-            u.name AS user_name,
-            u.email AS email,
-            c.book_id,
-            b.title AS book_title,
-            c.checkout_date,
-            c.return_date
-        FROM checkout_history c
-        JOIN users u ON c.user_id = u.id
-        JOIN books b ON c.book_id = b.id
-        WHERE c.book_id = ?
-        ORDER BY c.checkout_date DESC
-    """,
-        (book_id,),
-    )
+    cur.execute(BOOK_HISTORY_SQL, (book_id,))
     rows = cur.fetchall()
     conn.close()
     return rows
@@ -104,23 +278,39 @@ def book_history(book_id):
 def all_history():
     conn = get_connection()
     cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT
-            c.id,
-            c.user_id,
-            u.name AS user_name,
-            u.email AS email,
-            c.book_id,
-            b.title AS book_title,
-            c.checkout_date,
-            c.return_date
-        FROM checkout_history c
-        JOIN users u ON c.user_id = u.id
-        JOIN books b ON c.book_id = b.id
-        ORDER BY c.checkout_date DESC
-    """
-    )
+    cur.execute(ALL_HISTORY_SQL)
     rows = cur.fetchall()
     conn.close()
     return rows
+
+
+# ---------- STREAMING VARIANTS ----------
+# Same queries, but rows are yielded in batches straight off the cursor so
+# memory stays flat no matter how long the history is.
+
+
+def _iter_rows(sql, params=()):
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(STREAM_BATCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(row)
+    finally:
+        conn.close()
+
+
+def iter_user_history(user_id):
+    return _iter_rows(USER_HISTORY_SQL, (user_id,))
+
+
+def iter_book_history(book_id):
+    return _iter_rows(BOOK_HISTORY_SQL, (book_id,))
+
+
+def iter_all_history():
+    return _iter_rows(ALL_HISTORY_SQL)
@@ -0,0 +1,397 @@
+import datetime
+import logging
+import os
+import sqlite3
+import threading
+
+from database import get_connection, run_in_transaction
+from controllers.book_controllers import publish_availability
+from utils.cache import invalidate, TAG_BOOKS
+
+# ---------- SETTINGS ----------
+
+# how long a copy set aside for a hold waits to be collected
+HOLD_PICKUP_HOURS = float(os.environ.get("LIBRARY_HOLD_PICKUP_HOURS", 48))
+# seconds between sweeps for uncollected holds (0 disables the sweeper)
+HOLD_SWEEP_INTERVAL = float(os.environ.get("LIBRARY_HOLD_SWEEP_INTERVAL", 60))
+# holds expired per sweeper transaction
+HOLD_SWEEP_BATCH = 500
+
+logger = logging.getLogger("library.holds")
+
+# A reader who finds every copy out joins the title's queue once instead of
+# retrying the checkout. Copies coming back (returns, new copies, lapsed
+# holds) go to the head of the queue in the same transaction: the copy is
+# marked 'held' and the hold 'ready', and it never counts towards
+# books.available_copies. The reader's next checkout of the title takes
+# that copy. So while anyone is waiting, no copy of the title is on the
+# shelf for someone else to take.
+
+
+def _now():
+    # fixed width, so timestamps order correctly as strings
+    return datetime.datetime.now().isoformat(timespec="microseconds")
+
+
+def _expires(now):
+    pickup = datetime.timedelta(hours=HOLD_PICKUP_HOURS)
+    return (datetime.datetime.fromisoformat(now) + pickup).isoformat(
+        timespec="microseconds"
+    )
+
+
+# ---------- DISPATCH ----------
+# Cursor-level steps for the checkout engine and the copy management in
+# book_controllers; they run inside the caller's transaction.
+
+
+def hand_over(cur, book_id, copy_id, now):
+    """
+    Set copy_id aside for the first reader waiting for book_id.
+    returns False (and changes nothing) if nobody is waiting
+    """
+    cur.execute(
+        """
+        SELECT id FROM holds
+        WHERE book_id = ? AND status = 'waiting'
+        ORDER BY created_at, id
+        LIMIT 1
+    """,
+        (book_id,),
+    )
+    hold = cur.fetchone()
+    if hold is None:
+        return False
+    cur.execute("UPDATE copies SET status = 'held' WHERE id = ?", (copy_id,))
+    cur.execute(
+        """
+        UPDATE holds SET status = 'ready', copy_id = ?, expires_at = ?
+        WHERE id = ?
+    """,
+        (copy_id, _expires(now), hold["id"]),
+    )
+    return True
+
+
+def release_copy(cur, book_id, copy_id, now):
+    """
+    A copy coming back goes to the next reader in the queue, or onto the
+    shelf if nobody is waiting.
+    """
+    if hand_over(cur, book_id, copy_id, now):
+        return
+    cur.execute("UPDATE copies SET status = 'available' WHERE id = ?", (copy_id,))
+    cur.execute(
+        """
+        UPDATE books
+        SET available_copies = available_copies + 1, available = 1
+        WHERE id = ?
+    """,
+        (book_id,),
+    )
+
+
+def dispatch_holds(cur, book_id, now):
+    """
+    Hand copies already on the shelf to waiting readers, e.g. after new
+    copies were added. returns the number of holds made ready
+    """
+    cur.execute(
+        "SELECT id FROM copies WHERE book_id = ? AND status = 'available' ORDER BY id",
+        (book_id,),
+    )
+    handed = 0
+    for copy in cur.fetchall():
+        if not hand_over(cur, book_id, copy["id"], now):
+            break
+        handed += 1
+    if handed:
+        cur.execute(
+            """
+            UPDATE books
+            SET available_copies = available_copies - ?,
+                available = available_copies - ? > 0
+            WHERE id = ?
+        """,
+            (handed, handed, book_id),
+        )
+    return handed
+
+
+def claim_hold(cur, user_id, book_id):
+    """
+    The copy set aside for user_id's ready hold on book_id, marking the hold
+    fulfilled; None if there is no ready hold.
+    """
+    # IN (...) so idx_holds_open applies
+    cur.execute(
+        """
+        SELECT id, status, copy_id FROM holds
+        WHERE user_id = ? AND book_id = ? AND status IN ('waiting', 'ready')
+    """,
+        (user_id, book_id),
+    )
+    hold = cur.fetchone()
+    if hold is None or hold["status"] != "ready":
+        return None
+    cur.execute("UPDATE holds SET status = 'fulfilled' WHERE id = ?", (hold["id"],))
+    return hold["copy_id"]
+
+
+# ---------- HOLDS ----------
+
+POSITION_SQL = """
+    SELECT COUNT(*) FROM holds
+    WHERE book_id = ? AND status = 'waiting' AND (created_at, id) <= (?, ?)
+"""
+
+HOLD_SELECT = """
+    SELECT
+        h.id,
+        h.book_id,
+        b.title,
+        h.status,
+        h.created_at,
+        h.expires_at,
+        CASE WHEN h.status = 'waiting' THEN (
+            SELECT COUNT(*) FROM holds q
+            WHERE q.book_id = h.book_id AND q.status = 'waiting'
+              AND (q.created_at, q.id) <= (h.created_at, h.id)
+        ) END AS position
+    FROM holds h
+    JOIN books b ON b.id = h.book_id
+"""
+
+
+def place_hold(user_id, book_id):
+    """
+    Join the queue for book_id.
+    returns the hold's place in the queue (1 = next), or
+      - "not_found" if there is no such book
+      - "available" if a copy is on the shelf (check it out instead)
+      - "on_loan" if the user already has a copy
+      - "already_held" if the user is already in the queue
+    """
+
+    def work(cur):
+        cur.execute("SELECT available_copies FROM books WHERE id = ?", (book_id,))
+        book = cur.fetchone()
+        if book is None:
+            return "not_found"
+        if book["available_copies"] > 0:
+            return "available"
+        cur.execute(
+            """
+            SELECT 1 FROM checkout_history
+            WHERE user_id = ? AND book_id = ? AND return_date IS NULL
+            LIMIT 1
+        """,
+            (user_id, book_id),
+        )
+        if cur.fetchone():
+            return "on_loan"
+
+        now = _now()
+        try:
+            cur.execute(
+                "INSERT INTO holds (book_id, user_id, created_at) VALUES (?, ?, ?)",
+                (book_id, user_id, now),
+            )
+        except sqlite3.IntegrityError:
+            return "already_held"
+        cur.execute(POSITION_SQL, (book_id, now, cur.lastrowid))
+        return cur.fetchone()[0]
+
+    return run_in_transaction(work)
+
+
+def cancel_hold(user_id, book_id):
+    """
+    Leave the queue for book_id; a copy already set aside goes to the next
+    reader. returns True, or "not_found" if the user has no open hold
+    """
+
+    def work(cur):
+        cur.execute(
+            """
+            SELECT id, status, copy_id FROM holds
+            WHERE user_id = ? AND book_id = ? AND status IN ('waiting', 'ready')
+        """,
+            (user_id, book_id),
+        )
+        hold = cur.fetchone()
+        if hold is None:
+            return "not_found"
+        cur.execute("UPDATE holds SET status = 'cancelled' WHERE id = ?", (hold["id"],))
+        if hold["status"] == "ready":
+            release_copy(cur, book_id, hold["copy_id"], _now())
+        return hold["status"]
+
+    result = run_in_transaction(work)
+    if result == "not_found":
+        return result
+    if result == "ready":
+        invalidate(TAG_BOOKS)
+        publish_availability([book_id])
+    return True
+
+
+def get_hold(user_id, book_id):
+    """
+    The user's open hold on book_id (with its queue position while
+    waiting), or None
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute(
+        HOLD_SELECT
+        + " WHERE h.user_id = ? AND h.book_id = ?"
+        + " AND h.status IN ('waiting', 'ready')",
+        (user_id, book_id),
+    )
+    row = cur.fetchone()
+    conn.close()
+    return row
+
+
+def user_holds(user_id):
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute(
+        HOLD_SELECT
+        + " WHERE h.user_id = ? AND h.status IN ('waiting', 'ready')"
+        + " ORDER BY h.created_at",
+        (user_id,),
+    )
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+
+def book_queue(book_id):
+    """
+    Open holds on book_id for the desk: ready ones first, then the queue.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT h.id, h.user_id, u.name AS user_name, u.email, h.status,
+               h.created_at, h.expires_at, c.barcode
+        FROM holds h
+        JOIN users u ON u.id = h.user_id
+        LEFT JOIN copies c ON c.id = h.copy_id
+        WHERE h.book_id = ? AND h.status IN ('waiting', 'ready')
+        ORDER BY h.status = 'waiting', h.created_at, h.id
+    """,
+        (book_id,),
+    )
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+
+# ---------- EXPIRY ----------
+
+
+def expire_holds(now=None, limit=HOLD_SWEEP_BATCH):
+    """
+    Lapse ready holds whose pickup time has passed; each copy goes to the
+    next reader in its queue or back on the shelf.
+    returns the number of holds expired
+    """
+    now = now or _now()
+
+    def work(cur):
+        cur.execute(
+            """
+            SELECT id, book_id, copy_id FROM holds
+            WHERE status = 'ready' AND expires_at <= ?
+            ORDER BY expires_at
+            LIMIT ?
+        """,
+            (now, limit),
+        )
+        holds = cur.fetchall()
+        for hold in holds:
+            cur.execute(
+                "UPDATE holds SET status = 'expired' WHERE id = ?", (hold["id"],)
+            )
+            release_copy(cur, hold["book_id"], hold["copy_id"], now)
+        return [hold["book_id"] for hold in holds]
+
+    book_ids = run_in_transaction(work)
+    if book_ids:
+        invalidate(TAG_BOOKS)
+        publish_availability(sorted(set(book_ids)))
+    return len(book_ids)
+
+
+class HoldSweeper:
+    """
+    Expires uncollected holds on a daemon thread, so a copy nobody picks up
+    moves on without anyone having to touch the book.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="hold-sweeper", daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=self.interval + 1)
+
+    def sweep(self):
+        total = 0
+        while True:
+            expired = expire_holds()
+            total += expired
+            if expired < HOLD_SWEEP_BATCH:
+                return total
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("Hold sweep failed")
+
+
+_sweeper = None
+_sweeper_lock = threading.Lock()
+
+
+def start_sweeper(interval=None):
+    global _sweeper
+    interval = HOLD_SWEEP_INTERVAL if interval is None else interval
+    if interval <= 0:
+        return None
+
+    with _sweeper_lock:
+        if _sweeper is None:
+            _sweeper = HoldSweeper(interval)
+            _sweeper.start()
+    return _sweeper
+
+
+def stop_sweeper():
+    global _sweeper
+    with _sweeper_lock:
+        sweeper, _sweeper = _sweeper, None
+    if sweeper is not None:
+        sweeper.stop()
+
+
+def init_app(app):
+    global HOLD_PICKUP_HOURS, HOLD_SWEEP_INTERVAL
+
+    HOLD_PICKUP_HOURS = app.config.get("HOLD_PICKUP_HOURS", HOLD_PICKUP_HOURS)
+    HOLD_SWEEP_INTERVAL = app.config.get("HOLD_SWEEP_INTERVAL", HOLD_SWEEP_INTERVAL)
+    start_sweeper()
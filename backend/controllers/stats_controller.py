@@ -0,0 +1,200 @@
+from database import get_connection
+from datetime import datetime, timedelta
+
+# Materialised counters behind the admin dashboard. record_checkout() and
+# record_return() take the caller's cursor so the counters change in the
+# same transaction as checkout_history itself. The catalogue's copy totals
+# (stats_totals 'total_copies' / 'available_copies') follow the per-book
+# counters through triggers on books (database._m011_copy_totals).
+
+
+def record_checkout(cur, user_id, book_id, checkout_date):
+    cur.execute(
+        """
+        INSERT INTO stats_daily_checkouts (day, count) VALUES (?, 1)
+        ON CONFLICT(day) DO UPDATE SET count = count + 1
+    """,
+        (checkout_date[:10],),
+    )
+    cur.execute(
+        """
+        INSERT INTO stats_book_loans (book_id, count) VALUES (?, 1)
+        ON CONFLICT(book_id) DO UPDATE SET count = count + 1
+    """,
+        (book_id,),
+    )
+    cur.execute(
+        """
+        INSERT INTO stats_user_loans (user_id, count) VALUES (?, 1)
+        ON CONFLICT(user_id) DO UPDATE SET count = count + 1
+    """,
+        (user_id,),
+    )
+    cur.execute(
+        "UPDATE stats_totals SET value = value + 1 WHERE name = 'active_loans'"
+    )
+
+
+def record_return(cur, entry_id):
+    """
+    Call right after the entry's return_date has been set.
+    """
+    cur.execute(
+        """
+        SELECT julianday(return_date) - julianday(checkout_date) AS days
+        FROM checkout_history
+        WHERE id = ?
+    """,
+        (entry_id,),
+    )
+    row = cur.fetchone()
+    days = row["days"] if row and row["days"] is not None else 0.0
+
+    cur.execute(
+        "UPDATE stats_totals SET value = value - 1 WHERE name = 'active_loans'"
+    )
+    cur.execute(
+        "UPDATE stats_totals SET value = value + 1 WHERE name = 'returned_count'"
+    )
+    cur.execute(
+        "UPDATE stats_totals SET value = value + ? WHERE name = 'returned_days_sum'",
+        (days,),
+    )
+
+
+def rebuild_stats(cur):
+    """
+    Recompute every counter from checkout_history (backfill / repair).
+    """
+    cur.execute("DELETE FROM stats_daily_checkouts")
+    cur.execute(
+        """
+        INSERT INTO stats_daily_checkouts (day, count)
+        SELECT substr(checkout_date, 1, 10), COUNT(*)
+        FROM checkout_history
+        WHERE checkout_date IS NOT NULL
+        GROUP BY substr(checkout_date, 1, 10)
+    """
+    )
+
+    cur.execute("DELETE FROM stats_book_loans")
+    cur.execute(
+        """
+        INSERT INTO stats_book_loans (book_id, count)
+        SELECT book_id, COUNT(*) FROM checkout_history GROUP BY book_id
+    """
+    )
+
+    cur.execute("DELETE FROM stats_user_loans")
+    cur.execute(
+        """
+        INSERT INTO stats_user_loans (user_id, count)
+        SELECT user_id, COUNT(*) FROM checkout_history GROUP BY user_id
+    """
+    )
+
+    cur.execute("DELETE FROM stats_totals")
+    cur.execute(
+        """
+        INSERT INTO stats_totals (name, value)
+        SELECT 'active_loans', COUNT(*)
+        FROM checkout_history WHERE return_date IS NULL
+        UNION ALL
+        SELECT 'returned_count', COUNT(*)
+        FROM checkout_history WHERE return_date IS NOT NULL
+        UNION ALL
+        SELECT 'returned_days_sum',
+               COALESCE(SUM(julianday(return_date) - julianday(checkout_date)), 0)
+        FROM checkout_history WHERE return_date IS NOT NULL
+        UNION ALL
+        SELECT 'total_copies', COALESCE(SUM(total_copies), 0) FROM books
+        UNION ALL
+        SELECT 'available_copies', COALESCE(SUM(available_copies), 0) FROM books
+    """
+    )
+
+
+def rebuild_all_stats():
+    conn = get_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        rebuild_stats(conn.cursor())
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def dashboard_stats():
+    conn = get_connection()
+    cur = conn.cursor()
+
+    # totals
+    cur.execute("SELECT COUNT(*) as total_books FROM books")
+    total_books = cur.fetchone()["total_books"]
+
+    cur.execute("SELECT COUNT(*) as total_users FROM users")
+    total_users = cur.fetchone()["total_users"]
+
+    cur.execute("SELECT name, value FROM stats_totals")
+    totals = {r["name"]: r["value"] for r in cur.fetchall()}
+
+    # borrowing trend last 7 days (including days with 0)
+    end = datetime.now().date()
+    start = end - timedelta(days=6)
+
+    cur.execute(
+        """
+        SELECT day, count FROM stats_daily_checkouts
+        WHERE day BETWEEN ? AND ?
+    """,
+        (start.isoformat(), end.isoformat()),
+    )
+    raw = {r["day"]: r["count"] for r in cur.fetchall()}
+
+    trend = []
+    for i in range(7):
+        d = (start + timedelta(days=i)).isoformat()
+        trend.append({"date": d, "count": int(raw.get(d, 0))})
+
+    # top 5 most borrowed books
+    cur.execute(
+        """
+        SELECT b.id as book_id, b.title as title, s.count as count
+        FROM stats_book_loans s
+        JOIN books b ON b.id = s.book_id
+        ORDER BY s.count DESC
+        LIMIT 5
+    """
+    )
+    top_books = [dict(r) for r in cur.fetchall()]
+
+    # top active users (most checkouts)
+    cur.execute(
+        """
+        SELECT u.id as user_id, u.name as name, u.email as email, s.count as count
+        FROM stats_user_loans s
+        JOIN users u ON u.id = s.user_id
+        ORDER BY s.count DESC
+        LIMIT 5
+    """
+    )
+    top_users = [dict(r) for r in cur.fetchall()]
+
+    conn.close()
+
+    returned = totals.get("returned_count", 0)
+    avg_days = totals.get("returned_days_sum", 0.0) / returned if returned else 0.0
+
+    return {
+        "totals": {
+            "total_books": int(total_books),
+            "total_copies": int(totals.get("total_copies", 0)),
+            "available_copies": int(totals.get("available_copies", 0)),
+            "total_users": int(total_users),
+            "active_loans": int(totals.get("active_loans", 0)),
+        },
+        "trend_7d": trend,
+        "top_books": top_books,
+        "top_users": top_users,
+        "avg_borrow_days": round(avg_days, 2),
+    }
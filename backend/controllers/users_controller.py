@@ -1,60 +1,81 @@
-from database import get_connection
-import hashlib
-from datetime import datetime, timedelta
-
+import time
 
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+from database import get_connection
+from controllers.stats_controller import dashboard_stats
+from controllers.versions_controller import bump, current_versions, user_key, USERS
+from utils.cache import invalidate, user_cache, TAG_USERS
+from utils import cache
+from utils.passwords import hash_password, verify_password, needs_rehash
 
 
 def get_user_by_id(user_id):
     conn = get_connection()
     cur = conn.cursor()
-
-    # If DB is not migrated yet, this SELECT may fail. Fallback safely.
-    try:
-        cur.execute(
-            "SELECT id, name, email, role, is_active FROM users WHERE id = ?",
-            (user_id,),
-        )
-    except Exception:
-        cur.execute(
-            "SELECT id, name, email, role FROM users WHERE id = ?",
-            (user_id,),
-        )
-
+    cur.execute(
+        "SELECT id, name, email, role, is_active FROM users WHERE id = ?",
+        (user_id,),
+    )
     row = cur.fetchone()
     conn.close()
     return row
 
 
+def session_user(user_id):
+    """
+    (version, user) for the session's user, from the user cache.
+    A cached entry is used as-is for USER_CACHE_RECHECK seconds, so a busy
+    session costs no database work; after that one read of the user's
+    version counter (bumped in the same transaction as every write to the
+    user) confirms it or triggers a refetch. So a deactivation or role
+    change made in another worker applies within USER_CACHE_RECHECK.
+    """
+    now = time.monotonic()
+    cached = user_cache.get(user_id)
+    if cached is not None and now - cached[2] < cache.USER_CACHE_RECHECK:
+        return cached[0], cached[1]
+
+    # read the version first: a write landing after it leaves the stored
+    # version behind, so the next check refetches
+    version = current_versions([user_key(user_id)])[0]
+    if cached is not None and cached[0] == version:
+        user = cached[1]
+    else:
+        user = get_user_by_id(user_id)
+    if user is not None:
+        user_cache.set(user_id, (version, user, now), cache.USER_CACHE_TTL)
+    return version, user
+
+
+def get_session_user(user_id):
+    """
+    The session's user for login_required; see session_user().
+    """
+    return session_user(user_id)[1]
+
+
+def forget_user(user_id):
+    user_cache.delete(user_id)
+
+
 def create_user(name, email, password, role):
     if not role:
         role = "member"
 
+    password_hash = hash_password(password)
+
     conn = get_connection()
     cur = conn.cursor()
-
-    # If DB isn't migrated yet, inserting is_active will fail. Fallback safely.
-    try:
-        cur.execute(
-            """
-            INSERT INTO users (name, email, password, role, is_active)
-            VALUES (?, ?, ?, ?, 1)
-            """,
-            (name, email, hash_password(password), role),
-        )
-    except Exception:
-        cur.execute(
-            """
-            INSERT INTO users (name, email, password, role)
-            VALUES (?, ?, ?, ?)
-            """,
-            (name, email, hash_password(password), role),
-        )
-
+    cur.execute(
+        """
+        INSERT INTO users (name, email, password, role, is_active)
+        VALUES (?, ?, ?, ?, 1)
+        """,
+        (name, email, password_hash, role),
+    )
+    bump(cur, USERS)
     conn.commit()
     conn.close()
+    invalidate(TAG_USERS)
 
 
 def get_user_by_email(email):
@@ -77,19 +98,30 @@ def validate_user(email, password):
     if not user:
         return None
 
-    # sqlite3.Row doesn't support .get(). Also handle missing is_active column.
-    try:
-        is_active = int(user["is_active"])
-    except Exception:
-        is_active = 1
-
-    if is_active != 1:
+    if user["is_active"] != 1:
         return "deactivated"
 
-    if user["password"] == hash_password(password):
-        return user
+    if not verify_password(password, user["password"]):
+        return None
+
+    # upgrade legacy / outdated hashes while we have the plain password
+    if needs_rehash(user["password"]):
+        _rehash_password(user["id"], user["password"], password)
+
+    return user
 
-    return None
+
+def _rehash_password(user_id, old_hash, password):
+    new_hash = hash_password(password)
+    conn = get_connection()
+    cur = conn.cursor()
+    # only if nobody changed the password in the meantime
+    cur.execute(
+        "UPDATE users SET password = ? WHERE id = ? AND password = ?",
+        (new_hash, user_id, old_hash),
+    )
+    conn.commit()
+    conn.close()
 
 
 # ---------- ADMIN MANAGEMENT ----------
@@ -98,15 +130,7 @@ def validate_user(email, password):
 def get_all_users():
     conn = get_connection()
     cur = conn.cursor()
-
-    # fallback if no is_active yet
-    try:
-        cur.execute(
-            "SELECT id, name, email, role, is_active FROM users ORDER BY id DESC"
-        )
-    except Exception:
-        cur.execute("SELECT id, name, email, role FROM users ORDER BY id DESC")
-
+    cur.execute("SELECT id, name, email, role, is_active FROM users ORDER BY id DESC")
     rows = cur.fetchall()
     conn.close()
     return rows
@@ -115,32 +139,35 @@ def get_all_users():
 def set_user_active(user_id, is_active):
     conn = get_connection()
     cur = conn.cursor()
-
-    # if no is_active column, this will fail (requires migration)
     cur.execute(
         "UPDATE users SET is_active = ? WHERE id = ?",
         (1 if is_active else 0, user_id),
     )
+    bump(cur, USERS, user_key(user_id))
     conn.commit()
     conn.close()
+    forget_user(user_id)
 
 
 def update_user_role(user_id, role):
     conn = get_connection()
     cur = conn.cursor()
     cur.execute("UPDATE users SET role = ? WHERE id = ?", (role, user_id))
+    bump(cur, USERS, user_key(user_id))
     conn.commit()
     conn.close()
+    forget_user(user_id)
 
 
 def set_user_password(user_id, password):
+    password_hash = hash_password(password)
+
     conn = get_connection()
     cur = conn.cursor()
-    cur.execute(
-        "UPDATE users SET password = ? WHERE id = ?", (hash_password(password), user_id)
-    )
+    cur.execute("UPDATE users SET password = ? WHERE id = ?", (password_hash, user_id))
     conn.commit()
     conn.close()
+    forget_user(user_id)
 
 
 def update_my_profile(user_id, name, email):
@@ -162,8 +189,11 @@ def update_my_profile(user_id, name, email):
         "UPDATE users SET name = ?, email = ? WHERE id = ?",
         (name, email, user_id),
     )
+    bump(cur, USERS, user_key(user_id))
     conn.commit()
     conn.close()
+    forget_user(user_id)
+    invalidate(TAG_USERS)
     return True
 
 
@@ -176,111 +206,28 @@ def change_my_password(user_id, current_password, new_password):
     """
     conn = get_connection()
     cur = conn.cursor()
-
     cur.execute("SELECT password FROM users WHERE id = ?", (user_id,))
     row = cur.fetchone()
+    conn.close()
+
     if not row:
-        conn.close()
         return "not_found"
 
-    if row["password"] != hash_password(current_password):
-        conn.close()
+    # hashing is slow on purpose; the connection is closed, so the hashing
+    # pool hands the request's lease back before it waits or hashes
+    if not verify_password(current_password, row["password"]):
         return "wrong_current"
 
-    cur.execute(
-        "UPDATE users SET password = ? WHERE id = ?",
-        (hash_password(new_password), user_id),
-    )
+    new_hash = hash_password(new_password)
+
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("UPDATE users SET password = ? WHERE id = ?", (new_hash, user_id))
     conn.commit()
     conn.close()
     return True
 
 
 def admin_dashboard_data():
-    conn = get_connection()
-    cur = conn.cursor()
-
-    # totals
-    cur.execute("SELECT COUNT(*) as total_books FROM books")
-    total_books = cur.fetchone()["total_books"]
-
-    cur.execute("SELECT COUNT(*) as total_users FROM users")
-    total_users = cur.fetchone()["total_users"]
-
-    cur.execute(
-        "SELECT COUNT(*) as active_loans FROM checkout_history WHERE return_date IS NULL"
-    )
-    active_loans = cur.fetchone()["active_loans"]
-
-    # borrowing trend last 7 days (including days with 0)
-    end = datetime.now().date()
-    start = end - timedelta(days=6)
-
-    cur.execute(
-        """
-        SELECT substr(checkout_date, 1, 10) as day, COUNT(*) as count
-        FROM checkout_history
-        WHERE date(substr(checkout_date, 1, 10)) BETWEEN date(?) AND date(?)
-        GROUP BY day
-        ORDER BY day ASC
-    """,
-        (start.isoformat(), end.isoformat()),
-    )
-    raw = {r["day"]: r["count"] for r in cur.fetchall()}
-
-    trend = []
-    for i in range(7):
-        d = (start + timedelta(days=i)).isoformat()
-        trend.append({"date": d, "count": int(raw.get(d, 0))})
-
-    # top 5 most borrowed books
-    cur.execute(
-        """
-        SELECT b.id as book_id, b.title as title, COUNT(*) as count
-        FROM checkout_history c
-        JOIN books b ON b.id = c.book_id
-        GROUP BY b.id
-        ORDER BY count DESC
-        LIMIT 5
-    """
-    )
-    top_books = [dict(r) for r in cur.fetchall()]
-
-    # top active users (most checkouts)
-    cur.execute(
-        """
-        SELECT u.id as user_id, u.name as name, u.email as email, COUNT(*) as count
-        FROM checkout_history c
-        JOIN users u ON u.id = c.user_id
-        GROUP BY u.id
-        ORDER BY count DESC
-        LIMIT 5
-    """
-    )
-    top_users = [dict(r) for r in cur.fetchall()]
-
-    # average borrow duration (days) for returned books
-    # checkout_date / return_date are ISO strings -> use julianday
-    cur.execute(
-        """
-        SELECT AVG(julianday(return_date) - julianday(checkout_date)) as avg_days
-        FROM checkout_history
-        WHERE return_date IS NOT NULL
-    """
-    )
-    avg_days = cur.fetchone()["avg_days"]
-    avg_days = float(avg_days) if avg_days is not None else 0.0
-
-    conn.close()
-
-    return {
-        "totals": {
-            "total_books": int(total_books),
-            "total_users": int(total_users),
-            "active_loans": int(active_loans),
-        },
-        "trend_7d": trend,
-        "top_books": top_books,
-        "top_users": top_users,
-        "avg_borrow_days": round(avg_days, 2),
-    }
+    # served from the materialised counters in stats_controller
+    return dashboard_stats()
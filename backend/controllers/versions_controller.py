@@ -0,0 +1,78 @@
+import secrets
+
+import database
+from database import get_connection
+
+# Version counters behind the ETags in utils.etags. Writers call bump() with
+# their own cursor so a counter moves in the same transaction as the rows it
+# covers. Books are versioned by the book_changes log instead (kept by
+# triggers), so "books" and book_key() read from there.
+
+BOOKS = "books"
+# book titles / deletions, which show up in every loan history
+BOOK_TITLES = "book_titles"
+USERS = "users"
+# random per-database value, so a recreated database never reuses ETags
+EPOCH = "epoch"
+
+
+def book_key(book_id):
+    return f"book:{book_id}"
+
+
+def user_key(user_id):
+    return f"user:{user_id}"
+
+
+def loans_key(user_id):
+    return f"loans:user:{user_id}"
+
+
+def new_epoch():
+    return secrets.randbits(62)
+
+
+def bump(cur, *names):
+    cur.executemany(
+        """
+        INSERT INTO versions (name, version) VALUES (?, 1)
+        ON CONFLICT(name) DO UPDATE SET version = version + 1
+    """,
+        [(name,) for name in names],
+    )
+
+
+# EPOCH per database file; it never changes once set, so it is read once
+_epochs = {}
+
+
+def current_versions(names):
+    """
+    Current version of each name, in order; 0 for one never bumped.
+    """
+    epoch = _epochs.get(database.DB_NAME)
+    if epoch is not None and all(name == EPOCH for name in names):
+        return [epoch for _ in names]
+
+    conn = get_connection()
+    cur = conn.cursor()
+    result = []
+    for name in names:
+        if name == EPOCH and epoch is not None:
+            result.append(epoch)
+            continue
+        if name == BOOKS:
+            cur.execute("SELECT MAX(version) FROM book_changes")
+        elif name.startswith("book:"):
+            cur.execute(
+                "SELECT version FROM book_changes WHERE book_id = ?",
+                (int(name[len("book:") :]),),
+            )
+        else:
+            cur.execute("SELECT version FROM versions WHERE name = ?", (name,))
+        row = cur.fetchone()
+        result.append(row[0] if row and row[0] is not None else 0)
+        if name == EPOCH and result[-1]:
+            _epochs[database.DB_NAME] = result[-1]
+    conn.close()
+    return result
@@ -1,16 +1,664 @@
+import asyncio
+import functools
+import itertools
+import os
+import random
+import secrets
 import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-DB_NAME = "library.db"
+from flask import g, has_app_context
 
+DB_NAME = os.environ.get("LIBRARY_DB", "library.db")
 
-def get_connection():
-    conn = sqlite3.connect(DB_NAME, check_same_thread=False)
+# ---------- CONNECTION POOL SETTINGS ----------
+
+# max number of open connections per database file
+POOL_SIZE = 8
+
+# seconds to wait for a free connection before giving up
+POOL_TIMEOUT = 10.0
+
+# idle connections older than this (seconds) get a "SELECT 1" before reuse
+HEALTH_CHECK_INTERVAL = 30.0
+
+# write transactions that hit SQLITE_BUSY are retried this many times,
+# sleeping WRITE_RETRY_BACKOFF * 2**attempt (+ jitter) in between
+WRITE_RETRIES = 5
+WRITE_RETRY_BACKOFF = 0.02
+
+# ---------- STORAGE PROFILES ----------
+
+# PRAGMA sets applied (in order) to every new connection.
+# "wal" lets readers run while a checkout/return is being written.
+STORAGE_PROFILES = {
+    # plain SQLite defaults: rollback journal, synchronous=FULL
+    "default": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "busy_timeout": 5000,
+    },
+    "wal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",  # durable enough in WAL mode, far fewer fsyncs
+        "cache_size": -65536,  # negative = KiB, i.e. 64 MiB
+        "mmap_size": 268435456,  # 256 MiB
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+    # WAL, but every commit is fsynced
+    "wal-durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "cache_size": -65536,
+        "mmap_size": 268435456,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+}
+
+STORAGE_PROFILE = os.environ.get("LIBRARY_DB_PROFILE", "wal")
+
+# extra per-deployment overrides, applied after the profile
+PRAGMAS = {}
+
+# seconds between background WAL checkpoints (0 disables the scheduler)
+CHECKPOINT_INTERVAL = float(os.environ.get("LIBRARY_DB_CHECKPOINT_INTERVAL", 60))
+
+
+def profile_pragmas(profile=None):
+    name = profile or STORAGE_PROFILE
+    if name not in STORAGE_PROFILES:
+        raise ValueError(f"Unknown storage profile: {name}")
+    pragmas = dict(STORAGE_PROFILES[name])
+    pragmas.update(PRAGMAS)
+    return pragmas
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    pass
+
+
+def _open_connection(path, pragmas):
+    conn = sqlite3.connect(path, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name} = {value}")
     return conn
 
 
+class ConnectionPool:
+    """
+    Bounded pool of sqlite3 connections for one database file.
+    Connections are opened lazily (up to max_size) and reused after release.
+    """
+
+    def __init__(self, path, max_size=None, timeout=None, pragmas=None):
+        self.path = path
+        self.max_size = max_size or POOL_SIZE
+        self.timeout = POOL_TIMEOUT if timeout is None else timeout
+        self.pragmas = profile_pragmas() if pragmas is None else dict(pragmas)
+
+        self._idle = deque()  # (conn, released_at)
+        self._created = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, released_at = self._idle.pop()
+                    break
+
+                if self._created < self.max_size:
+                    self._created += 1
+                    conn, released_at = None, None
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(
+                        f"No free database connection after {timeout}s"
+                    )
+                self._cond.wait(remaining)
+
+        if conn is not None and self._is_healthy(conn, released_at):
+            return conn
+
+        if conn is not None:
+            self._safe_close(conn)
+
+        try:
+            return _open_connection(self.path, self.pragmas)
+        except Exception:
+            self._forget()
+            raise
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._safe_close(conn)
+            self._forget()
+            return
+
+        with self._cond:
+            if self._closed:
+                self._created -= 1
+                self._safe_close(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._created -= 1
+                self._safe_close(conn)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self._created,
+                "idle": len(self._idle),
+                "in_use": self._created - len(self._idle),
+                "max_size": self.max_size,
+            }
+
+    def _is_healthy(self, conn, released_at):
+        if time.monotonic() - released_at < HEALTH_CHECK_INTERVAL:
+            return True
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _forget(self):
+        with self._cond:
+            self._created -= 1
+            self._cond.notify()
+
+    @staticmethod
+    def _safe_close(conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+
+# ---------- QUERY INSTRUMENTATION ----------
+
+# listener(sql, params, seconds, rows, conn) is called once per finished
+# statement; conn is the raw sqlite3 connection it ran on, still held by the
+# caller for the duration of the call. With no listeners registered,
+# connections hand out plain sqlite3 cursors.
+_query_listeners = []
+
+
+def add_query_listener(listener):
+    if listener not in _query_listeners:
+        _query_listeners.append(listener)
+
+
+def remove_query_listener(listener):
+    if listener in _query_listeners:
+        _query_listeners.remove(listener)
+
+
+class InstrumentedCursor:
+    """
+    sqlite3.Cursor wrapper that times execute + fetches of each statement and
+    counts rows returned (SELECT) or affected (DML). A statement is reported
+    when the cursor moves on to the next one, is closed, or its connection
+    is closed.
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._pending = None  # [sql, params, seconds, rows]
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def _timed(self, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            if self._pending is not None:
+                self._pending[2] += time.perf_counter() - start
+
+    def execute(self, sql, params=()):
+        self._finish()
+        self._pending = [sql, params, 0.0, 0]
+        self._timed(self._cursor.execute, sql, params)
+        self._pending[3] = max(self._cursor.rowcount, 0)
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._finish()
+        seq_of_params = list(seq_of_params)
+        self._pending = [sql, f"<{len(seq_of_params)} rows>", 0.0, 0]
+        self._timed(self._cursor.executemany, sql, seq_of_params)
+        self._pending[3] = max(self._cursor.rowcount, 0)
+        return self
+
+    def fetchone(self):
+        row = self._timed(self._cursor.fetchone)
+        if row is not None and self._pending is not None:
+            self._pending[3] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        args = () if size is None else (size,)
+        rows = self._timed(self._cursor.fetchmany, *args)
+        if self._pending is not None:
+            self._pending[3] += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(self._cursor.fetchall)
+        if self._pending is not None:
+            self._pending[3] += len(rows)
+        return rows
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+    def close(self):
+        self._finish()
+        self._cursor.close()
+
+    def _finish(self):
+        pending, self._pending = self._pending, None
+        if pending is None:
+            return
+        for listener in list(_query_listeners):
+            try:
+                listener(*pending, self._cursor.connection)
+            except Exception:
+                # instrumentation must never break a query
+                pass
+
+    def __del__(self):
+        self._finish()
+
+
+class PooledConnection:
+    """
+    Thin proxy around a pooled sqlite3 connection.
+    close() hands the connection back instead of closing the file, so the
+    controllers keep their `conn = get_connection() ... conn.close()` shape.
+    """
+
+    def __init__(self, conn, on_close):
+        self._conn = conn
+        self._on_close = on_close
+        self._cursors = []
+
+    def __getattr__(self, name):
+        conn = self.__dict__.get("_conn")
+        if conn is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        return getattr(conn, name)
+
+    def cursor(self):
+        cur = self.__getattr__("cursor")()
+        if not _query_listeners:
+            return cur
+        cur = InstrumentedCursor(cur)
+        self._cursors.append(cur)
+        return cur
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # same semantics as sqlite3.Connection: commit/rollback, don't close
+        if exc_type is None:
+            self._conn.commit()
+        else:
+            self._conn.rollback()
+        return False
+
+    def close(self):
+        cursors, self._cursors = self._cursors, []
+        for cur in cursors:
+            cur._finish()
+
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._on_close(conn)
+
+    def __del__(self):
+        # a controller that raised before conn.close() must not leak its slot
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path=None):
+    path = path or DB_NAME
+    pool = _pools.get(path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(path)
+            if pool is None:
+                pool = ConnectionPool(path)
+                _pools[path] = pool
+    return pool
+
+
+def close_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+        checkpointers = list(_checkpointers.values())
+        _checkpointers.clear()
+    for checkpointer in checkpointers:
+        checkpointer.stop()
+    for pool in pools:
+        pool.close()
+
+
+def pool_stats():
+    """
+    path -> stats() for every open pool
+    """
+    with _pools_lock:
+        pools = list(_pools.items())
+    return {path: pool.stats() for path, pool in pools}
+
+
+# ---------- WAL CHECKPOINTS ----------
+
+
+class CheckpointScheduler:
+    """
+    Runs PRAGMA wal_checkpoint on a daemon thread so the WAL file is folded
+    back into the database outside of request handling.
+    """
+
+    def __init__(self, path, interval, mode="PASSIVE"):
+        self.path = path
+        self.interval = interval
+        self.mode = mode
+        self.last_result = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="wal-checkpoint", daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=self.interval + 1)
+
+    def checkpoint(self):
+        pool = get_pool(self.path)
+        conn = pool.acquire()
+        try:
+            # (busy, wal pages, pages checkpointed)
+            row = conn.execute(f"PRAGMA wal_checkpoint({self.mode})").fetchone()
+            self.last_result = tuple(row)
+        finally:
+            pool.release(conn)
+        return self.last_result
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.checkpoint()
+            except sqlite3.Error:
+                # busy/locked: try again next tick
+                pass
+
+
+_checkpointers = {}
+
+
+def start_checkpointer(path=None, interval=None):
+    path = path or DB_NAME
+    interval = CHECKPOINT_INTERVAL if interval is None else interval
+    if interval <= 0:
+        return None
+
+    with _pools_lock:
+        checkpointer = _checkpointers.get(path)
+        if checkpointer is None:
+            checkpointer = CheckpointScheduler(path, interval)
+            _checkpointers[path] = checkpointer
+            checkpointer.start()
+    return checkpointer
+
+
+# ---------- REQUEST-SCOPED CHECKOUT ----------
+
+
+def _request_lease(pool):
+    """
+    Inside a Flask app context every get_connection() shares one pooled
+    connection (login_required + the controller = one checkout per request).
+    It goes back to the pool in release_request_connection().
+    """
+    lease = g.get("_db_lease")
+    if lease is None or lease["pool"] is not pool:
+        if lease is not None:
+            lease["pool"].release(lease["conn"])
+        lease = {"pool": pool, "conn": pool.acquire(), "refs": 0}
+        g._db_lease = lease
+    lease["refs"] += 1
+    return lease
+
+
+def _close_lease_ref(lease, conn):
+    lease["refs"] -= 1
+    if lease["refs"] <= 0 and conn.in_transaction:
+        conn.rollback()
+
+
+def release_idle_request_connection():
+    """
+    Give the request's connection back to the pool early when no open
+    connection object uses it, e.g. before slow work that needs no database.
+    A later get_connection() in the request takes a fresh lease.
+    """
+    if not has_app_context():
+        return
+    lease = g.get("_db_lease")
+    if lease is not None and lease["refs"] <= 0:
+        release_request_connection()
+
+
+def release_request_connection(exc=None):
+    lease = g.pop("_db_lease", None)
+    if lease is not None:
+        lease["pool"].release(lease["conn"])
+
+
+def init_app(app):
+    global STORAGE_PROFILE, CHECKPOINT_INTERVAL
+
+    STORAGE_PROFILE = app.config.get("DB_STORAGE_PROFILE", STORAGE_PROFILE)
+    CHECKPOINT_INTERVAL = app.config.get("DB_CHECKPOINT_INTERVAL", CHECKPOINT_INTERVAL)
+
+    app.teardown_appcontext(release_request_connection)
+
+    if profile_pragmas().get("journal_mode", "").upper() == "WAL":
+        start_checkpointer()
+
+
+def get_connection():
+    pool = get_pool()
+
+    if has_app_context():
+        lease = _request_lease(pool)
+        return PooledConnection(
+            lease["conn"], lambda conn: _close_lease_ref(lease, conn)
+        )
+
+    # executor threads wait for a connection for a shorter, bounded time
+    timeout = getattr(_executor_thread, "pool_timeout", None)
+    return PooledConnection(pool.acquire(timeout), pool.release)
+
+
+# ---------- ASYNC ACCESS ----------
+
+# threads that run blocking controller calls for the async app; no more than
+# the pool can serve at once
+DB_EXECUTOR_THREADS = int(os.environ.get("LIBRARY_DB_EXECUTOR_THREADS", POOL_SIZE))
+
+# seconds an executor thread waits for a pooled connection (vs POOL_TIMEOUT).
+# Streams keep their connection between chunks, so the pool can be full while
+# executor threads are free; a short request like /me then fails fast with
+# PoolTimeout (503 in the async app) instead of parking a thread for 10s.
+DB_EXECUTOR_POOL_TIMEOUT = float(
+    os.environ.get("LIBRARY_DB_EXECUTOR_POOL_TIMEOUT", 1.0)
+)
+
+# rows fetched per executor hop when an async caller iterates a stream
+ASYNC_STREAM_CHUNK = 500
+
+_db_executor = None
+_db_executor_lock = threading.Lock()
+_executor_thread = threading.local()
+
+
+def _init_executor_thread():
+    _executor_thread.pool_timeout = DB_EXECUTOR_POOL_TIMEOUT
+
+
+def get_db_executor():
+    global _db_executor
+    if _db_executor is None:
+        with _db_executor_lock:
+            if _db_executor is None:
+                _db_executor = ThreadPoolExecutor(
+                    max_workers=DB_EXECUTOR_THREADS,
+                    thread_name_prefix="db",
+                    initializer=_init_executor_thread,
+                )
+    return _db_executor
+
+
+def shutdown_db_executor():
+    global _db_executor
+    with _db_executor_lock:
+        executor, _db_executor = _db_executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+async def run_db(fn, *args, **kwargs):
+    """
+    Await a blocking database call on the DB executor.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_db_executor(), functools.partial(fn, *args, **kwargs)
+    )
+
+
+async def iterate_db(rows, chunk=ASYNC_STREAM_CHUNK):
+    """
+    Async-iterate a blocking iterator (e.g. a history generator). Each chunk
+    is fetched in its own executor call, so a long stream keeps its pooled
+    connection but never holds an executor thread between chunks.
+    """
+    it = iter(rows)
+    try:
+        while True:
+            batch = await run_db(lambda: list(itertools.islice(it, chunk)))
+            if not batch:
+                return
+            for row in batch:
+                yield row
+    finally:
+        close = getattr(it, "close", None)
+        if close is not None:
+            await run_db(close)
+
+
+# ---------- WRITE TRANSACTIONS ----------
+
+
+def _is_busy(exc):
+    msg = str(exc).lower()
+    return "locked" in msg or "busy" in msg
+
+
+def run_in_transaction(work, retries=None):
+    """
+    Run work(cur) inside BEGIN IMMEDIATE ... COMMIT and return its result.
+    IMMEDIATE takes the write lock up front, so a read-check-write inside
+    work() cannot be interleaved with another writer. SQLITE_BUSY is
+    retried with exponential backoff; anything else rolls back and raises.
+    """
+    retries = WRITE_RETRIES if retries is None else retries
+    attempt = 0
+
+    while True:
+        conn = get_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            result = work(conn.cursor())
+            conn.commit()
+            return result
+        except sqlite3.OperationalError as e:
+            if conn.in_transaction:
+                conn.rollback()
+            if not _is_busy(e) or attempt >= retries:
+                raise
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        delay = WRITE_RETRY_BACKOFF * (2**attempt)
+        time.sleep(delay + random.uniform(0, delay))
+        attempt += 1
+
+
 def init_db():
-    with get_connection() as conn:
+    conn = get_connection()
+    try:
+        # IMMEDIATE: concurrent workers starting up wait here instead of
+        # racing each other's DDL
+        conn.execute("BEGIN IMMEDIATE")
         cur = conn.cursor()
 
         # Users table
@@ -27,34 +675,547 @@ def init_db():
         """
         )
 
-    # Books table
+        # Books table
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS books (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title TEXT NOT NULL,
+                author TEXT NOT NULL,
+                year INTEGER,
+                language TEXT,
+                available INTEGER DEFAULT 1
+            )
+        """
+        )
+
+        # Checkout table
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS checkout_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER,
+                book_id INTEGER,
+                checkout_date TEXT,
+                return_date TEXT,
+                FOREIGN KEY(user_id) REFERENCES users(id),
+                FOREIGN KEY(book_id) REFERENCES books(id)
+            )
+        """
+        )
+
+        migrate(cur)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# ---------- MIGRATIONS ----------
+
+
+def _table_columns(cur, table):
+    return {row["name"] for row in cur.execute(f"PRAGMA table_info({table})")}
+
+
+def _m001_users_is_active(cur):
+    # databases created before is_active existed
+    if "is_active" not in _table_columns(cur, "users"):
+        cur.execute("ALTER TABLE users ADD COLUMN is_active INTEGER DEFAULT 1")
+    cur.execute("UPDATE users SET is_active = 1 WHERE is_active IS NULL")
+
+
+def _m002_checkout_history_indexes(cur):
+    # open loan lookup (get_open_checkout_entry) + active loan count
+    cur.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_checkout_open
+        ON checkout_history (user_id, book_id)
+        WHERE return_date IS NULL
+    """
+    )
+    # all_history ordering + dashboard 7-day trend range
+    cur.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_checkout_date
+        ON checkout_history (checkout_date)
+    """
+    )
+    # user_history / book_history / top users / top books
+    cur.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_checkout_user
+        ON checkout_history (user_id, checkout_date)
+    """
+    )
+    cur.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_checkout_book
+        ON checkout_history (book_id, checkout_date)
+    """
+    )
+    # covers the average borrow duration query
+    cur.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_checkout_returned
+        ON checkout_history (checkout_date, return_date)
+        WHERE return_date IS NOT NULL
+    """
+    )
+
+
+def _m003_books_listing_indexes(cur):
+    # keyset pagination by title/author (rowid is the implicit tie-breaker)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_books_title ON books (title)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_books_author ON books (author)")
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_books_language_year ON books (language, year)"
+    )
+
+
+def _m004_books_fts(cur):
+    # external-content FTS5 index over books, kept in sync by triggers so
+    # every write path (routes, bulk loads, raw SQL) stays searchable
+    cur.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+            title, author, language,
+            content='books', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts (rowid, title, author, language)
+            VALUES (new.id, new.title, new.author, new.language);
+        END
+    """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author, language)
+            VALUES ('delete', old.id, old.title, old.author, old.language);
+        END
+    """
+    )
+    # only re-index when searchable columns change (not on availability flips)
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS books_fts_au
+        AFTER UPDATE OF title, author, language ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author, language)
+            VALUES ('delete', old.id, old.title, old.author, old.language);
+            INSERT INTO books_fts (rowid, title, author, language)
+            VALUES (new.id, new.title, new.author, new.language);
+        END
+    """
+    )
+    cur.execute("INSERT INTO books_fts (books_fts) VALUES ('rebuild')")
+
+
+def _m005_dashboard_stats(cur):
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS stats_daily_checkouts (
+            day TEXT PRIMARY KEY,
+            count INTEGER NOT NULL DEFAULT 0
+        )
+    """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS stats_book_loans (
+            book_id INTEGER PRIMARY KEY,
+            count INTEGER NOT NULL DEFAULT 0
+        )
+    """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS stats_user_loans (
+            user_id INTEGER PRIMARY KEY,
+            count INTEGER NOT NULL DEFAULT 0
+        )
+    """
+    )
+    # active_loans, returned_count, returned_days_sum
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS stats_totals (
+            name TEXT PRIMARY KEY,
+            value REAL NOT NULL DEFAULT 0
+        )
+    """
+    )
+    # top-5 rankings read the head of these instead of sorting
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_stats_book_loans_count "
+        "ON stats_book_loans (count DESC)"
+    )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_stats_user_loans_count "
+        "ON stats_user_loans (count DESC)"
+    )
+
+    # backfill from the existing history; kept here rather than calling
+    # stats_controller.rebuild_stats so the migration stays fixed to the
+    # schema of this version
+    cur.execute(
+        """
+        INSERT INTO stats_daily_checkouts (day, count)
+        SELECT substr(checkout_date, 1, 10), COUNT(*)
+        FROM checkout_history
+        WHERE checkout_date IS NOT NULL
+        GROUP BY substr(checkout_date, 1, 10)
+    """
+    )
+    cur.execute(
+        """
+        INSERT INTO stats_book_loans (book_id, count)
+        SELECT book_id, COUNT(*) FROM checkout_history GROUP BY book_id
+    """
+    )
+    cur.execute(
+        """
+        INSERT INTO stats_user_loans (user_id, count)
+        SELECT user_id, COUNT(*) FROM checkout_history GROUP BY user_id
+    """
+    )
+    cur.execute(
+        """
+        INSERT INTO stats_totals (name, value)
+        SELECT 'active_loans', COUNT(*)
+        FROM checkout_history WHERE return_date IS NULL
+        UNION ALL
+        SELECT 'returned_count', COUNT(*)
+        FROM checkout_history WHERE return_date IS NOT NULL
+        UNION ALL
+        SELECT 'returned_days_sum',
+               COALESCE(SUM(julianday(return_date) - julianday(checkout_date)), 0)
+        FROM checkout_history WHERE return_date IS NOT NULL
+    """
+    )
+
+
+def _m006_books_isbn(cur):
+    # optional ISBN, unique when present (bulk import upserts on it)
+    if "isbn" not in _table_columns(cur, "books"):
+        cur.execute("ALTER TABLE books ADD COLUMN isbn TEXT")
+    cur.execute(
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_books_isbn
+        ON books (isbn) WHERE isbn IS NOT NULL
+    """
+    )
+
+
+def _m007_book_changes(cur):
+    # one row per book ever seen: the catalogue version of its latest change,
+    # and whether that change was a delete (tombstone). Triggers stamp every
+    # write path, so clients can sync with /books/changes?since=<version>.
+    # (UPSERT rather than OR REPLACE: an outer statement's conflict clause
+    # would override the trigger's.)
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS book_changes (
+            book_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL,
+            deleted INTEGER NOT NULL DEFAULT 0
+        )
+    """
+    )
+    cur.execute(
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_book_changes_version
+        ON book_changes (version)
+    """
+    )
+    for name, event, book, deleted in (
+        ("ai", "INSERT", "new.id", 0),
+        ("au", "UPDATE", "new.id", 0),
+        ("ad", "DELETE", "old.id", 1),
+    ):
+        cur.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS book_changes_{name}
+            AFTER {event} ON books BEGIN
+                INSERT INTO book_changes (book_id, version, deleted)
+                VALUES (
+                    {book},
+                    (SELECT COALESCE(MAX(version), 0) + 1 FROM book_changes),
+                    {deleted}
+                )
+                ON CONFLICT(book_id) DO UPDATE SET
+                    version = excluded.version,
+                    deleted = excluded.deleted;
+            END
+        """
+        )
+    cur.execute(
+        """
+        INSERT OR IGNORE INTO book_changes (book_id, version, deleted)
+        SELECT id, id, 0 FROM books
+    """
+    )
+
+
+def _m008_versions(cur):
+    # counters behind the ETags on the read endpoints (controllers/
+    # versions_controller.py); bumped by writers in their own transaction
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+    """
+    )
+
+    # the 'epoch' row (versions_controller.EPOCH) starts at a random value,
+    # as versions_controller.new_epoch() does
+    cur.execute(
+        "INSERT OR IGNORE INTO versions (name, version) VALUES ('epoch', ?)",
+        (secrets.randbits(62),),
+    )
+
+
+def _m009_copies(cur):
+    # physical copies of a title. books.total_copies / available_copies are
+    # denormalised counters the checkout engine keeps in step with copies,
+    # and books.available stays as the "any copy on the shelf" flag.
+    if "total_copies" not in _table_columns(cur, "books"):
+        cur.execute(
+            "ALTER TABLE books ADD COLUMN total_copies INTEGER NOT NULL DEFAULT 1"
+        )
+        cur.execute(
+            "ALTER TABLE books ADD COLUMN available_copies INTEGER NOT NULL DEFAULT 1"
+        )
+    if "copy_id" not in _table_columns(cur, "checkout_history"):
+        cur.execute(
+            "ALTER TABLE checkout_history ADD COLUMN copy_id INTEGER "
+            "REFERENCES copies(id)"
+        )
     cur.execute(
         """
-        CREATE TABLE IF NOT EXISTS books (
+        CREATE TABLE IF NOT EXISTS copies (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            author TEXT NOT NULL,
-            year INTEGER,
-            language TEXT,
-            available INTEGER DEFAULT 1
+            book_id INTEGER NOT NULL,
+            barcode TEXT NOT NULL UNIQUE,
+            status TEXT NOT NULL DEFAULT 'available',
+            FOREIGN KEY(book_id) REFERENCES books(id)
+        )
+    """
+    )
+    # "first available copy of this book" in the checkout engine
+    cur.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_copies_book_status
+        ON copies (book_id, status)
+    """
+    )
+
+    # every existing book becomes one copy, out if it has an open loan
+    cur.execute(
+        """
+        INSERT INTO copies (book_id, barcode, status)
+        SELECT id, id || '-1',
+            CASE
+                WHEN available = 1 THEN 'available'
+                WHEN EXISTS (
+                    SELECT 1 FROM checkout_history c
+                    WHERE c.book_id = books.id AND c.return_date IS NULL
+                ) THEN 'on_loan'
+                ELSE 'unavailable'
+            END
+        FROM books
+        WHERE id NOT IN (SELECT book_id FROM copies)
+    """
+    )
+    cur.execute(
+        """
+        UPDATE checkout_history
+        SET copy_id = (
+            SELECT id FROM copies WHERE copies.book_id = checkout_history.book_id
         )
+        WHERE return_date IS NULL AND copy_id IS NULL
+    """
+    )
+    # touches every row on purpose: the book_changes triggers restamp them,
+    # so delta-sync clients pick up the new columns
+    cur.execute(
+        "UPDATE books SET available_copies = CASE WHEN available = 1 THEN 1 ELSE 0 END"
+    )
+
+    # new books start with one copy, on the shelf unless inserted unavailable
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS books_copies_ai AFTER INSERT ON books BEGIN
+            INSERT INTO copies (book_id, barcode, status)
+            VALUES (
+                new.id,
+                new.id || '-1',
+                CASE WHEN new.available = 0 THEN 'unavailable' ELSE 'available' END
+            );
+            UPDATE books SET available_copies = 0
+            WHERE id = new.id AND new.available = 0;
+        END
+    """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS books_copies_ad AFTER DELETE ON books BEGIN
+            DELETE FROM copies WHERE book_id = old.id;
+        END
     """
     )
 
-    # Checkout table
+
+def _m010_holds(cur):
+    # reservation queue, one row per reader per title. A hold is 'waiting'
+    # until a copy is set aside for it ('ready', with copy_id / expires_at),
+    # then 'fulfilled' by the checkout, or 'cancelled' / 'expired'.
     cur.execute(
         """
-        CREATE TABLE IF NOT EXISTS checkout_history (
+        CREATE TABLE IF NOT EXISTS holds (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            book_id INTEGER,
-            checkout_date TEXT,
-            return_date TEXT,
+            book_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            created_at TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'waiting',
+            copy_id INTEGER,
+            expires_at TEXT,
+            FOREIGN KEY(book_id) REFERENCES books(id),
             FOREIGN KEY(user_id) REFERENCES users(id),
-            FOREIGN KEY(book_id) REFERENCES books(id)
+            FOREIGN KEY(copy_id) REFERENCES copies(id)
+        )
+    """
+    )
+    # a title's queue in FIFO order; only waiting rows, so it stays small
+    cur.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_holds_queue
+        ON holds (book_id, created_at) WHERE status = 'waiting'
+    """
+    )
+    # one open hold per reader and title, and "my holds"
+    cur.execute(
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_holds_open
+        ON holds (user_id, book_id) WHERE status IN ('waiting', 'ready')
+    """
+    )
+    # the sweeper's scan for uncollected copies
+    cur.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_holds_expiry
+        ON holds (expires_at) WHERE status = 'ready'
+    """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS books_holds_ad AFTER DELETE ON books BEGIN
+            UPDATE holds SET status = 'cancelled'
+            WHERE book_id = old.id AND status IN ('waiting', 'ready');
+        END
+    """
+    )
+
+
+def _m011_copy_totals(cur):
+    # catalogue-wide copy counts for the dashboard, kept in step with
+    # books.total_copies / available_copies by triggers, so every writer of
+    # those counters (checkouts, returns, holds, copy management, imports)
+    # moves the totals in its own transaction
+    cur.execute(
+        """
+        INSERT OR REPLACE INTO stats_totals (name, value)
+        SELECT 'total_copies', COALESCE(SUM(total_copies), 0) FROM books
+        UNION ALL
+        SELECT 'available_copies', COALESCE(SUM(available_copies), 0) FROM books
+    """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS books_copy_totals_ai AFTER INSERT ON books BEGIN
+            UPDATE stats_totals SET value = value + new.total_copies
+            WHERE name = 'total_copies';
+            UPDATE stats_totals SET value = value + new.available_copies
+            WHERE name = 'available_copies';
+        END
+    """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS books_copy_totals_au
+        AFTER UPDATE OF total_copies, available_copies ON books
+        WHEN old.total_copies != new.total_copies
+          OR old.available_copies != new.available_copies
+        BEGIN
+            UPDATE stats_totals
+            SET value = value + new.total_copies - old.total_copies
+            WHERE name = 'total_copies';
+            UPDATE stats_totals
+            SET value = value + new.available_copies - old.available_copies
+            WHERE name = 'available_copies';
+        END
+    """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS books_copy_totals_ad AFTER DELETE ON books BEGIN
+            UPDATE stats_totals SET value = value - old.total_copies
+            WHERE name = 'total_copies';
+            UPDATE stats_totals SET value = value - old.available_copies
+            WHERE name = 'available_copies';
+        END
+    """
+    )
+
+
+# (version, description, step) -- append only, never renumber
+MIGRATIONS = [
+    (1, "users.is_active column", _m001_users_is_active),
+    (2, "checkout_history indexes", _m002_checkout_history_indexes),
+    (3, "books listing indexes", _m003_books_listing_indexes),
+    (4, "books full-text search", _m004_books_fts),
+    (5, "dashboard stats tables", _m005_dashboard_stats),
+    (6, "books.isbn column", _m006_books_isbn),
+    (7, "book change log", _m007_book_changes),
+    (8, "version counters", _m008_versions),
+    (9, "book copies", _m009_copies),
+    (10, "hold queue", _m010_holds),
+    (11, "dashboard copy totals", _m011_copy_totals),
+]
+
+
+def schema_version(cur):
+    row = cur.execute("SELECT MAX(version) AS v FROM schema_version").fetchone()
+    return row["v"] or 0
+
+
+def migrate(cur):
+    """
+    Apply pending MIGRATIONS in order. Must run inside a write transaction;
+    already-applied versions are skipped, so calling it on every startup is safe.
+    """
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
         )
     """
     )
 
-    conn.commit()
-    conn.close()
+    current = schema_version(cur)
+    for version, description, step in MIGRATIONS:
+        if version <= current:
+            continue
+        step(cur)
+        cur.execute(
+            "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+            (version, description),
+        )
@@ -0,0 +1,342 @@
+"""
+Fill a database with a large, realistic synthetic library.
+
+    python generate_data.py --db big.db --users 100000 --books 200000 --loans 5000000
+
+Book popularity follows a Zipf distribution (and so does how often each user
+borrows), loan lengths are log-normal around two weeks, and loans still out
+at --end are left open with their book marked unavailable; each book is on
+loan to at most one user at a time. Output depends only on --seed and --end.
+Rows go straight into the init_db() schema in large transactions, and the
+dashboard stats are rebuilt at the end.
+"""
+
+import argparse
+import bisect
+import datetime
+import itertools
+import json
+import math
+import random
+import sys
+import time
+
+import database
+from controllers.stats_controller import rebuild_stats
+from utils.passwords import hash_password
+
+DEFAULT_BATCH_SIZE = 50000
+
+# first user; every generated user shares the same password
+ADMIN_EMAIL = "admin@example.com"
+DEFAULT_PASSWORD = "password123"
+
+ROLE_MIX = (("member", 0.90), ("librarian", 0.08), ("admin", 0.02))
+INACTIVE_SHARE = 0.02
+LANGUAGE_MIX = (
+    ("EN", 0.60),
+    ("DE", 0.10),
+    ("FR", 0.10),
+    ("ES", 0.10),
+    ("FA", 0.05),
+    ("AR", 0.05),
+)
+
+BOOK_ZIPF_S = 1.1
+USER_ZIPF_S = 0.8
+
+# log-normal loan length: median LOAN_MEDIAN_DAYS, most within a few weeks
+LOAN_MEDIAN_DAYS = 14
+LOAN_SIGMA = 0.6
+MAX_LOAN_DAYS = 180
+
+# a loan that picks a book already out tries a couple of other popular
+# books, then some picked at random, before it is dropped
+POPULAR_REDRAWS = 2
+RANDOM_REDRAWS = 8
+
+FIRST_NAMES = (
+    "Ali Sara Omar Lena Yusuf Mina David Emma Noah Zahra Lucas Aisha Mateo Nora "
+    "Hamid Julia Reza Chloe Karim Maya Farid Elena Samir Ines Tariq Olivia"
+).split()
+LAST_NAMES = (
+    "Hemat Karimi Smith Nguyen Garcia Muller Rossi Haddad Novak Silva Ahmadi "
+    "Johnson Dubois Kowalski Yilmaz Tanaka Costa Larsen Rahimi Petrov Okafor"
+).split()
+TITLE_WORDS = (
+    "Silent River Garden Empire Shadow Winter Letters Night City Glass Desert "
+    "Memory Stone Light Ocean Mountain Secret Voyage Fire Song House Road Map "
+    "Kingdom Storm Paper Clock Mirror Island Forest Journey Harvest Bridge"
+).split()
+
+
+def _cumulative(weights):
+    return list(itertools.accumulate(weights))
+
+
+def _zipf_cumulative(n, s):
+    return _cumulative(1 / (k**s) for k in range(1, n + 1))
+
+
+def _pick(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights=weights)[0]
+
+
+def _isbn13(n):
+    digits = f"978{n:09d}"
+    total = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits))
+    return digits + str((10 - total % 10) % 10)
+
+
+def _batched(rows, size):
+    it = iter(rows)
+    while True:
+        batch = list(itertools.islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _write(conn, sql, rows, batch_size):
+    written = 0
+    for batch in _batched(rows, batch_size):
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany(sql, batch)
+        conn.commit()
+        written += len(batch)
+    return written
+
+
+def _drop_indexes(conn, table):
+    """
+    Drop the explicit indexes on table; returns their CREATE statements.
+    """
+    rows = conn.execute(
+        "SELECT name, sql FROM sqlite_master "
+        "WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+        (table,),
+    ).fetchall()
+    conn.execute("BEGIN IMMEDIATE")
+    for row in rows:
+        conn.execute(f"DROP INDEX {row['name']}")
+    conn.commit()
+    return [row["sql"] for row in rows]
+
+
+# ---------- ROWS ----------
+
+
+def user_rows(rng, users, password):
+    yield ("Library Admin", ADMIN_EMAIL, password, "admin", 1)
+    for n in range(1, users):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        active = 0 if rng.random() < INACTIVE_SHARE else 1
+        yield (name, f"user{n}@example.com", password, _pick(rng, ROLE_MIX), active)
+
+
+def book_rows(rng, books, end_year):
+    authors = max(1, books // 8)
+    for n in range(1, books + 1):
+        words = rng.randint(1, 3)
+        title = " ".join(rng.sample(TITLE_WORDS, words))
+        if rng.random() < 0.3:
+            title = f"The {title}"
+        author_id = rng.randrange(authors)
+        author = f"{FIRST_NAMES[author_id % len(FIRST_NAMES)]} " + (
+            f"{LAST_NAMES[author_id % len(LAST_NAMES)]} {author_id}"
+        )
+        year = max(1800, end_year - int(rng.expovariate(1 / 25)))
+        yield (title, author, year, _pick(rng, LANGUAGE_MIX), _isbn13(n))
+
+
+def loan_rows(rng, books, users, loans, start, end, open_books):
+    """
+    Loans in checkout order. Books and borrowers are drawn by Zipf rank over
+    a shuffled id list, so popularity is not tied to id order. open_books
+    collects the ids of books still out at `end`.
+    """
+    book_ids = list(range(1, books + 1))
+    rng.shuffle(book_ids)
+    book_cum = _zipf_cumulative(books, BOOK_ZIPF_S)
+    user_ids = list(range(1, users + 1))
+    rng.shuffle(user_ids)
+    user_cum = _zipf_cumulative(users, USER_ZIPF_S)
+    book_total = book_cum[-1]
+
+    span = (end - start).total_seconds()
+    busy_until = [0.0] * (books + 1)
+    mu = math.log(LOAN_MEDIAN_DAYS * 86400)
+    max_loan = MAX_LOAN_DAYS * 86400
+    redraws = POPULAR_REDRAWS + RANDOM_REDRAWS
+
+    # time is walked in slices so only one slice of timestamps is in memory
+    slices = max(1, loans // DEFAULT_BATCH_SIZE)
+    for s in range(slices):
+        count = loans // slices + (s < loans % slices)
+        lo, hi = span * s / slices, span * (s + 1) / slices
+        offsets = sorted(rng.uniform(lo, hi) for _ in range(count))
+        drawn_books = rng.choices(book_ids, cum_weights=book_cum, k=count)
+        drawn_users = rng.choices(user_ids, cum_weights=user_cum, k=count)
+
+        for at, book_id, user_id in zip(offsets, drawn_books, drawn_users):
+            tries = 0
+            while busy_until[book_id] > at and tries < redraws:
+                if tries < POPULAR_REDRAWS:
+                    rank = bisect.bisect_left(book_cum, rng.random() * book_total)
+                    book_id = book_ids[min(rank, books - 1)]
+                else:
+                    book_id = rng.randint(1, books)
+                tries += 1
+            if busy_until[book_id] > at:
+                continue  # every pick was out; the reader goes home
+
+            length = min(rng.lognormvariate(mu, LOAN_SIGMA), max_loan)
+            back = at + length
+            checkout_date = (start + datetime.timedelta(seconds=at)).isoformat()
+            if back >= span:
+                busy_until[book_id] = math.inf
+                open_books.append(book_id)
+                return_date = None
+            else:
+                busy_until[book_id] = back
+                return_date = (start + datetime.timedelta(seconds=back)).isoformat()
+            yield (user_id, book_id, checkout_date, return_date)
+
+
+# ---------- GENERATE ----------
+
+
+def generate(
+    users,
+    books,
+    loans,
+    days=730,
+    end=None,
+    seed=1,
+    password=DEFAULT_PASSWORD,
+    batch_size=DEFAULT_BATCH_SIZE,
+):
+    """
+    Write the library into database.DB_NAME, which must not hold any users,
+    books or loans yet. returns a summary dict.
+    """
+    rng = random.Random(seed)
+    end = end or datetime.datetime.combine(datetime.date.today(), datetime.time())
+    start = end - datetime.timedelta(days=days)
+    users, books = max(1, users), max(1, books)
+    started = time.perf_counter()
+
+    database.init_db()
+    conn = database.get_connection()
+    try:
+        for table in ("users", "books", "checkout_history"):
+            if conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone():
+                raise ValueError(f"{database.DB_NAME} already has {table}")
+
+        written_users = _write(
+            conn,
+            "INSERT INTO users (name, email, password, role, is_active) "
+            "VALUES (?, ?, ?, ?, ?)",
+            user_rows(rng, users, hash_password(password)),
+            batch_size,
+        )
+        written_books = _write(
+            conn,
+            "INSERT INTO books (title, author, year, language, isbn, available) "
+            "VALUES (?, ?, ?, ?, ?, 1)",
+            book_rows(rng, books, end.year),
+            batch_size,
+        )
+
+        # loading into an unindexed table and building the indexes once is
+        # several times faster than maintaining them row by row
+        indexes = _drop_indexes(conn, "checkout_history")
+        open_books = []
+        written_loans = _write(
+            conn,
+            "INSERT INTO checkout_history (user_id, book_id, checkout_date, "
+            "return_date) VALUES (?, ?, ?, ?)",
+            loan_rows(rng, books, users, loans, start, end, open_books),
+            batch_size,
+        )
+
+        conn.execute("BEGIN IMMEDIATE")
+        for sql in indexes:
+            conn.execute(sql)
+        # each book has the single copy its insert trigger created
+        conn.executemany(
+            "UPDATE books SET available = 0, available_copies = 0 WHERE id = ?",
+            [(b,) for b in open_books],
+        )
+        conn.executemany(
+            "UPDATE copies SET status = 'on_loan' WHERE book_id = ?",
+            [(b,) for b in open_books],
+        )
+        conn.execute(
+            """
+            UPDATE checkout_history
+            SET copy_id = (
+                SELECT id FROM copies WHERE copies.book_id = checkout_history.book_id
+            )
+            WHERE return_date IS NULL
+        """
+        )
+        rebuild_stats(conn.cursor())
+        conn.commit()
+    finally:
+        conn.close()
+
+    return {
+        "db": database.DB_NAME,
+        "users": written_users,
+        "books": written_books,
+        "loans": written_loans,
+        "open_loans": len(open_books),
+        "from": start.date().isoformat(),
+        "to": end.date().isoformat(),
+        "seed": seed,
+        "seconds": round(time.perf_counter() - started, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", default=database.DB_NAME, help="SQLite file")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--books", type=int, default=50000)
+    parser.add_argument("--loans", type=int, default=1000000)
+    parser.add_argument("--days", type=int, default=730, help="history length")
+    parser.add_argument(
+        "--end",
+        type=datetime.datetime.fromisoformat,
+        help="last day of history (default: today)",
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--password", default=DEFAULT_PASSWORD)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    database.DB_NAME = args.db
+    try:
+        summary = generate(
+            args.users,
+            args.books,
+            args.loans,
+            days=args.days,
+            end=args.end,
+            seed=args.seed,
+            password=args.password,
+            batch_size=args.batch_size,
+        )
+    except ValueError as e:
+        raise SystemExit(str(e))
+    finally:
+        database.close_pools()
+
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
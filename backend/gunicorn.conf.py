@@ -0,0 +1,63 @@
+"""
+gunicorn settings, read from LIBRARY_* environment variables.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The master creates/migrates the schema once before forking; each worker
+then builds its own app, connection pools and background threads.
+"""
+
+import multiprocessing
+import os
+
+import database
+
+bind = os.environ.get("LIBRARY_BIND", "0.0.0.0:5000")
+
+# one process per core; threads overlap the time requests spend in SQLite
+# and in password hashing
+workers = int(os.environ.get("LIBRARY_WORKERS", multiprocessing.cpu_count()))
+worker_class = "gthread"
+threads = int(os.environ.get("LIBRARY_THREADS", 8))
+# an open /books/events stream holds one of those threads; leave two for
+# everything else
+os.environ.setdefault("LIBRARY_EVENTS_MAX_SUBSCRIBERS", str(max(1, threads - 2)))
+
+# seconds an idle client connection is kept open
+keepalive = int(os.environ.get("LIBRARY_KEEPALIVE", 5))
+# seconds a busy worker may go silent before it is killed and replaced
+timeout = int(os.environ.get("LIBRARY_TIMEOUT", 60))
+# on SIGTERM, seconds in-flight requests get to finish
+graceful_timeout = int(os.environ.get("LIBRARY_GRACEFUL_TIMEOUT", 30))
+
+# recycle workers now and then; jitter keeps them from restarting together
+max_requests = int(os.environ.get("LIBRARY_MAX_REQUESTS", 0))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.environ.get("LIBRARY_ACCESS_LOG", "-")
+errorlog = os.environ.get("LIBRARY_ERROR_LOG", "-")
+
+# workers must not inherit the master's SQLite connections
+preload_app = False
+
+# per-process caches and rate-limit counters would disagree between
+# workers, and events would only reach streams on the publishing worker;
+# share them through SQLite unless configured otherwise
+if workers > 1:
+    os.environ.setdefault("LIBRARY_CACHE_BACKEND", "sqlite")
+    os.environ.setdefault("LIBRARY_RATE_LIMIT_BACKEND", "sqlite")
+    os.environ.setdefault("LIBRARY_EVENTS_BACKEND", "sqlite")
+
+
+def on_starting(server):
+    database.init_db()
+    database.close_pools()
+    os.environ["LIBRARY_INIT_DB"] = "0"
+
+
+def worker_exit(server, worker):
+    # stop the background threads and close this worker's connections
+    from controllers import holds_controller
+
+    holds_controller.stop_sweeper()
+    database.close_pools()
@@ -0,0 +1,86 @@
+"""
+login_required / require_role / rate_limit for the async (Quart) app; same
+behaviour and responses as auth_middleware and rate_limit.
+"""
+
+from functools import wraps
+
+from quart import jsonify, request, session
+
+from controllers.async_controllers import get_session_user
+from database import run_db
+from middleware.rate_limit import limiter
+
+
+def login_required(fn):
+    @wraps(fn)
+    async def wrapper(*args, **kwargs):
+        user_id = session.get("user_id")
+        if not user_id:
+            return jsonify({"message": "Unauthorized"}), 401
+
+        user = await get_session_user(user_id)
+        if not user:
+            session.clear()
+            return jsonify({"message": "Unauthorized"}), 401
+
+        if user["is_active"] != 1:
+            session.clear()
+            return jsonify({"message": "Account is deactivated"}), 403
+
+        return await fn(*args, **kwargs)
+
+    return wrapper
+
+
+def require_role(*roles):
+    def decorator(fn):
+        @wraps(fn)
+        async def wrapper(*args, **kwargs):
+            if session.get("user_role") not in roles:
+                return jsonify({"message": "Forbidden"}), 403
+            return await fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+# ---------- RATE LIMITS ----------
+
+
+async def by_ip():
+    return request.remote_addr or "unknown"
+
+
+async def by_email():
+    data = await request.get_json(silent=True) or {}
+    email = data.get("email")
+    return str(email).strip().lower() if email else None
+
+
+async def by_user():
+    return session.get("user_id")
+
+
+def rate_limit(name, limit, window, key=by_ip):
+    def decorator(fn):
+        @wraps(fn)
+        async def wrapper(*args, **kwargs):
+            if limiter.store is not None:
+                value = await key()
+                if value is not None:
+                    # the SQLite store does a write transaction
+                    allowed, retry_after = await run_db(
+                        limiter.store.hit, f"{name}:{value}", limit, window
+                    )
+                    if not allowed:
+                        limiter.record_rejection()
+                        resp = jsonify({"message": "Too many requests"})
+                        resp.headers["Retry-After"] = str(retry_after)
+                        return resp, 429
+            return await fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -1,6 +1,6 @@
 from functools import wraps
 from flask import jsonify, session
-from controllers.users_controller import get_user_by_id
+from controllers.users_controller import get_session_user
 
 
 def login_required(fn):
@@ -10,18 +10,12 @@ def login_required(fn):
         if not user_id:
             return jsonify({"message": "Unauthorized"}), 401
 
-        user = get_user_by_id(user_id)
+        user = get_session_user(user_id)
         if not user:
             session.clear()
             return jsonify({"message": "Unauthorized"}), 401
 
-        # Handle missing is_active column safely (until you migrate DB)
-        try:
-            is_active = int(user["is_active"])
-        except Exception:
-            is_active = 1
-
-        if is_active != 1:
+        if user["is_active"] != 1:
             session.clear()
             return jsonify({"message": "Account is deactivated"}), 403
 
@@ -30,11 +24,11 @@ def login_required(fn):
     return wrapper
 
 
-def require_role(role):
+def require_role(*roles):
     def decorator(fn):
         @wraps(fn)
         def wrapper(*args, **kwargs):
-            if session.get("user_role") != role:
+            if session.get("user_role") not in roles:
                 return jsonify({"message": "Forbidden"}), 403
             return fn(*args, **kwargs)
 
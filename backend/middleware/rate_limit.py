@@ -0,0 +1,234 @@
+import math
+import os
+import threading
+import time
+from functools import wraps
+
+from flask import jsonify, request, session
+
+import database
+
+# "memory" (per process), "sqlite" (shared by all workers on one host) or "none"
+RATE_LIMIT_BACKEND = os.environ.get("LIBRARY_RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_DB_NAME = os.environ.get("LIBRARY_RATE_LIMIT_DB", "ratelimit.db")
+
+# reverse proxies in front of the app (nginx, a load balancer). The per-IP
+# limits key on request.remote_addr, which behind a proxy is the proxy's
+# address for every client; with this set, create_app / create_async_app
+# take the client address from the last N X-Forwarded-For hops instead.
+# Only set it when such a proxy is always there, or clients can spoof it.
+TRUSTED_PROXIES = int(os.environ.get("LIBRARY_TRUSTED_PROXIES", 0))
+
+# idle keys are dropped this often (seconds)
+SWEEP_INTERVAL = 60.0
+
+# (requests, window seconds)
+LOGIN_PER_IP = (30, 60)
+LOGIN_PER_EMAIL = (10, 300)
+REGISTER_PER_IP = (10, 3600)
+ADMIN_PER_USER = (300, 60)
+
+
+def _slide(entry, now, window):
+    """
+    Sliding window approximated from two fixed windows: the previous
+    window's count, weighted by how much of it still overlaps, plus the
+    current one. entry is (window_start, prev, cur) or None.
+    returns (window_start, prev, cur, estimate)
+    """
+    start = now - now % window
+    if entry is None or entry[0] < start - window:
+        prev, cur = 0, 0
+    elif entry[0] < start:
+        prev, cur = entry[2], 0
+    else:
+        prev, cur = entry[1], entry[2]
+    weight = (window - (now - start)) / window
+    return start, prev, cur, prev * weight + cur
+
+
+def _retry_after(now, start, window):
+    return max(1, math.ceil(start + window - now))
+
+
+class MemoryStore:
+    """
+    key -> [window_start, prev_count, cur_count, window]; a few dozen bytes
+    per client, swept periodically.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.time()
+
+    def hit(self, key, limit, window):
+        now = time.time()
+        with self._lock:
+            start, prev, cur, estimate = _slide(self._entries.get(key), now, window)
+            allowed = estimate < limit
+            if allowed:
+                cur += 1
+            self._entries[key] = [start, prev, cur, window]
+
+            if now - self._last_sweep >= SWEEP_INTERVAL:
+                self._sweep(now)
+
+        return allowed, 0 if allowed else _retry_after(now, start, window)
+
+    def _sweep(self, now):
+        self._last_sweep = now
+        stale = [k for k, e in self._entries.items() if e[0] < now - 2 * e[3]]
+        for key in stale:
+            del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteStore:
+    """
+    Same counters in a small SQLite file so all worker processes share them.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._last_sweep = time.time()
+        conn = self._connection()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS rate_limits (
+                key TEXT PRIMARY KEY,
+                window_start REAL NOT NULL,
+                prev INTEGER NOT NULL,
+                cur INTEGER NOT NULL,
+                window REAL NOT NULL
+            )
+        """
+        )
+        conn.commit()
+        conn.close()
+
+    def _connection(self):
+        pool = database.get_pool(self.path)
+        return database.PooledConnection(pool.acquire(), pool.release)
+
+    def hit(self, key, limit, window):
+        now = time.time()
+        conn = self._connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT window_start, prev, cur FROM rate_limits WHERE key = ?",
+                (key,),
+            ).fetchone()
+            start, prev, cur, estimate = _slide(
+                tuple(row) if row else None, now, window
+            )
+            allowed = estimate < limit
+            if allowed:
+                cur += 1
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_limits VALUES (?, ?, ?, ?, ?)",
+                (key, start, prev, cur, window),
+            )
+            if now - self._last_sweep >= SWEEP_INTERVAL:
+                self._last_sweep = now
+                conn.execute(
+                    "DELETE FROM rate_limits WHERE window_start < ? - 2 * window",
+                    (now,),
+                )
+            conn.commit()
+        finally:
+            conn.close()
+
+        return allowed, 0 if allowed else _retry_after(now, start, window)
+
+    def clear(self):
+        conn = self._connection()
+        conn.execute("DELETE FROM rate_limits")
+        conn.commit()
+        conn.close()
+
+
+class RateLimiter:
+    def __init__(self):
+        self.store = MemoryStore()
+        self.rejected = 0
+        # request threads count rejections concurrently
+        self._lock = threading.Lock()
+
+    def configure(self, backend_name, path=None):
+        if backend_name == "none":
+            self.store = None
+        elif backend_name == "memory":
+            self.store = MemoryStore()
+        elif backend_name == "sqlite":
+            self.store = SQLiteStore(path or RATE_LIMIT_DB_NAME)
+        else:
+            raise ValueError(f"Unknown rate limit backend: {backend_name}")
+        with self._lock:
+            self.rejected = 0
+
+    def record_rejection(self):
+        with self._lock:
+            self.rejected += 1
+
+
+limiter = RateLimiter()
+
+
+# ---------- KEY FUNCTIONS ----------
+
+
+def by_ip():
+    return request.remote_addr or "unknown"
+
+
+def by_email():
+    data = request.get_json(silent=True) or {}
+    email = data.get("email")
+    return str(email).strip().lower() if email else None
+
+
+def by_user():
+    return session.get("user_id")
+
+
+def rate_limit(name, limit, window, key=by_ip):
+    """
+    Reject with 429 once `key()` has made `limit` requests within the
+    sliding `window` (seconds). Stack several for several keys. A key
+    function returning None skips this limit for the request.
+    """
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if limiter.store is not None:
+                value = key()
+                if value is not None:
+                    allowed, retry_after = limiter.store.hit(
+                        f"{name}:{value}", limit, window
+                    )
+                    if not allowed:
+                        limiter.record_rejection()
+                        resp = jsonify({"message": "Too many requests"})
+                        resp.headers["Retry-After"] = str(retry_after)
+                        return resp, 429
+            return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def init_app(app):
+    limiter.configure(
+        app.config.get("RATE_LIMIT_BACKEND", RATE_LIMIT_BACKEND),
+        app.config.get("RATE_LIMIT_DB_NAME", RATE_LIMIT_DB_NAME),
+    )
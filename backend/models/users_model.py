@@ -1,8 +1,5 @@
 from database import get_connection
-import hashlib
-
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+from utils.passwords import hash_password, verify_password
 
 def create_user(name, email, password, role):
     conn = get_connection()
@@ -26,6 +23,6 @@ def validate_user(email, password):
     user = get_user_by_email(email)
     if not user:
         return None
-    if user["password"] == hash_password(password):
+    if verify_password(password, user["password"]):
         return user
     return None
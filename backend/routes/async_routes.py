@@ -0,0 +1,289 @@
+from quart import Blueprint, Response, current_app, jsonify, request, session
+from controllers.async_controllers import (
+    get_all_books,
+    list_books,
+    search_books,
+    get_book,
+    checkout_book,
+    return_book,
+    return_book_for_user,
+    iter_book_history,
+    iter_user_history,
+    iter_all_history,
+    create_user,
+    get_user_by_email,
+    get_session_user,
+    validate_user,
+    admin_dashboard_data,
+)
+from controllers.book_controllers import DEFAULT_PAGE_SIZE
+from middleware.async_auth import (
+    login_required,
+    require_role,
+    rate_limit,
+    by_email,
+    by_user,
+)
+from middleware.rate_limit import (
+    LOGIN_PER_IP,
+    LOGIN_PER_EMAIL,
+    REGISTER_PER_IP,
+    ADMIN_PER_USER,
+)
+from routes.books_routes import LISTING_PARAMS
+from utils.passwords import HashingBusy, HASH_RETRY_AFTER
+from utils.request_args import bool_arg, int_arg
+from utils.streaming import NDJSON_MIMETYPE, async_chunks, wants_ndjson
+
+async_books_bp = Blueprint("async_books", __name__)
+async_users_bp = Blueprint("async_users", __name__)
+
+
+def stream_rows(rows):
+    """
+    utils.streaming.stream_rows for an async iterator of rows.
+    """
+    ndjson = wants_ndjson(request)
+    return Response(
+        async_chunks(rows, ndjson, current_app.json.dumps),
+        mimetype=NDJSON_MIMETYPE if ndjson else "application/json",
+    )
+
+
+# ===================== BOOKS =====================
+
+
+@async_books_bp.route("/books")
+@login_required
+async def show_books():
+    try:
+        if not any(name in request.args for name in LISTING_PARAMS):
+            books = await get_all_books()
+            return jsonify([dict(row) for row in books]), 200
+
+        limit = int_arg(request.args, "limit")
+        rows, next_cursor = await list_books(
+            limit=DEFAULT_PAGE_SIZE if limit is None else limit,
+            cursor=request.args.get("cursor"),
+            sort=request.args.get("sort", "id"),
+            order=request.args.get("order", "asc"),
+            author=request.args.get("author"),
+            language=request.args.get("language"),
+            year_from=int_arg(request.args, "year_from"),
+            year_to=int_arg(request.args, "year_to"),
+            available=bool_arg(request.args, "available"),
+        )
+        return (
+            jsonify({"data": [dict(r) for r in rows], "next_cursor": next_cursor}),
+            200,
+        )
+
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    except Exception as e:
+        return jsonify({"message": "Something went wrong", "error": str(e)}), 500
+
+
+@async_books_bp.route("/books/search")
+@login_required
+async def search_books_route():
+    try:
+        limit = int_arg(request.args, "limit")
+        offset = int_arg(request.args, "offset")
+        rows, total = await search_books(
+            request.args.get("q", ""),
+            limit=DEFAULT_PAGE_SIZE if limit is None else limit,
+            offset=offset or 0,
+        )
+        return jsonify({"data": [dict(r) for r in rows], "total": total}), 200
+
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    except Exception as e:
+        return jsonify({"message": "Something went wrong", "error": str(e)}), 500
+
+
+@async_books_bp.route("/books/<int:book_id>", methods=["GET"])
+async def get_book_route(book_id):
+    try:
+        book = await get_book(book_id)
+        if book:
+            return jsonify({"message": "Book retrieved", "data": dict(book)}), 200
+        return jsonify({"message": "Book not found"}), 404
+    except Exception as e:
+        return jsonify({"message": "Something went wrong", "error": str(e)}), 500
+
+
+@async_books_bp.route("/books/checkout/<int:book_id>", methods=["POST"])
+@login_required
+async def checkout_book_route(book_id):
+    try:
+        result = await checkout_book(session.get("user_id"), book_id)
+        if result == "not_found":
+            return jsonify({"message": "Book not found"}), 404
+        if result == "unavailable":
+            return jsonify({"message": "Book is already checked out"}), 409
+
+        return jsonify({"message": "Book checked out"}), 200
+
+    except Exception as e:
+        return jsonify({"message": "Something went wrong", "error": str(e)}), 500
+
+
+@async_books_bp.route("/books/return/<int:book_id>", methods=["POST"])
+@login_required
+async def return_by_book(book_id):
+    try:
+        result = await return_book_for_user(session.get("user_id"), book_id)
+        if result == "not_open":
+            return jsonify({"message": "No active checkout found for this book"}), 400
+
+        return jsonify({"message": "Book returned"}), 200
+
+    except Exception as e:
+        return jsonify({"message": "Something went wrong", "error": str(e)}), 500
+
+
+@async_books_bp.route("/books/return/<int:entry_id>/<int:book_id>", methods=["POST"])
+@login_required
+async def return_route(entry_id, book_id):
+    try:
+        result = await return_book(entry_id, book_id)
+        if result == "not_open":
+            return jsonify({"message": "No active checkout found for this book"}), 400
+
+        return jsonify({"message": "Book returned"}), 200
+
+    except Exception as e:
+        return jsonify({"message": "Something went wrong", "error": str(e)}), 500
+
+
+@async_books_bp.route("/books/history/<int:book_id>", methods=["GET"])
+@login_required
+@require_role("admin")
+async def book_history_route(book_id):
+    return stream_rows(iter_book_history(book_id))
+
+
+# ===================== USERS =====================
+
+
+def _hashing_busy():
+    response = jsonify({"message": "Server busy, try again shortly"})
+    response.headers["Retry-After"] = str(HASH_RETRY_AFTER)
+    return response, 503
+
+
+@async_users_bp.route("/me", methods=["GET"])
+@login_required
+async def me():
+    user = await get_session_user(session.get("user_id"))
+    return (
+        jsonify(
+            {
+                "id": user["id"],
+                "name": user["name"],
+                "email": user["email"],
+                "role": user["role"],
+                "is_active": user["is_active"],
+            }
+        ),
+        200,
+    )
+
+
+@async_users_bp.route("/users/history/<int:user_id>", methods=["GET"])
+@login_required
+async def show_history(user_id):
+    if session.get("user_role") != "admin" and user_id != session.get("user_id"):
+        return jsonify({"message": "Forbidden"}), 403
+
+    return stream_rows(iter_user_history(user_id))
+
+
+@async_users_bp.route("/register", methods=["POST"])
+@rate_limit("register-ip", *REGISTER_PER_IP)
+async def register():
+    try:
+        data = await request.get_json()
+        name = data.get("name")
+        email = data.get("email")
+        password = data.get("password")
+        role = data.get("role")
+
+        if await get_user_by_email(email):
+            return jsonify({"message": "Email already registered"}), 400
+
+        await create_user(name, email, password, role)
+        return jsonify({"message": "User registered"}), 201
+
+    except HashingBusy:
+        return _hashing_busy()
+
+    except Exception as e:
+        return jsonify({"message": "Error", "error": str(e)}), 500
+
+
+@async_users_bp.route("/login", methods=["POST"])
+@rate_limit("login-ip", *LOGIN_PER_IP)
+@rate_limit("login-email", *LOGIN_PER_EMAIL, key=by_email)
+async def login():
+    data = await request.get_json()
+
+    try:
+        user = await validate_user(data.get("email"), data.get("password"))
+    except HashingBusy:
+        return _hashing_busy()
+
+    if user == "deactivated":
+        return jsonify({"message": "Account is deactivated. Contact admin."}), 403
+
+    if not user:
+        return jsonify({"message": "Invalid email or password"}), 401
+
+    session["user_id"] = user["id"]
+    session["user_role"] = user["role"]
+
+    return (
+        jsonify(
+            {
+                "message": "Login successful",
+                "user": {
+                    "id": user["id"],
+                    "name": user["name"],
+                    "email": user["email"],
+                    "role": user["role"],
+                    "is_active": user["is_active"],
+                },
+            }
+        ),
+        200,
+    )
+
+
+@async_users_bp.route("/logout", methods=["POST"])
+@login_required
+async def logout():
+    session.clear()
+    return jsonify({"message": "Logged out"}), 200
+
+
+@async_users_bp.route("/admin/history", methods=["GET"])
+@login_required
+@require_role("admin")
+@rate_limit("admin", *ADMIN_PER_USER, key=by_user)
+async def admin_all_history():
+    return stream_rows(iter_all_history())
+
+
+@async_users_bp.route("/admin/dashboard", methods=["GET"])
+@login_required
+@require_role("admin")
+@rate_limit("admin", *ADMIN_PER_USER, key=by_user)
+async def admin_dashboard():
+    try:
+        return jsonify(await admin_dashboard_data()), 200
+    except Exception as e:
+        return jsonify({"message": "Something went wrong", "error": str(e)}), 500
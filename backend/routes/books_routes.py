@@ -1,17 +1,50 @@
-from flask import Blueprint, request, jsonify, session
+import io
+
+from flask import Blueprint, Response, request, jsonify, session, stream_with_context
+
 from controllers.book_controllers import (
     get_all_books,
+    list_books,
+    book_changes,
+    DEFAULT_CHANGES_LIMIT,
+    search_books,
+    DEFAULT_PAGE_SIZE,
     add_book,
     get_book,
     update_book,
     delete_book,
-    set_availability,
+    get_copies,
+    add_copies,
+    remove_copy,
+)
+from controllers.bulk_controllers import (
+    import_books,
+    export_books,
+    DEFAULT_BATCH_SIZE,
+)
+from controllers.checkout_controllers import (
+    checkout_book,
+    return_book,
+    return_book_for_user,
+    checkout_books,
+    return_books_for_user,
+    iter_book_history,
+)
+from controllers.holds_controller import (
+    place_hold,
+    cancel_hold,
+    get_hold,
+    user_holds,
+    book_queue,
 )
-from controllers.checkout_controllers import checkout_book, return_book
-from controllers.checkout_controllers import get_open_checkout_entry
-from middleware.auth_middleware import login_required
-from controllers.checkout_controllers import book_history
-from middleware.auth_middleware import require_role
+from controllers.users_controller import get_user_by_id
+from controllers.versions_controller import BOOKS, book_key
+from middleware.auth_middleware import login_required, require_role
+from utils import events
+from utils.cache import cached, TAG_BOOKS
+from utils.etags import conditional
+from utils.request_args import bool_arg, int_arg
+from utils.streaming import stream_rows
 
 books_bp = Blueprint("books_bp", __name__)
 
@@ -22,31 +55,145 @@ def return_by_book(book_id):
     try:
         user_id = session.get("user_id")
 
-        entry_id = get_open_checkout_entry(user_id, book_id)
-        if not entry_id:
+        result = return_book_for_user(user_id, book_id)
+        if result == "not_open":
             return jsonify({"message": "No active checkout found for this book"}), 400
 
-        return_book(
-            entry_id, book_id
-        )  # this already sets available=1 in your controller
         return jsonify({"message": "Book returned"}), 200
 
     except Exception as e:
         return jsonify({"message": "Something went wrong", "error": str(e)}), 500
 
 
+LISTING_PARAMS = (
+    "limit",
+    "cursor",
+    "sort",
+    "order",
+    "author",
+    "language",
+    "year_from",
+    "year_to",
+    "available",
+)
+
+
 @books_bp.route("/books")
 @login_required
+@conditional(lambda: [BOOKS])
+@cached(TAG_BOOKS)
 def show_books():
     try:
-        books = get_all_books()
-        return jsonify([dict(row) for row in books]), 200
+        # no paging/filter params -> full list (what older clients expect)
+        if not any(name in request.args for name in LISTING_PARAMS):
+            books = get_all_books()
+            return jsonify([dict(row) for row in books]), 200
+
+        limit = int_arg(request.args, "limit")
+        rows, next_cursor = list_books(
+            limit=DEFAULT_PAGE_SIZE if limit is None else limit,
+            cursor=request.args.get("cursor"),
+            sort=request.args.get("sort", "id"),
+            order=request.args.get("order", "asc"),
+            author=request.args.get("author"),
+            language=request.args.get("language"),
+            year_from=int_arg(request.args, "year_from"),
+            year_to=int_arg(request.args, "year_to"),
+            available=bool_arg(request.args, "available"),
+        )
+        return (
+            jsonify({"data": [dict(r) for r in rows], "next_cursor": next_cursor}),
+            200,
+        )
+
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    except Exception as e:
+        return jsonify({"message": "Something went wrong", "error": str(e)}), 500
+
+
+@books_bp.route("/books/changes")
+@login_required
+@cached(TAG_BOOKS)
+def book_changes_route():
+    """
+    Delta sync: books added/updated and ids deleted since ?since=<version>.
+    Keep calling with the returned version while has_more is true.
+    """
+    try:
+        since = int_arg(request.args, "since")
+        limit = int_arg(request.args, "limit")
+        books, deleted, version, has_more = book_changes(
+            since=since or 0,
+            limit=DEFAULT_CHANGES_LIMIT if limit is None else limit,
+        )
+        return (
+            jsonify(
+                {
+                    "version": version,
+                    "books": books,
+                    "deleted": deleted,
+                    "has_more": has_more,
+                }
+            ),
+            200,
+        )
+
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    except Exception as e:
+        return jsonify({"message": "Something went wrong", "error": str(e)}), 500
+
+
+@books_bp.route("/books/events")
+@login_required
+def book_events_route():
+    """
+    Server-sent events for availability (`availability`) and catalogue
+    (`book`, `catalogue`) changes. A `dropped` event means this client fell
+    behind; like after any reconnect, resync with /books/changes.
+    """
+    try:
+        sub = events.subscribe()
+    except events.TooManySubscribers:
+        response = jsonify({"message": "Too many open event streams, try later"})
+        response.headers["Retry-After"] = str(events.BUSY_RETRY_AFTER)
+        return response, 503
+
+    response = Response(events.event_stream(sub), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    # don't let a reverse proxy buffer the stream
+    response.headers["X-Accel-Buffering"] = "no"
+    response.call_on_close(lambda: events.unsubscribe(sub))
+    return response
+
+
+@books_bp.route("/books/search")
+@login_required
+@cached(TAG_BOOKS)
+def search_books_route():
+    try:
+        limit = int_arg(request.args, "limit")
+        offset = int_arg(request.args, "offset")
+        rows, total = search_books(
+            request.args.get("q", ""),
+            limit=DEFAULT_PAGE_SIZE if limit is None else limit,
+            offset=offset or 0,
+        )
+        return jsonify({"data": [dict(r) for r in rows], "total": total}), 200
+
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
 
     except Exception as e:
         return jsonify({"message": "Something went wrong", "error": str(e)}), 500
 
 
 @books_bp.route("/books/<int:book_id>", methods=["GET"])
+@conditional(lambda book_id: [book_key(book_id)])
+@cached(TAG_BOOKS)
 def get_book_route(book_id):
     try:
         book = get_book(book_id)
@@ -64,12 +211,21 @@ def get_book_route(book_id):
 def add_book_route():
     try:
         data = request.get_json()
-        add_book(data["title"], data["author"], data["year"], data["language"])
+        add_book(
+            data["title"],
+            data["author"],
+            data["year"],
+            data["language"],
+            copies=int(data.get("copies") or 1),
+        )
         return jsonify({"message": "Book added"}), 201
 
     except KeyError as e:
         return jsonify({"message": f"Missing field: {str(e)}"}), 400
 
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
     except Exception as e:
         return jsonify({"message": "Something went wrong", "error": str(e)}), 500
 
@@ -106,19 +262,117 @@ def delete_book_route(book_id):
 def checkout_book_route(book_id):
     try:
         user_id = session.get("user_id")
-        checkout_book(user_id, book_id)
-        set_availability(book_id, 0)
+        result = checkout_book(user_id, book_id)
+        if result == "not_found":
+            return jsonify({"message": "Book not found"}), 404
+        if result == "unavailable":
+            return jsonify({"message": "Book is already checked out"}), 409
+
         return jsonify({"message": "Book checked out"}), 200
 
     except Exception as e:
         return jsonify({"message": "Something went wrong", "error": str(e)}), 500
 
 
+# ===================== BATCH CHECKOUT / RETURN =====================
+
+DESK_ROLES = ("admin", "librarian")
+
+
+def _batch_request():
+    """
+    returns (user_id, book_ids) from {"book_ids": [...], "user_id": optional}.
+    Desk staff may act for another (existing, active) user; everyone else
+    acts for themselves. Raises ValueError (400), PermissionError (403) or
+    LookupError (404).
+    """
+    data = request.get_json() or {}
+    book_ids = data.get("book_ids")
+    if not isinstance(book_ids, list) or not all(
+        isinstance(b, int) and not isinstance(b, bool) for b in book_ids
+    ):
+        raise ValueError("book_ids must be a list of integers")
+
+    user_id = session.get("user_id")
+    target = data.get("user_id")
+    if target is None or target == user_id:
+        return user_id, book_ids
+
+    if not isinstance(target, int) or isinstance(target, bool):
+        raise ValueError("user_id must be an integer")
+    if session.get("user_role") not in DESK_ROLES:
+        raise PermissionError("Only desk staff can act for another user")
+    user = get_user_by_id(target)
+    if user is None:
+        raise LookupError("User not found")
+    if user["is_active"] != 1:
+        raise ValueError("User is deactivated")
+
+    return target, book_ids
+
+
+def _batch_response(results):
+    succeeded = sum(1 for r in results if r["status"] == "ok")
+    return (
+        jsonify(
+            {
+                "results": results,
+                "succeeded": succeeded,
+                "failed": len(results) - succeeded,
+            }
+        ),
+        200,
+    )
+
+
+@books_bp.route("/books/checkout/batch", methods=["POST"])
+@login_required
+def checkout_batch_route():
+    try:
+        user_id, book_ids = _batch_request()
+        return _batch_response(checkout_books(user_id, book_ids))
+
+    except PermissionError as e:
+        return jsonify({"message": str(e)}), 403
+
+    except LookupError as e:
+        return jsonify({"message": str(e)}), 404
+
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    except Exception as e:
+        return jsonify({"message": "Something went wrong", "error": str(e)}), 500
+
+
+@books_bp.route("/books/return/batch", methods=["POST"])
+@login_required
+def return_batch_route():
+    try:
+        user_id, book_ids = _batch_request()
+        return _batch_response(return_books_for_user(user_id, book_ids))
+
+    except PermissionError as e:
+        return jsonify({"message": str(e)}), 403
+
+    except LookupError as e:
+        return jsonify({"message": str(e)}), 404
+
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    except Exception as e:
+        return jsonify({"message": "Something went wrong", "error": str(e)}), 500
+
+
 @books_bp.route("/books/return/<int:entry_id>/<int:book_id>", methods=["POST"])
 @login_required
 def return_route(entry_id, book_id):
     try:
-        return_book(entry_id, book_id)
+        result = return_book(entry_id, book_id)
+        if result == "not_open":
+            return jsonify({"message": "No active checkout found for this book"}), 400
+
         return jsonify({"message": "Book returned"}), 200
 
     except KeyError as e:
@@ -133,7 +387,167 @@ def return_route(entry_id, book_id):
 @require_role("admin")
 def book_history_route(book_id):
     try:
-        rows = book_history(book_id)
-        return jsonify([dict(r) for r in rows]), 200
+        return stream_rows(iter_book_history(book_id))
+    except Exception as e:
+        return jsonify({"message": "Something went wrong", "error": str(e)}), 500
+
+
+# ===================== COPIES =====================
+
+
+@books_bp.route("/books/<int:book_id>/copies", methods=["GET"])
+@login_required
+@require_role("admin", "librarian")
+def list_copies_route(book_id):
+    if not get_book(book_id):
+        return jsonify({"message": "Book not found"}), 404
+    return jsonify([dict(c) for c in get_copies(book_id)]), 200
+
+
+@books_bp.route("/books/<int:book_id>/copies", methods=["POST"])
+@login_required
+@require_role("admin", "librarian")
+def add_copies_route(book_id):
+    """
+    body: {"count": n} for generated barcodes, or {"barcodes": [...]}
+    """
+    try:
+        data = request.get_json() or {}
+        count = data.get("count")
+        result = add_copies(
+            book_id,
+            count=None if count is None else int(count),
+            barcodes=data.get("barcodes"),
+        )
+        if result == "not_found":
+            return jsonify({"message": "Book not found"}), 404
+        return jsonify({"message": "Copies added", "barcodes": result}), 201
+
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    except Exception as e:
+        return jsonify({"message": "Something went wrong", "error": str(e)}), 500
+
+
+@books_bp.route("/books/<int:book_id>/copies/<barcode>", methods=["DELETE"])
+@login_required
+@require_role("admin", "librarian")
+def remove_copy_route(book_id, barcode):
+    try:
+        result = remove_copy(book_id, barcode)
+        if result == "not_found":
+            return jsonify({"message": "Copy not found"}), 404
+        if result == "on_loan":
+            return jsonify({"message": "Copy is checked out"}), 409
+        if result == "held":
+            return jsonify({"message": "Copy is set aside for a hold"}), 409
+        if result == "last_copy":
+            return jsonify({"message": "Last copy; delete the book instead"}), 409
+        return jsonify({"message": "Copy removed"}), 200
+
+    except Exception as e:
+        return jsonify({"message": "Something went wrong", "error": str(e)}), 500
+
+
+# ===================== HOLDS =====================
+
+
+@books_bp.route("/books/<int:book_id>/hold", methods=["POST"])
+@login_required
+def place_hold_route(book_id):
+    try:
+        result = place_hold(session.get("user_id"), book_id)
+        if result == "not_found":
+            return jsonify({"message": "Book not found"}), 404
+        if result == "available":
+            return jsonify({"message": "A copy is available; check it out"}), 409
+        if result == "on_loan":
+            return jsonify({"message": "You already have this book"}), 409
+        if result == "already_held":
+            return jsonify({"message": "You already have a hold on this book"}), 409
+        return jsonify({"message": "Hold placed", "position": result}), 201
+
+    except Exception as e:
+        return jsonify({"message": "Something went wrong", "error": str(e)}), 500
+
+
+@books_bp.route("/books/<int:book_id>/hold", methods=["GET"])
+@login_required
+def get_hold_route(book_id):
+    hold = get_hold(session.get("user_id"), book_id)
+    if hold is None:
+        return jsonify({"message": "No hold on this book"}), 404
+    return jsonify(dict(hold)), 200
+
+
+@books_bp.route("/books/<int:book_id>/hold", methods=["DELETE"])
+@login_required
+def cancel_hold_route(book_id):
+    try:
+        result = cancel_hold(session.get("user_id"), book_id)
+        if result == "not_found":
+            return jsonify({"message": "No hold on this book"}), 404
+        return jsonify({"message": "Hold cancelled"}), 200
+
+    except Exception as e:
+        return jsonify({"message": "Something went wrong", "error": str(e)}), 500
+
+
+@books_bp.route("/books/holds", methods=["GET"])
+@login_required
+def my_holds_route():
+    return jsonify([dict(h) for h in user_holds(session.get("user_id"))]), 200
+
+
+@books_bp.route("/books/<int:book_id>/holds", methods=["GET"])
+@login_required
+@require_role("admin", "librarian")
+def book_queue_route(book_id):
+    if not get_book(book_id):
+        return jsonify({"message": "Book not found"}), 404
+    return jsonify([dict(h) for h in book_queue(book_id)]), 200
+
+
+# ===================== BULK IMPORT / EXPORT =====================
+
+EXPORT_MIMETYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+@books_bp.route("/books/import", methods=["POST"])
+@login_required
+@require_role("admin", "librarian")
+def import_books_route():
+    try:
+        fmt = request.args.get("format", "csv")
+        upsert = request.args.get("upsert") or None
+        batch_size = int_arg(request.args, "batch_size") or DEFAULT_BATCH_SIZE
+
+        # multipart upload or raw request body, read as a stream either way
+        upload = request.files.get("file")
+        binary = upload.stream if upload else request.stream
+        text = io.TextIOWrapper(binary, encoding="utf-8-sig", newline="")
+
+        report = import_books(text, fmt, upsert=upsert, batch_size=batch_size)
+        return jsonify(report), 200
+
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
     except Exception as e:
         return jsonify({"message": "Something went wrong", "error": str(e)}), 500
+
+
+@books_bp.route("/books/export", methods=["GET"])
+@login_required
+@require_role("admin", "librarian")
+def export_books_route():
+    fmt = request.args.get("format", "csv")
+    if fmt not in EXPORT_MIMETYPES:
+        return jsonify({"message": f"Unsupported format: {fmt}"}), 400
+
+    return Response(
+        stream_with_context(export_books(fmt)),
+        mimetype=EXPORT_MIMETYPES[fmt],
+        headers={"Content-Disposition": f"attachment; filename=books.{fmt}"},
+    )
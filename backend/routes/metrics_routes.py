@@ -0,0 +1,81 @@
+from flask import Blueprint, Response, jsonify, request
+import database
+from middleware.auth_middleware import login_required, require_role
+from middleware.rate_limit import limiter, rate_limit, by_user, ADMIN_PER_USER
+from utils.cache import cache
+from utils import events
+from utils.metrics import registry
+from utils.slow_queries import slow_queries
+
+metrics_bp = Blueprint("metrics", __name__)
+
+PROMETHEUS_MIMETYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _gauges():
+    pools = sorted(database.pool_stats().items())
+    cache_stats = cache.stats()
+    event_stats = events.stats()
+    return [
+        (
+            "db_pool_connections",
+            "Pooled SQLite connections by state",
+            [
+                ({"db": path, "state": state}, stats[state])
+                for path, stats in pools
+                for state in ("in_use", "idle")
+            ],
+        ),
+        (
+            "response_cache_events",
+            "Response cache hits, misses and evictions since start",
+            [
+                ({"event": event}, cache_stats[event])
+                for event in ("hits", "misses", "evictions")
+            ],
+        ),
+        (
+            "rate_limit_rejected",
+            "Requests rejected by the rate limiter since start",
+            [({}, limiter.rejected)],
+        ),
+        (
+            "event_streams_open",
+            "Open /books/events streams in this process",
+            [({}, event_stats["subscribers"])],
+        ),
+        (
+            "event_stream_events",
+            "Events delivered to streams and streams dropped as too slow",
+            [
+                ({"event": event}, event_stats[event])
+                for event in ("delivered", "dropped")
+            ],
+        ),
+    ]
+
+
+@metrics_bp.route("/admin/metrics", methods=["GET"])
+@login_required
+@require_role("admin")
+@rate_limit("admin", *ADMIN_PER_USER, key=by_user)
+def admin_metrics():
+    return Response(registry.render(_gauges()), mimetype=PROMETHEUS_MIMETYPE)
+
+
+@metrics_bp.route("/admin/slow-queries", methods=["GET"])
+@login_required
+@require_role("admin")
+@rate_limit("admin", *ADMIN_PER_USER, key=by_user)
+def admin_slow_queries():
+    try:
+        limit = int(request.args.get("limit", 0)) or None
+    except ValueError:
+        return jsonify({"message": "limit must be an integer"}), 400
+
+    return jsonify(
+        {
+            "threshold_ms": slow_queries.threshold * 1000,
+            "entries": slow_queries.entries(limit),
+        }
+    )
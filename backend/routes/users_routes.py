@@ -1,36 +1,58 @@
 from flask import Blueprint, jsonify, request, session
-from controllers.checkout_controllers import user_history
+
+from controllers.checkout_controllers import iter_all_history, iter_user_history
 from controllers.users_controller import (
     create_user,
     get_user_by_email,
     validate_user,
     get_user_by_id,
+    get_session_user,
+    session_user,
     get_all_users,
     set_user_active,
     update_user_role,
     update_my_profile,
     change_my_password,
+    set_user_password,
     admin_dashboard_data,
 )
+from controllers.versions_controller import BOOK_TITLES, USERS, loans_key, user_key
 from middleware.auth_middleware import login_required, require_role
-from controllers.users_controller import set_user_password
-from controllers.checkout_controllers import all_history
+from middleware.rate_limit import (
+    rate_limit,
+    by_email,
+    by_user,
+    LOGIN_PER_IP,
+    LOGIN_PER_EMAIL,
+    REGISTER_PER_IP,
+    ADMIN_PER_USER,
+)
+from utils.cache import cached, TAG_BOOKS, TAG_LOANS, TAG_USERS
+from utils.etags import conditional
+from utils.passwords import HashingBusy, HASH_RETRY_AFTER
+from utils.streaming import stream_rows
 
 
 users_bp = Blueprint("users", __name__)
 
 
+def _hashing_busy():
+    response = jsonify({"message": "Server busy, try again shortly"})
+    response.headers["Retry-After"] = str(HASH_RETRY_AFTER)
+    return response, 503
+
+
+def _my_version():
+    # the version login_required just checked, so a warm /me reads nothing
+    user_id = session.get("user_id")
+    return {user_key(user_id): session_user(user_id)[0]}
+
+
 @users_bp.route("/me", methods=["GET"])
 @login_required
+@conditional(_my_version)
 def me():
-    user_id = session.get("user_id")
-    user = get_user_by_id(user_id)
-
-    # if DB not migrated, is_active might not exist
-    try:
-        is_active = user["is_active"]
-    except Exception:
-        is_active = 1
+    user = get_session_user(session.get("user_id"))
 
     return (
         jsonify(
@@ -39,27 +61,33 @@ def me():
                 "name": user["name"],
                 "email": user["email"],
                 "role": user["role"],
-                "is_active": is_active,
+                "is_active": user["is_active"],
             }
         ),
         200,
     )
 
 
+def _can_see_history(user_id):
+    return session.get("user_role") == "admin" or user_id == session.get("user_id")
+
+
 @users_bp.route("/users/history/<int:user_id>", methods=["GET"])
 @login_required
+@conditional(
+    lambda user_id: (
+        [loans_key(user_id), BOOK_TITLES] if _can_see_history(user_id) else None
+    )
+)
 def show_history(user_id):
-    current_user_id = session.get("user_id")
-    role = session.get("user_role")
-
-    if role != "admin" and user_id != current_user_id:
+    if not _can_see_history(user_id):
         return jsonify({"message": "Forbidden"}), 403
 
-    history = user_history(user_id)
-    return jsonify([dict(row) for row in history]), 200
+    return stream_rows(iter_user_history(user_id))
 
 
 @users_bp.route("/register", methods=["POST"])
+@rate_limit("register-ip", *REGISTER_PER_IP)
 def register():
     try:
         data = request.get_json()
@@ -74,17 +102,25 @@ def register():
         create_user(name, email, password, role)
         return jsonify({"message": "User registered"}), 201
 
+    except HashingBusy:
+        return _hashing_busy()
+
     except Exception as e:
         return jsonify({"message": "Error", "error": str(e)}), 500
 
 
 @users_bp.route("/login", methods=["POST"])
+@rate_limit("login-ip", *LOGIN_PER_IP)
+@rate_limit("login-email", *LOGIN_PER_EMAIL, key=by_email)
 def login():
     data = request.get_json()
     email = data.get("email")
     password = data.get("password")
 
-    user = validate_user(email, password)
+    try:
+        user = validate_user(email, password)
+    except HashingBusy:
+        return _hashing_busy()
 
     if user == "deactivated":
         return jsonify({"message": "Account is deactivated. Contact admin."}), 403
@@ -95,12 +131,6 @@ def login():
     session["user_id"] = user["id"]
     session["user_role"] = user["role"]
 
-    # safe is_active (may not exist pre-migration)
-    try:
-        is_active = user["is_active"]
-    except Exception:
-        is_active = 1
-
     return (
         jsonify(
             {
@@ -110,7 +140,7 @@ def login():
                     "name": user["name"],
                     "email": user["email"],
                     "role": user["role"],
-                    "is_active": is_active,
+                    "is_active": user["is_active"],
                 },
             }
         ),
@@ -131,6 +161,8 @@ def logout():
 @users_bp.route("/admin/users", methods=["GET"])
 @login_required
 @require_role("admin")
+@rate_limit("admin", *ADMIN_PER_USER, key=by_user)
+@conditional(lambda: [USERS])
 def admin_list_users():
     users = get_all_users()
     return jsonify([dict(u) for u in users]), 200
@@ -139,6 +171,7 @@ def admin_list_users():
 @users_bp.route("/admin/users", methods=["POST"])
 @login_required
 @require_role("admin")
+@rate_limit("admin", *ADMIN_PER_USER, key=by_user)
 def admin_create_user():
     try:
         data = request.get_json()
@@ -156,6 +189,9 @@ def admin_create_user():
         create_user(name, email, password, role)
         return jsonify({"message": "User created"}), 201
 
+    except HashingBusy:
+        return _hashing_busy()
+
     except Exception as e:
         return jsonify({"message": "Error", "error": str(e)}), 500
 
@@ -163,6 +199,7 @@ def admin_create_user():
 @users_bp.route("/admin/users/<int:user_id>/role", methods=["PUT"])
 @login_required
 @require_role("admin")
+@rate_limit("admin", *ADMIN_PER_USER, key=by_user)
 def admin_update_role(user_id):
     try:
         data = request.get_json()
@@ -185,12 +222,12 @@ def admin_update_role(user_id):
 @users_bp.route("/admin/users/<int:user_id>/status", methods=["PUT"])
 @login_required
 @require_role("admin")
+@rate_limit("admin", *ADMIN_PER_USER, key=by_user)
 def admin_update_status(user_id):
     try:
         data = request.get_json()
         is_active = bool(data.get("is_active"))
 
-        # NOTE: this requires DB migration (is_active column)
         set_user_active(user_id, is_active)
 
         if session.get("user_id") == user_id and not is_active:
@@ -205,22 +242,26 @@ def admin_update_status(user_id):
 @users_bp.route("/admin/users/<int:user_id>/password", methods=["PUT"])
 @login_required
 @require_role("admin")
+@rate_limit("admin", *ADMIN_PER_USER, key=by_user)
 def admin_reset_password(user_id):
     data = request.get_json()
     password = data.get("password")
     if not password or len(password) < 4:
         return jsonify({"message": "Password too short"}), 400
 
-    set_user_password(user_id, password)
+    try:
+        set_user_password(user_id, password)
+    except HashingBusy:
+        return _hashing_busy()
     return jsonify({"message": "Password reset"}), 200
 
 
 @users_bp.route("/admin/history", methods=["GET"])
 @login_required
 @require_role("admin")
+@rate_limit("admin", *ADMIN_PER_USER, key=by_user)
 def admin_all_history():
-    rows = all_history()
-    return jsonify([dict(r) for r in rows]), 200
+    return stream_rows(iter_all_history())
 
 
 # UPDATE PROFILE (self)
@@ -242,12 +283,6 @@ def update_me():
 
     user = get_user_by_id(user_id)
 
-    # sqlite3.Row -> no .get()
-    try:
-        is_active = user["is_active"]
-    except Exception:
-        is_active = 1
-
     return (
         jsonify(
             {
@@ -257,7 +292,7 @@ def update_me():
                     "name": user["name"],
                     "email": user["email"],
                     "role": user["role"],
-                    "is_active": is_active,
+                    "is_active": user["is_active"],
                 },
             }
         ),
@@ -278,7 +313,10 @@ def update_my_password():
     if len(new_password) < 4:
         return jsonify({"message": "New password too short"}), 400
 
-    result = change_my_password(user_id, current_password, new_password)
+    try:
+        result = change_my_password(user_id, current_password, new_password)
+    except HashingBusy:
+        return _hashing_busy()
     if result == "wrong_current":
         return jsonify({"message": "Current password is incorrect"}), 400
     if result == "not_found":
@@ -290,6 +328,8 @@ def update_my_password():
 @users_bp.route("/admin/dashboard", methods=["GET"])
 @login_required
 @require_role("admin")
+@rate_limit("admin", *ADMIN_PER_USER, key=by_user)
+@cached(TAG_BOOKS, TAG_LOANS, TAG_USERS)
 def admin_dashboard():
     try:
         return jsonify(admin_dashboard_data()), 200
@@ -3,6 +3,8 @@ import os
 import database
 import pytest
 from app import create_app
+from controllers import holds_controller
+from utils import slow_queries
 
 
 @pytest.fixture()
@@ -10,11 +12,17 @@ def app(tmp_path, monkeypatch):
     # Use temp DB for each test
     test_db = tmp_path / "test_library.db"
     monkeypatch.setattr(database, "DB_NAME", str(test_db))
+    monkeypatch.setattr(
+        slow_queries, "SLOW_QUERY_LOG", str(tmp_path / "slow_queries.log")
+    )
 
     app = create_app()
     app.config.update(TESTING=True)
     yield app
 
+    holds_controller.stop_sweeper()
+    database.close_pools()
+
 
 @pytest.fixture()
 def client(app):
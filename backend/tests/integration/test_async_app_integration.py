@@ -0,0 +1,156 @@
+# tests/integration/test_async_app_integration.py
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+import database
+from controllers.book_controllers import add_book
+from utils import events, passwords
+
+pytest.importorskip("quart")
+
+from async_app import create_async_app  # noqa: E402
+
+
+@pytest.fixture()
+def async_app(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_NAME", str(tmp_path / "async_library.db"))
+    app = create_async_app()
+    app.config.update(TESTING=True)
+    yield app
+
+    database.shutdown_db_executor()
+    database.close_pools()
+
+
+def run(async_app, scenario):
+    async def main():
+        async with async_app.test_app() as test_app:
+            await scenario(test_app.test_client())
+
+    asyncio.run(main())
+
+
+async def _login(client, email, role):
+    await client.post(
+        "/register",
+        json={"name": "A", "email": email, "password": "pass123", "role": role},
+    )
+    r = await client.post("/login", json={"email": email, "password": "pass123"})
+    assert r.status_code == 200
+
+
+def test_login_me_and_checkout_cycle(async_app):
+    add_book("Dune", "Herbert", 1965, "EN")
+
+    async def scenario(client):
+        assert (await client.get("/me")).status_code == 401
+        await _login(client, "m@test.com", "member")
+
+        r = await client.get("/me")
+        assert (await r.get_json())["email"] == "m@test.com"
+
+        book_id = (await (await client.get("/books")).get_json())[0]["id"]
+        r = await client.post(f"/books/checkout/{book_id}")
+        assert r.status_code == 200
+        r = await client.post(f"/books/checkout/{book_id}")
+        assert r.status_code == 409
+        r = await client.post(f"/books/return/{book_id}")
+        assert r.status_code == 200
+
+        r = await client.get("/admin/dashboard")
+        assert r.status_code == 403
+
+    run(async_app, scenario)
+
+
+def test_admin_history_streams_ndjson(async_app):
+    add_book("Dune", "Herbert", 1965, "EN")
+
+    async def scenario(client):
+        await _login(client, "admin@test.com", "admin")
+        await client.post("/books/checkout/1")
+
+        r = await client.get("/admin/history?format=ndjson")
+        assert r.mimetype == "application/x-ndjson"
+        lines = (await r.get_data(as_text=True)).splitlines()
+        assert [json.loads(line)["book_title"] for line in lines] == ["Dune"]
+
+    run(async_app, scenario)
+
+
+def test_stream_gives_executor_back_between_chunks(monkeypatch):
+    monkeypatch.setattr(database, "DB_EXECUTOR_THREADS", 1)
+    database.shutdown_db_executor()
+
+    def slow_rows():
+        for i in range(3):
+            time.sleep(0.05)
+            yield i
+
+    async def main():
+        stream = database.iterate_db(slow_rows(), chunk=1)
+        assert await stream.__anext__() == 0
+        # the only executor thread is free while the stream is paused
+        name = await database.run_db(lambda: threading.current_thread().name)
+        assert name.startswith("db")
+        assert [row async for row in stream] == [1, 2]
+
+    asyncio.run(main())
+    database.shutdown_db_executor()
+
+
+def test_full_pool_answers_503_quickly(async_app, monkeypatch):
+    monkeypatch.setattr(database, "DB_EXECUTOR_POOL_TIMEOUT", 0.05)
+    database.shutdown_db_executor()
+
+    async def scenario(client):
+        await _login(client, "m@test.com", "member")
+
+        pool = database.get_pool()
+        held = [pool.acquire() for _ in range(pool.max_size)]
+        try:
+            started = time.monotonic()
+            r = await client.get("/me")
+            assert r.status_code == 503
+            assert r.headers["Retry-After"] == "1"
+            assert time.monotonic() - started < database.POOL_TIMEOUT
+        finally:
+            for conn in held:
+                pool.release(conn)
+
+        assert (await client.get("/me")).status_code == 200
+
+    run(async_app, scenario)
+
+
+def test_async_app_publishes_through_configured_broker(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_NAME", str(tmp_path / "async_library.db"))
+    monkeypatch.setattr(events, "EVENTS_BACKEND", "sqlite")
+    monkeypatch.setattr(events, "EVENTS_DB_NAME", str(tmp_path / "events.db"))
+    try:
+        create_async_app()
+        assert isinstance(events.broker, events.SQLiteBroker)
+    finally:
+        events.configure("memory")
+        database.close_pools()
+
+
+def test_register_when_hashing_busy_is_503(async_app, monkeypatch):
+    def busy(fn, *args):
+        raise passwords.HashingBusy()
+
+    monkeypatch.setattr(passwords, "_offload", busy)
+
+    async def scenario(client):
+        r = await client.post(
+            "/register",
+            json={"name": "A", "email": "a@test.com", "password": "pass123"},
+        )
+        assert r.status_code == 503
+        assert r.headers["Retry-After"] == str(passwords.HASH_RETRY_AFTER)
+
+    run(async_app, scenario)
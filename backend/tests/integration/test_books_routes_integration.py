@@ -1,5 +1,11 @@
-from controllers.users_controller import create_user, get_user_by_email
-from controllers.book_controllers import add_book, get_all_books
+import json
+from controllers.users_controller import (
+    create_user,
+    get_user_by_email,
+    set_user_active,
+)
+from controllers.book_controllers import add_book, get_all_books, update_book
+from utils import events
 
 
 def login_as(client, email, password):
@@ -90,3 +96,331 @@ def test_book_history_as_admin(client):
     r = client.get(f"/books/history/{book_id}")
     assert r.status_code == 200
     assert isinstance(r.get_json(), list)
+
+
+def test_books_paginated_listing(client):
+    create_user("M", "m@test.com", "pass123", "member")
+    login_as(client, "m@test.com", "pass123")
+
+    for i in range(3):
+        add_book(f"B{i}", "A1", 2020, "EN")
+
+    r = client.get("/books?limit=2")
+    assert r.status_code == 200
+    body = r.get_json()
+    assert [b["title"] for b in body["data"]] == ["B0", "B1"]
+
+    r2 = client.get(f"/books?limit=2&cursor={body['next_cursor']}")
+    body2 = r2.get_json()
+    assert [b["title"] for b in body2["data"]] == ["B2"]
+    assert body2["next_cursor"] is None
+
+
+def test_books_listing_bad_params(client):
+    create_user("M", "m@test.com", "pass123", "member")
+    login_as(client, "m@test.com", "pass123")
+
+    assert client.get("/books?limit=abc").status_code == 400
+    assert client.get("/books?sort=nope").status_code == 400
+
+
+def test_books_search_endpoint(client):
+    create_user("M", "m@test.com", "pass123", "member")
+    login_as(client, "m@test.com", "pass123")
+    add_book("Clean Architecture", "Robert C. Martin", 2017, "EN")
+    add_book("Dune", "Frank Herbert", 1965, "EN")
+
+    r = client.get("/books/search?q=clean")
+    assert r.status_code == 200
+    body = r.get_json()
+    assert body["total"] == 1
+    assert body["data"][0]["title"] == "Clean Architecture"
+
+    assert client.get("/books/search?q=").status_code == 400
+
+
+def test_checkout_unavailable_book_conflicts(client):
+    create_user("M", "m@test.com", "pass123", "member")
+    login_as(client, "m@test.com", "pass123")
+    add_book("B1", "A1", 2020, "EN")
+    book_id = get_all_books()[0]["id"]
+
+    assert client.post(f"/books/checkout/{book_id}").status_code == 200
+    assert client.post(f"/books/checkout/{book_id}").status_code == 409
+    assert client.post("/books/checkout/999").status_code == 404
+
+
+def test_bulk_import_and_export_routes(client):
+    create_user("L", "l@test.com", "pass123", "librarian")
+    login_as(client, "l@test.com", "pass123")
+
+    body = "title,author,year,language\nB1,A1,2020,EN\nB2,A2,2021,FR\n"
+    r = client.post("/books/import?format=csv", data=body)
+    assert r.status_code == 200
+    assert r.get_json()["inserted"] == 2
+
+    r2 = client.get("/books/export?format=ndjson")
+    assert r2.status_code == 200
+    assert len(r2.get_data(as_text=True).splitlines()) == 2
+
+
+def test_bulk_import_forbidden_for_member(client):
+    create_user("M", "m@test.com", "pass123", "member")
+    login_as(client, "m@test.com", "pass123")
+
+    r = client.post("/books/import?format=csv", data="title,author\nB,A\n")
+    assert r.status_code == 403
+
+
+def test_batch_checkout_and_return_routes(client):
+    create_user("M", "m@test.com", "pass123", "member")
+    login_as(client, "m@test.com", "pass123")
+    add_book("B1", "A1", 2020, "EN")
+    add_book("B2", "A2", 2020, "EN")
+    ids = [b["id"] for b in get_all_books()]
+
+    r = client.post("/books/checkout/batch", json={"book_ids": ids})
+    assert r.status_code == 200
+    assert r.get_json()["succeeded"] == 2
+
+    r = client.post("/books/return/batch", json={"book_ids": ids + [999]})
+    body = r.get_json()
+    assert (body["succeeded"], body["failed"]) == (2, 1)
+    assert body["results"][2] == {"book_id": 999, "status": "not_open"}
+
+
+def test_batch_for_other_user_requires_desk_role(client):
+    create_user("M", "m@test.com", "pass123", "member")
+    login_as(client, "m@test.com", "pass123")
+    add_book("B1", "A1", 2020, "EN")
+    book_id = get_all_books()[0]["id"]
+
+    r = client.post(
+        "/books/checkout/batch", json={"book_ids": [book_id], "user_id": 42}
+    )
+    assert r.status_code == 403
+    r = client.post("/books/checkout/batch", json={"book_ids": "1,2"})
+    assert r.status_code == 400
+
+
+def test_desk_batch_rejects_unknown_or_deactivated_user(client):
+    create_user("L", "l@test.com", "pass123", "librarian")
+    create_user("M", "m@test.com", "pass123", "member")
+    member_id = get_user_by_email("m@test.com")["id"]
+    set_user_active(member_id, False)
+    login_as(client, "l@test.com", "pass123")
+    add_book("B1", "A1", 2020, "EN")
+    book_id = get_all_books()[0]["id"]
+
+    for path in ("/books/checkout/batch", "/books/return/batch"):
+        r = client.post(path, json={"book_ids": [book_id], "user_id": 424242})
+        assert r.status_code == 404
+        r = client.post(path, json={"book_ids": [book_id], "user_id": member_id})
+        assert r.status_code == 400
+        r = client.post(path, json={"book_ids": [book_id], "user_id": str(member_id)})
+        assert r.status_code == 400
+
+    # nothing was lent to anyone
+    assert get_all_books()[0]["available"] == 1
+
+
+def test_book_changes_endpoint_after_checkout(client):
+    create_user("M", "m@test.com", "pass123", "member")
+    login_as(client, "m@test.com", "pass123")
+    add_book("Dune", "Herbert", 1965, "EN")
+    add_book("Emma", "Austen", 1815, "EN")
+
+    full = client.get("/books/changes").get_json()
+    assert len(full["books"]) == 2
+
+    book_id = full["books"][0]["id"]
+    client.post(f"/books/checkout/{book_id}")
+
+    r = client.get(f"/books/changes?since={full['version']}")
+    assert r.status_code == 200
+    delta = r.get_json()
+    assert [(b["id"], b["available"]) for b in delta["books"]] == [(book_id, 0)]
+    assert delta["deleted"] == [] and delta["version"] > full["version"]
+
+    assert client.get("/books/changes?since=abc").status_code == 400
+
+
+def test_books_list_conditional_get(client):
+    create_user("M", "m@test.com", "pass123", "member")
+    login_as(client, "m@test.com", "pass123")
+    add_book("Dune", "Herbert", 1965, "EN")
+
+    r = client.get("/books")
+    etag = r.headers["ETag"]
+    assert r.status_code == 200
+
+    r = client.get("/books", headers={"If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.get_data() == b""
+    assert r.headers["ETag"] == etag
+
+    # another variant of the same resource gets its own tag
+    r = client.get("/books?limit=10", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+
+    client.post(f"/books/checkout/{get_all_books()[0]['id']}")
+    r = client.get("/books", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["ETag"] != etag
+
+
+def test_single_book_etag_tracks_that_book(client):
+    add_book("Dune", "Herbert", 1965, "EN")
+    add_book("Emma", "Austen", 1815, "EN")
+    dune, emma = [b["id"] for b in get_all_books()]
+
+    etag = client.get(f"/books/{dune}").headers["ETag"]
+    update_book(emma, "Emma", "Austen", 1816, "EN")
+    r = client.get(f"/books/{dune}", headers={"If-None-Match": etag})
+    assert r.status_code == 304
+
+    update_book(dune, "Dune", "Herbert", 1966, "EN")
+    r = client.get(f"/books/{dune}", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.get_json()["data"]["year"] == 1966
+
+    assert "ETag" not in client.get("/books/999").headers
+
+
+def test_book_events_stream_pushes_availability(client):
+    create_user("M", "m@test.com", "pass123", "member")
+    login_as(client, "m@test.com", "pass123")
+    add_book("Dune", "Herbert", 1965, "EN")
+    book_id = get_all_books()[0]["id"]
+
+    r = client.get("/books/events", buffered=False)
+    assert r.status_code == 200
+    assert r.mimetype == "text/event-stream"
+    stream = iter(r.response)
+    assert next(stream).startswith(b"retry:")
+
+    client.post(f"/books/checkout/{book_id}")
+    frame = next(stream).decode()
+    assert "event: availability" in frame
+    assert json.loads(frame.split("data: ")[1]) == {
+        "book_id": book_id,
+        "available": 0,
+        "available_copies": 0,
+        "total_copies": 1,
+    }
+    r.close()
+
+
+def test_book_events_requires_login(client):
+    assert client.get("/books/events").status_code == 401
+
+
+def test_book_events_full_answers_503_with_retry_after(client, monkeypatch):
+    create_user("M", "m@test.com", "pass123", "member")
+    login_as(client, "m@test.com", "pass123")
+    monkeypatch.setattr(events.hub, "max_subscribers", 0)
+
+    r = client.get("/books/events")
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == str(events.BUSY_RETRY_AFTER)
+
+
+def test_librarian_manages_copies(client):
+    create_user("L", "l@test.com", "pass123", "librarian")
+    login_as(client, "l@test.com", "pass123")
+    r = client.post(
+        "/books/add",
+        json={
+            "title": "Reserve",
+            "author": "A",
+            "year": 2020,
+            "language": "EN",
+            "copies": 2,
+        },
+    )
+    assert r.status_code == 201
+    book_id = get_all_books()[0]["id"]
+
+    r = client.post(f"/books/{book_id}/copies", json={"barcodes": ["RES-1"]})
+    assert r.status_code == 201
+    assert r.get_json()["barcodes"] == ["RES-1"]
+
+    client.post(f"/books/checkout/{book_id}")
+    copies = client.get(f"/books/{book_id}/copies").get_json()
+    assert [c["status"] for c in copies] == ["on_loan", "available", "available"]
+    assert client.get(f"/books/{book_id}").get_json()["data"]["available_copies"] == 2
+
+    loaned = copies[0]["barcode"]
+    assert client.delete(f"/books/{book_id}/copies/{loaned}").status_code == 409
+    assert client.delete(f"/books/{book_id}/copies/RES-1").status_code == 200
+    assert client.post(f"/books/{book_id}/copies", json={}).status_code == 400
+
+
+def test_member_cannot_manage_copies(client):
+    create_user("M", "m@test.com", "pass123", "member")
+    login_as(client, "m@test.com", "pass123")
+    add_book("Dune", "Herbert", 1965, "EN")
+    book_id = get_all_books()[0]["id"]
+
+    assert client.get(f"/books/{book_id}/copies").status_code == 403
+    r = client.post(f"/books/{book_id}/copies", json={"count": 1})
+    assert r.status_code == 403
+
+
+def test_hold_queue_endpoints(client):
+    create_user("A", "a@test.com", "pass123", "member")
+    create_user("B", "b@test.com", "pass123", "member")
+    add_book("Dune", "Herbert", 1965, "EN")
+    book_id = get_all_books()[0]["id"]
+
+    login_as(client, "a@test.com", "pass123")
+    assert client.post(f"/books/{book_id}/hold").status_code == 409
+    client.post(f"/books/checkout/{book_id}")
+    client.post("/logout")
+
+    login_as(client, "b@test.com", "pass123")
+    r = client.post(f"/books/{book_id}/hold")
+    assert r.status_code == 201
+    assert r.get_json()["position"] == 1
+    assert client.post(f"/books/{book_id}/hold").status_code == 409
+    assert client.get(f"/books/{book_id}/hold").get_json()["status"] == "waiting"
+    client.post("/logout")
+
+    login_as(client, "a@test.com", "pass123")
+    client.post(f"/books/return/{book_id}")
+    assert client.get(f"/books/{book_id}/holds").status_code == 403
+    client.post("/logout")
+
+    login_as(client, "b@test.com", "pass123")
+    holds = client.get("/books/holds").get_json()
+    assert [(h["book_id"], h["status"]) for h in holds] == [(book_id, "ready")]
+    assert client.post(f"/books/checkout/{book_id}").status_code == 200
+    assert client.get(f"/books/{book_id}/hold").status_code == 404
+    assert client.delete(f"/books/{book_id}/hold").status_code == 404
+
+
+def test_ready_hold_is_collected_through_checkout(client):
+    # what the books page does for a "ready" hold: the book reads as out,
+    # /books/holds says ready, and the checkout collects the held copy
+    create_user("A", "a@test.com", "pass123", "member")
+    create_user("B", "b@test.com", "pass123", "member")
+    add_book("Dune", "Herbert", 1965, "EN")
+    book_id = get_all_books()[0]["id"]
+
+    login_as(client, "a@test.com", "pass123")
+    client.post(f"/books/checkout/{book_id}")
+    client.post("/logout")
+    login_as(client, "b@test.com", "pass123")
+    client.post(f"/books/{book_id}/hold")
+    client.post("/logout")
+    login_as(client, "a@test.com", "pass123")
+    client.post(f"/books/return/{book_id}")
+    assert client.post(f"/books/checkout/{book_id}").status_code == 409
+    client.post("/logout")
+
+    login_as(client, "b@test.com", "pass123")
+    assert client.get(f"/books/{book_id}").get_json()["data"]["available"] == 0
+    assert client.get("/books/holds").get_json()[0]["status"] == "ready"
+    assert client.post(f"/books/checkout/{book_id}").status_code == 200
+    assert client.get("/books/holds").get_json() == []
+    assert client.post(f"/books/return/{book_id}").status_code == 200
@@ -1,5 +1,13 @@
 # tests/integration/test_users_routes_integration.py
-from controllers.users_controller import get_user_by_email
+import json
+
+import database
+from utils import passwords
+from utils.slow_queries import slow_queries
+
+from controllers.users_controller import create_user, get_user_by_email
+from controllers.book_controllers import add_book, get_all_books
+from controllers.checkout_controllers import checkout_book
 
 
 def test_register_then_login(client):
@@ -45,6 +53,34 @@ def test_me_after_login(client):
     assert r.get_json()["email"] == "ali@test.com"
 
 
+def test_warm_me_runs_no_queries(client):
+    client.post(
+        "/register",
+        json={
+            "name": "Ali",
+            "email": "ali@test.com",
+            "password": "pass123",
+            "role": "member",
+        },
+    )
+    client.post("/login", json={"email": "ali@test.com", "password": "pass123"})
+    etag = client.get("/me").headers["ETag"]
+
+    seen = []
+    listener = lambda sql, *args: seen.append(sql)  # noqa: E731
+    database.add_query_listener(listener)
+    try:
+        r = client.get("/me")
+        assert r.status_code == 200
+        assert r.get_json()["email"] == "ali@test.com"
+        assert r.headers["ETag"] == etag
+        r = client.get("/me", headers={"If-None-Match": etag})
+        assert r.status_code == 304
+    finally:
+        database.remove_query_listener(listener)
+    assert seen == []
+
+
 def test_admin_forbidden_for_member(client):
     client.post(
         "/register",
@@ -77,3 +113,137 @@ def test_admin_can_list_users(client):
     r = client.get("/admin/users")
     assert r.status_code == 200
     assert isinstance(r.get_json(), list)
+
+
+def _admin_with_one_loan(client):
+    client.post(
+        "/register",
+        json={
+            "name": "Admin",
+            "email": "admin@test.com",
+            "password": "pass123",
+            "role": "admin",
+        },
+    )
+    client.post("/login", json={"email": "admin@test.com", "password": "pass123"})
+    admin = get_user_by_email("admin@test.com")
+    add_book("B1", "A1", 2020, "EN")
+    checkout_book(admin["id"], get_all_books()[0]["id"])
+    return admin
+
+
+def test_admin_history_streams_json_array(client):
+    _admin_with_one_loan(client)
+
+    r = client.get("/admin/history")
+    assert r.status_code == 200
+    assert r.is_streamed
+    rows = r.get_json()
+    assert len(rows) == 1
+    assert rows[0]["book_title"] == "B1"
+
+
+def test_history_as_ndjson(client):
+    admin = _admin_with_one_loan(client)
+
+    r = client.get(f"/users/history/{admin['id']}?format=ndjson")
+    assert r.mimetype == "application/x-ndjson"
+    lines = r.get_data(as_text=True).splitlines()
+    assert [json.loads(line)["title"] for line in lines] == ["B1"]
+
+
+def test_me_conditional_get(client):
+    _admin_with_one_loan(client)
+
+    etag = client.get("/me").headers["ETag"]
+    assert client.get("/me", headers={"If-None-Match": etag}).status_code == 304
+
+    client.put("/me", json={"name": "Renamed", "email": "admin@test.com"})
+    r = client.get("/me", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.get_json()["name"] == "Renamed"
+
+
+def test_history_conditional_get(client):
+    admin = _admin_with_one_loan(client)
+    path = f"/users/history/{admin['id']}"
+
+    etag = client.get(path).headers["ETag"]
+    assert client.get(path, headers={"If-None-Match": etag}).status_code == 304
+
+    client.post(f"/books/return/{get_all_books()[0]['id']}")
+    r = client.get(path, headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.get_json()[0]["return_date"] is not None
+
+
+def test_admin_users_conditional_get(client):
+    _admin_with_one_loan(client)
+
+    etag = client.get("/admin/users").headers["ETag"]
+    r = client.get("/admin/users", headers={"If-None-Match": etag})
+    assert r.status_code == 304
+
+    client.post(
+        "/admin/users",
+        json={"name": "N", "email": "n@test.com", "password": "p", "role": "member"},
+    )
+    r = client.get("/admin/users", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+
+
+def test_admin_metrics_prometheus_text(client):
+    _admin_with_one_loan(client)
+    client.get("/books")
+
+    r = client.get("/admin/metrics")
+    assert r.status_code == 200
+    assert r.mimetype == "text/plain"
+    text = r.get_data(as_text=True)
+    assert 'http_request_duration_seconds_count{method="GET",endpoint="/books"' in text
+    assert "db_statement_total{" in text
+    assert 'db_queries_per_request_count{endpoint="/books"} 1' in text
+    assert "db_pool_connections{" in text
+
+
+def test_admin_metrics_forbidden_for_member(client):
+    client.post(
+        "/register",
+        json={
+            "name": "M",
+            "email": "m@test.com",
+            "password": "pass123",
+            "role": "member",
+        },
+    )
+    client.post("/login", json={"email": "m@test.com", "password": "pass123"})
+
+    assert client.get("/admin/metrics").status_code == 403
+
+
+def test_admin_slow_queries_lists_recent_statements(client):
+    _admin_with_one_loan(client)
+    slow_queries.configure(0, 50, None)
+    client.get("/books")
+
+    r = client.get("/admin/slow-queries?limit=5")
+    assert r.status_code == 200
+    data = r.get_json()
+    assert data["threshold_ms"] == 0
+    assert 0 < len(data["entries"]) <= 5
+    assert all("plan" in e and "params" in e for e in data["entries"])
+
+
+def test_password_change_when_hashing_busy_is_503(client, monkeypatch):
+    create_user("U", "u@test.com", "pass123", "member")
+    client.post("/login", json={"email": "u@test.com", "password": "pass123"})
+
+    def busy(fn, *args):
+        raise passwords.HashingBusy()
+
+    monkeypatch.setattr(passwords, "_offload", busy)
+    r = client.put(
+        "/me/password", json={"current_password": "pass123", "new_password": "newpass"}
+    )
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == str(passwords.HASH_RETRY_AFTER)
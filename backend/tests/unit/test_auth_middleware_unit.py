@@ -37,3 +37,84 @@ def test_login_required_authorized(app):
     resp = client.get("/t/protected")
     assert resp.status_code == 200
     assert resp.get_json()["ok"] is True
+
+
+def test_login_required_uses_user_cache(app, monkeypatch):
+    app.register_blueprint(bp, url_prefix="/t")
+    client = app.test_client()
+
+    import controllers.users_controller as users_controller
+    from controllers.users_controller import create_user, get_user_by_email
+
+    create_user("X", "x@test.com", "pass", "member")
+    user = get_user_by_email("x@test.com")
+    with client.session_transaction() as s:
+        s["user_id"] = user["id"]
+        s["user_role"] = user["role"]
+
+    calls = []
+    real = users_controller.get_user_by_id
+    monkeypatch.setattr(
+        users_controller,
+        "get_user_by_id",
+        lambda user_id: calls.append(user_id) or real(user_id),
+    )
+
+    for _ in range(3):
+        assert client.get("/t/protected").status_code == 200
+    assert len(calls) == 1
+
+
+def test_deactivation_applies_immediately(app):
+    app.register_blueprint(bp, url_prefix="/t")
+    client = app.test_client()
+
+    from controllers.users_controller import (
+        create_user,
+        get_user_by_email,
+        set_user_active,
+    )
+
+    create_user("X", "x@test.com", "pass", "member")
+    user = get_user_by_email("x@test.com")
+    with client.session_transaction() as s:
+        s["user_id"] = user["id"]
+        s["user_role"] = user["role"]
+
+    assert client.get("/t/protected").status_code == 200  # now cached
+
+    set_user_active(user["id"], False)
+    resp = client.get("/t/protected")
+    assert resp.status_code == 403
+    assert resp.get_json()["message"] == "Account is deactivated"
+
+
+def test_deactivation_in_another_worker_applies_after_recheck(app, monkeypatch):
+    app.register_blueprint(bp, url_prefix="/t")
+    client = app.test_client()
+
+    import database
+    from controllers.users_controller import create_user, get_user_by_email
+    from controllers.versions_controller import bump, user_key
+    from utils import cache
+
+    monkeypatch.setattr(cache, "USER_CACHE_RECHECK", 60)
+    create_user("X", "x@test.com", "pass", "member")
+    user = get_user_by_email("x@test.com")
+    with client.session_transaction() as s:
+        s["user_id"] = user["id"]
+        s["user_role"] = user["role"]
+
+    assert client.get("/t/protected").status_code == 200  # now cached
+
+    # another process's write: this one's user cache is never told
+    conn = database.get_connection()
+    conn.execute("UPDATE users SET is_active = 0 WHERE id = ?", (user["id"],))
+    bump(conn.cursor(), user_key(user["id"]))
+    conn.commit()
+    conn.close()
+
+    # served from the cache until the recheck is due
+    assert client.get("/t/protected").status_code == 200
+    monkeypatch.setattr(cache, "USER_CACHE_RECHECK", 0)
+    assert client.get("/t/protected").status_code == 403
@@ -1,3 +1,4 @@
+import pytest
 from controllers.book_controllers import (
     add_book,
     get_all_books,
@@ -5,7 +6,18 @@ from controllers.book_controllers import (
     update_book,
     delete_book,
     set_availability,
+    list_books,
+    search_books,
+    fts_query,
+    book_changes,
+    get_copies,
+    add_copies,
+    remove_copy,
+    merge_books,
+    find_duplicate_books,
 )
+from controllers.users_controller import create_user, get_user_by_email
+from controllers.checkout_controllers import checkout_book, user_history
 
 
 def test_add_and_get_book(app):
@@ -51,3 +63,207 @@ def test_delete_book(app):
     delete_book(book_id)
     assert get_book(book_id) is None
     assert get_all_books() == []
+
+
+def test_list_books_keyset_by_id(app):
+    for i in range(5):
+        add_book(f"T{i}", "A", 2000 + i, "EN")
+
+    page1, cursor = list_books(limit=2)
+    assert [b["title"] for b in page1] == ["T0", "T1"]
+
+    page2, cursor = list_books(limit=2, cursor=cursor)
+    assert [b["title"] for b in page2] == ["T2", "T3"]
+
+    page3, cursor = list_books(limit=2, cursor=cursor)
+    assert [b["title"] for b in page3] == ["T4"]
+    assert cursor is None
+
+
+def test_list_books_keyset_by_title_desc_with_ties(app):
+    for title in ["B", "A", "B", "C"]:
+        add_book(title, "A", 2000, "EN")
+
+    seen = []
+    cursor = None
+    while True:
+        rows, cursor = list_books(limit=1, sort="title", order="desc", cursor=cursor)
+        seen.extend((r["title"], r["id"]) for r in rows)
+        if cursor is None:
+            break
+
+    assert [t for t, _ in seen] == ["C", "B", "B", "A"]
+    assert len({i for _, i in seen}) == 4
+
+
+def test_list_books_filters(app):
+    add_book("Old", "X", 1990, "EN")
+    add_book("New", "X", 2020, "FR")
+    add_book("Other", "Y", 2020, "FR")
+    set_availability(get_all_books()[1]["id"], 0)
+
+    rows, _ = list_books(author="X", year_from=2000)
+    assert [r["title"] for r in rows] == ["New"]
+
+    rows, _ = list_books(language="FR", available=True)
+    assert [r["title"] for r in rows] == ["Other"]
+
+
+def test_list_books_rejects_bad_input(app):
+    with pytest.raises(ValueError):
+        list_books(sort="year")
+    with pytest.raises(ValueError):
+        list_books(cursor="garbage")
+
+
+def test_fts_query_prefix_and_escaping():
+    assert fts_query("clean arch") == '"clean" "arch"*'
+    assert fts_query('NOT "x" OR') == '"NOT" "x" "OR"*'
+    assert fts_query("  ") is None
+
+
+def test_search_books_ranked_with_highlight(app):
+    add_book("Clean Code", "Robert C. Martin", 2008, "EN")
+    add_book("Refactoring", "Martin Fowler", 1999, "EN")
+    add_book("Dune", "Frank Herbert", 1965, "EN")
+
+    rows, total = search_books("mart")
+    assert total == 2
+    assert {r["title"] for r in rows} == {"Clean Code", "Refactoring"}
+    assert "<mark>Martin</mark>" in rows[0]["author_highlight"]
+
+
+def test_search_highlight_escapes_catalogue_text(app):
+    add_book("<img src=x onerror=alert(1)> Dune", "A & B", 1965, "EN")
+
+    rows, _ = search_books("dune")
+    assert rows[0]["title_highlight"] == (
+        "&lt;img src=x onerror=alert(1)&gt; <mark>Dune</mark>"
+    )
+    assert rows[0]["author_highlight"] == "A &amp; B"
+    # the plain fields stay as entered
+    assert rows[0]["title"] == "<img src=x onerror=alert(1)> Dune"
+
+
+def test_search_index_follows_update_and_delete(app):
+    add_book("Old Title", "A", 2000, "EN")
+    book_id = get_all_books()[0]["id"]
+
+    update_book(book_id, "Brand New", "A", 2000, "EN")
+    assert search_books("old")[1] == 0
+    assert search_books("brand")[1] == 1
+
+    delete_book(book_id)
+    assert search_books("brand")[1] == 0
+
+
+def test_book_changes_since_version(app):
+    add_book("Dune", "Herbert", 1965, "EN")
+    add_book("Emma", "Austen", 1815, "EN")
+    books, deleted, v1, has_more = book_changes(0)
+    assert [b["title"] for b in books] == ["Dune", "Emma"]
+    assert deleted == [] and not has_more
+
+    dune, emma = get_all_books()
+    set_availability(dune["id"], 0)
+    delete_book(emma["id"])
+
+    books, deleted, v2, _ = book_changes(v1)
+    assert [(b["id"], b["available"]) for b in books] == [(dune["id"], 0)]
+    assert deleted == [emma["id"]]
+    assert v2 > v1
+
+    assert book_changes(v2)[:2] == ([], [])
+
+
+def test_book_changes_pages(app):
+    for i in range(5):
+        add_book(f"Book {i}", "A", 2000, "EN")
+
+    seen, since, has_more = [], 0, True
+    while has_more:
+        books, _, since, has_more = book_changes(since, limit=2)
+        seen += [b["title"] for b in books]
+    assert seen == [f"Book {i}" for i in range(5)]
+
+
+def test_book_changes_rejects_future_version(app):
+    with pytest.raises(ValueError):
+        book_changes(10)
+
+
+def test_new_book_has_one_copy_on_the_shelf(app):
+    add_book("Dune", "Herbert", 1965, "EN")
+    book = get_all_books()[0]
+    assert (book["total_copies"], book["available_copies"]) == (1, 1)
+    assert [c["barcode"] for c in get_copies(book["id"])] == [f"{book['id']}-1"]
+
+
+def test_add_and_remove_copies(app):
+    add_book("Dune", "Herbert", 1965, "EN")
+    book_id = get_all_books()[0]["id"]
+
+    assert add_copies(book_id, count=2) == [f"{book_id}-2", f"{book_id}-3"]
+    assert add_copies(book_id, barcodes=["LIB-0001"]) == ["LIB-0001"]
+    assert get_book(book_id)["total_copies"] == 4
+
+    with pytest.raises(ValueError):
+        add_copies(book_id, barcodes=["LIB-0001"])  # already in use
+    with pytest.raises(ValueError):
+        add_copies(book_id, barcodes=["7-1"])  # reserved pattern
+    assert add_copies(999, count=1) == "not_found"
+
+    assert remove_copy(book_id, "LIB-0001") is True
+    book = get_book(book_id)
+    assert (book["total_copies"], book["available_copies"]) == (3, 3)
+    assert remove_copy(book_id, "nope") == "not_found"
+
+
+def test_remove_copy_refuses_loaned_and_last(app):
+    create_user("U", "u@test.com", "p", "member")
+    user_id = get_user_by_email("u@test.com")["id"]
+    add_book("Dune", "Herbert", 1965, "EN", copies=2)
+    book_id = get_all_books()[0]["id"]
+    checkout_book(user_id, book_id)
+
+    on_loan = [c for c in get_copies(book_id) if c["status"] == "on_loan"][0]
+    shelved = [c for c in get_copies(book_id) if c["status"] == "available"][0]
+    assert remove_copy(book_id, on_loan["barcode"]) == "on_loan"
+    assert remove_copy(book_id, shelved["barcode"]) is True
+    assert get_book(book_id)["available"] == 0
+
+
+def test_set_availability_leaves_loaned_copies_alone(app):
+    create_user("U", "u@test.com", "p", "member")
+    user_id = get_user_by_email("u@test.com")["id"]
+    add_book("Dune", "Herbert", 1965, "EN", copies=3)
+    book_id = get_all_books()[0]["id"]
+    checkout_book(user_id, book_id)
+
+    set_availability(book_id, 0)
+    statuses = sorted(c["status"] for c in get_copies(book_id))
+    assert statuses == ["on_loan", "unavailable", "unavailable"]
+    assert get_book(book_id)["available_copies"] == 0
+
+    set_availability(book_id, 1)
+    assert get_book(book_id)["available_copies"] == 2
+
+
+def test_merge_duplicate_rows_into_copies(app):
+    create_user("U", "u@test.com", "p", "member")
+    user_id = get_user_by_email("u@test.com")["id"]
+    for _ in range(3):
+        add_book("Dune", "Herbert", 1965, "EN")
+    add_book("Emma", "Austen", 1815, "EN")
+    keep, dup1, dup2, emma = [b["id"] for b in get_all_books()]
+    checkout_book(user_id, dup1)
+
+    assert find_duplicate_books() == [(keep, [dup1, dup2])]
+    assert merge_books(keep, [dup1, dup2]) is True
+
+    assert [b["id"] for b in get_all_books()] == [keep, emma]
+    book = get_book(keep)
+    assert (book["total_copies"], book["available_copies"]) == (3, 2)
+    assert [r["book_id"] for r in user_history(user_id)] == [keep]
+    assert find_duplicate_books() == []
+    assert merge_books(keep, [dup1]) == "not_found"
@@ -0,0 +1,149 @@
+# tests/unit/test_bulk_controllers_unit.py
+import io
+import json
+import sqlite3
+
+import pytest
+from controllers import bulk_controllers
+from controllers.bulk_controllers import import_books, export_books
+from controllers.book_controllers import delete_book, get_all_books
+from controllers.stats_controller import dashboard_stats
+
+CSV = """title,author,year,language,isbn
+Clean Code,Robert C. Martin,2008,EN,978-0132350884
+Dune,Frank Herbert,1965,EN,
+,No Title,2000,EN,
+Bad Year,Someone,soon,EN,
+"""
+
+
+def test_import_csv_in_batches_with_row_errors(app):
+    report = import_books(io.StringIO(CSV), "csv", batch_size=1)
+
+    assert report["rows"] == 4
+    assert report["inserted"] == 2
+    assert report["failed"] == 2
+    assert [e["line"] for e in report["errors"]] == [4, 5]
+    assert {b["title"] for b in get_all_books()} == {"Clean Code", "Dune"}
+    assert get_all_books()[0]["isbn"] == "9780132350884"
+
+
+def test_import_upsert_by_isbn(app):
+    import_books(io.StringIO(CSV), "csv")
+    update = (
+        '{"title": "Clean Code 2e", "author": "R. Martin", "isbn": "9780132350884"}\n'
+    )
+
+    report = import_books(io.StringIO(update), "ndjson", upsert="isbn")
+    assert (report["inserted"], report["updated"]) == (0, 1)
+    assert len(get_all_books()) == 2
+    assert get_all_books()[0]["title"] == "Clean Code 2e"
+
+
+def test_import_upsert_by_title_author(app):
+    import_books(io.StringIO(CSV), "csv")
+    rows = (
+        '{"title": "Dune", "author": "Frank Herbert", "year": 1966}\n'
+        '{"title": "Emma", "author": "Jane Austen"}\n'
+    )
+
+    report = import_books(io.StringIO(rows), "ndjson", upsert="title_author")
+    assert (report["inserted"], report["updated"]) == (1, 1)
+    dune = [b for b in get_all_books() if b["title"] == "Dune"][0]
+    assert dune["year"] == 1966
+
+
+def test_duplicate_isbn_without_upsert_only_fails_that_row(app):
+    rows = (
+        '{"title": "A", "author": "X", "isbn": "1"}\n'
+        '{"title": "B", "author": "Y", "isbn": "1"}\n'
+        '{"title": "C", "author": "Z"}\n'
+        "not json\n"
+    )
+    report = import_books(io.StringIO(rows), "ndjson", batch_size=10)
+
+    assert report["inserted"] == 2
+    assert sorted(e["line"] for e in report["errors"]) == [2, 4]
+    assert {b["title"] for b in get_all_books()} == {"A", "C"}
+
+
+def test_isbn_repeated_in_a_batch_counts_as_duplicate(app):
+    rows = (
+        '{"title": "A", "author": "X", "isbn": "1"}\n'
+        '{"title": "A 2e", "author": "X", "isbn": "1"}\n'
+        '{"title": "B", "author": "Y", "isbn": "2"}\n'
+    )
+    report = import_books(io.StringIO(rows), "ndjson", upsert="isbn")
+
+    assert (report["inserted"], report["updated"]) == (2, 0)
+    assert report["duplicates"] == 1
+    assert [b["title"] for b in get_all_books()] == ["A 2e", "B"]
+
+
+def test_retried_batch_is_counted_once(app, monkeypatch):
+    real = bulk_controllers.run_in_transaction
+
+    def busy_once(work):
+        attempts = []
+
+        def flaky(cur):
+            result = work(cur)
+            if not attempts:
+                attempts.append(1)
+                raise sqlite3.OperationalError("database is locked")
+            return result
+
+        return real(flaky)
+
+    monkeypatch.setattr(bulk_controllers, "run_in_transaction", busy_once)
+    rows = (
+        '{"title": "A", "author": "X", "isbn": "1"}\n'
+        '{"title": "B", "author": "Y", "isbn": "1"}\n'
+        '{"title": "C", "author": "Z"}\n'
+    )
+    report = import_books(io.StringIO(rows), "ndjson")
+
+    assert (report["inserted"], report["failed"]) == (2, 1)
+    assert [e["line"] for e in report["errors"]] == [2]
+    assert len(get_all_books()) == 2
+
+
+def test_export_round_trip(app):
+    import_books(io.StringIO(CSV), "csv")
+
+    ndjson = "".join(export_books("ndjson"))
+    assert [json.loads(line)["title"] for line in ndjson.splitlines()] == [
+        "Clean Code",
+        "Dune",
+    ]
+
+    csv_text = "".join(export_books("csv"))
+    assert csv_text.splitlines()[0] == (
+        "id,title,author,year,language,available,isbn,total_copies"
+    )
+
+
+def test_round_trip_keeps_copy_counts(app):
+    rows = (
+        '{"title": "A", "author": "X", "total_copies": 3}\n'
+        '{"title": "B", "author": "Y"}\n'
+        '{"title": "C", "author": "Z", "total_copies": 0}\n'
+    )
+    report = import_books(io.StringIO(rows), "ndjson")
+    assert (report["inserted"], report["failed"]) == (2, 1)
+    assert [b["total_copies"] for b in get_all_books()] == [3, 1]
+
+    exported = "".join(export_books("csv"))
+    for book in get_all_books():
+        delete_book(book["id"])
+    import_books(io.StringIO(exported), "csv")
+
+    books = get_all_books()
+    assert [(b["title"], b["total_copies"]) for b in books] == [("A", 3), ("B", 1)]
+    assert [b["available_copies"] for b in books] == [3, 1]
+    assert dashboard_stats()["totals"]["total_copies"] == 4
+
+
+def test_import_rejects_unknown_format(app):
+    with pytest.raises(ValueError):
+        import_books(io.StringIO(""), "xml")
@@ -0,0 +1,78 @@
+# tests/unit/test_cache_unit.py
+import json
+import time
+
+from utils.cache import MemoryBackend, SQLiteBackend, cache
+from controllers.users_controller import create_user
+from controllers.book_controllers import add_book, get_all_books, set_availability
+
+
+def test_memory_backend_lru_and_ttl():
+    backend = MemoryBackend(max_entries=2)
+    backend.set("a", 1, ttl=60)
+    backend.set("b", 2, ttl=60)
+    backend.get("a")  # a is now most recent
+    backend.set("c", 3, ttl=60)
+
+    assert backend.get("b") is None
+    assert backend.get("a") == 1
+    assert backend.evictions == 1
+
+    backend.set("d", 4, ttl=0.01)
+    time.sleep(0.02)
+    assert backend.get("d") is None
+
+
+def test_tag_versions_bump():
+    backend = MemoryBackend(max_entries=10)
+    assert backend.versions(["books", "loans"]) == [0, 0]
+    backend.bump(["books"])
+    assert backend.versions(["books", "loans"]) == [1, 0]
+
+
+def test_sqlite_backend_shared_between_instances(app, tmp_path):
+    path = str(tmp_path / "cache.db")
+    one = SQLiteBackend(path, max_entries=10)
+    two = SQLiteBackend(path, max_entries=10)
+
+    one.set("k", {"body": "x", "status": 200}, ttl=60)
+    assert two.get("k") == {"body": "x", "status": 200}
+
+    two.bump(["books"])
+    assert one.versions(["books"]) == [1]
+
+
+def test_sqlite_backend_stores_json_and_skips_other_rows(app, tmp_path):
+    path = str(tmp_path / "cache.db")
+    backend = SQLiteBackend(path, max_entries=10)
+    backend.set("k", {"body": "x"}, ttl=60)
+
+    conn = backend._connection()
+    assert json.loads(conn.execute("SELECT value FROM cache_entries").fetchone()[0])
+    conn.execute("UPDATE cache_entries SET value = ?", (b"\x80\x04not json",))
+    conn.commit()
+    conn.close()
+    assert backend.get("k") is None
+
+
+def test_books_listing_cached_and_invalidated(client):
+    create_user("M", "m@test.com", "pass123", "member")
+    client.post("/login", json={"email": "m@test.com", "password": "pass123"})
+    add_book("B1", "A1", 2020, "EN")
+
+    client.get("/books")
+    r = client.get("/books")
+    assert cache.stats()["hits"] == 1
+    assert r.get_json()[0]["available"] == 1
+
+    # a write through the controller drops the cached listing
+    set_availability(get_all_books()[0]["id"], 0)
+    r = client.get("/books")
+    assert r.get_json()[0]["available"] == 0
+    assert cache.stats()["misses"] == 2
+
+
+def test_error_responses_not_cached(client):
+    client.get("/books/999")
+    client.get("/books/999")
+    assert cache.stats()["hits"] == 0
@@ -1,5 +1,7 @@
+import threading
+
 from controllers.users_controller import create_user, get_user_by_email
-from controllers.book_controllers import add_book, get_all_books, get_book
+from controllers.book_controllers import add_book, get_all_books, get_book, get_copies
 from controllers.checkout_controllers import (
     checkout_book,
     return_book,
@@ -7,7 +9,13 @@ from controllers.checkout_controllers import (
     user_history,
     book_history,
     all_history,
+    iter_all_history,
+    iter_user_history,
+    return_book_for_user,
+    checkout_books,
+    return_books_for_user,
 )
+import controllers.checkout_controllers as checkout_controllers
 
 
 def test_checkout_and_return_flow(app):
@@ -65,3 +73,111 @@ def test_book_history(app):
     assert bh[0]["book_id"] == book["id"]
     assert bh[0]["book_title"] == "B1"
     assert bh[0]["user_id"] == user["id"]
+
+
+def test_iter_history_streams_in_batches(app, monkeypatch):
+    monkeypatch.setattr(checkout_controllers, "STREAM_BATCH_SIZE", 2)
+    create_user("U", "u@test.com", "pass", "member")
+    user = get_user_by_email("u@test.com")
+
+    for i in range(5):
+        add_book(f"B{i}", "A", 2020, "EN")
+    for book in get_all_books():
+        checkout_book(user["id"], book["id"])
+
+    rows = list(iter_all_history())
+    assert len(rows) == 5
+    assert isinstance(rows[0], dict)
+    assert rows == [dict(r) for r in all_history()]
+    assert len(list(iter_user_history(user["id"]))) == 5
+
+
+def test_checkout_conflicts_reported(app):
+    create_user("U", "u@test.com", "pass", "member")
+    user = get_user_by_email("u@test.com")
+    add_book("B1", "A1", 2020, "EN")
+    book_id = get_all_books()[0]["id"]
+
+    assert checkout_book(user["id"], book_id) is True
+    assert checkout_book(user["id"], book_id) == "unavailable"
+    assert checkout_book(user["id"], 999) == "not_found"
+    assert len(all_history()) == 1
+
+
+def test_return_book_for_user(app):
+    create_user("U", "u@test.com", "pass", "member")
+    user = get_user_by_email("u@test.com")
+    add_book("B1", "A1", 2020, "EN")
+    book_id = get_all_books()[0]["id"]
+
+    assert return_book_for_user(user["id"], book_id) == "not_open"
+    checkout_book(user["id"], book_id)
+    assert return_book_for_user(user["id"], book_id) is True
+    assert get_book(book_id)["available"] == 1
+    assert return_book_for_user(user["id"], book_id) == "not_open"
+
+
+def test_concurrent_checkouts_only_one_wins(app):
+    create_user("U", "u@test.com", "pass", "member")
+    user = get_user_by_email("u@test.com")
+    add_book("B1", "A1", 2020, "EN")
+    book_id = get_all_books()[0]["id"]
+
+    results = []
+    start = threading.Barrier(6)
+
+    def worker():
+        start.wait()
+        results.append(checkout_book(user["id"], book_id))
+
+    threads = [threading.Thread(target=worker) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results.count(True) == 1
+    assert results.count("unavailable") == 5
+    assert len(all_history()) == 1
+
+
+def test_batch_checkout_and_return(app):
+    create_user("U", "u@test.com", "pass", "member")
+    user = get_user_by_email("u@test.com")
+    for i in range(3):
+        add_book(f"B{i}", "A", 2020, "EN")
+    b0, b1, b2 = [b["id"] for b in get_all_books()]
+    checkout_book(user["id"], b2)
+
+    results = checkout_books(user["id"], [b0, b1, b2, 999])
+    assert [r["status"] for r in results] == ["ok", "ok", "unavailable", "not_found"]
+    assert get_book(b0)["available"] == 0
+
+    results = return_books_for_user(user["id"], [b0, b1, b2, b0])
+    assert [r["status"] for r in results] == ["ok", "ok", "ok", "not_open"]
+    assert all(get_book(b)["available"] == 1 for b in (b0, b1, b2))
+
+
+def test_each_loan_takes_one_copy(app):
+    for n in (1, 2, 3):
+        create_user(f"U{n}", f"u{n}@test.com", "pass", "member")
+    u1, u2, u3 = [get_user_by_email(f"u{n}@test.com")["id"] for n in (1, 2, 3)]
+    add_book("Reserve", "A", 2020, "EN", copies=2)
+    book_id = get_all_books()[0]["id"]
+
+    assert checkout_book(u1, book_id) is True
+    book = get_book(book_id)
+    assert (book["available_copies"], book["available"]) == (1, 1)
+
+    assert checkout_book(u2, book_id) is True
+    assert checkout_book(u3, book_id) == "unavailable"
+    book = get_book(book_id)
+    assert (book["available_copies"], book["available"]) == (0, 0)
+    assert {c["status"] for c in get_copies(book_id)} == {"on_loan"}
+
+    # u2's copy comes back, not u1's
+    assert return_book_for_user(u2, book_id) is True
+    on_loan = [c["id"] for c in get_copies(book_id) if c["status"] == "on_loan"]
+    assert [r["copy_id"] for r in user_history(u1)] == on_loan
+    book = get_book(book_id)
+    assert (book["available_copies"], book["total_copies"]) == (1, 2)
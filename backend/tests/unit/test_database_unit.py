@@ -0,0 +1,177 @@
+# tests/unit/test_database_unit.py
+import pytest
+import database
+
+
+def test_connections_are_reused(app):
+    pool = database.get_pool()
+
+    conn = database.get_connection()
+    raw = conn._conn
+    conn.close()
+
+    conn2 = database.get_connection()
+    assert conn2._conn is raw
+    conn2.close()
+
+    assert pool.stats()["in_use"] == 0
+
+
+def test_pool_is_bounded(app):
+    pool = database.ConnectionPool(database.DB_NAME, max_size=1, timeout=0.05)
+
+    first = pool.acquire()
+    with pytest.raises(database.PoolTimeout):
+        pool.acquire()
+
+    pool.release(first)
+    assert pool.acquire() is first
+    pool.close()
+
+
+def test_pragmas_applied_once_per_connection(app):
+    pool = database.ConnectionPool(database.DB_NAME, pragmas={"busy_timeout": 1234})
+    conn = pool.acquire()
+    assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 1234
+    pool.release(conn)
+    pool.close()
+
+
+def test_uncommitted_work_rolled_back_on_close(app):
+    conn = database.get_connection()
+    conn.execute(
+        "INSERT INTO books (title, author, year, language) VALUES ('T', 'A', 1, 'EN')"
+    )
+    conn.close()
+
+    conn = database.get_connection()
+    assert conn.execute("SELECT COUNT(*) FROM books").fetchone()[0] == 0
+    conn.close()
+
+
+def test_closed_connection_cannot_be_used(app):
+    conn = database.get_connection()
+    conn.close()
+    with pytest.raises(database.sqlite3.ProgrammingError):
+        conn.cursor()
+
+
+def test_request_shares_one_connection(app):
+    with app.app_context():
+        a = database.get_connection()
+        b = database.get_connection()
+        assert a._conn is b._conn
+        a.close()
+        b.close()
+        assert database.get_pool().stats()["in_use"] == 1
+
+    assert database.get_pool().stats()["in_use"] == 0
+
+
+def test_idle_request_connection_released_early(app):
+    with app.app_context():
+        a = database.get_connection()
+        database.release_idle_request_connection()
+        # still in use by `a`
+        assert database.get_pool().stats()["in_use"] == 1
+
+        a.close()
+        database.release_idle_request_connection()
+        assert database.get_pool().stats()["in_use"] == 0
+
+        b = database.get_connection()
+        assert b.execute("SELECT 1").fetchone()[0] == 1
+        b.close()
+
+
+def test_wal_profile_applied_by_default(app):
+    conn = database.get_connection()
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+    conn.close()
+
+
+def test_unknown_storage_profile_rejected():
+    with pytest.raises(ValueError):
+        database.profile_pragmas("nope")
+
+
+def test_checkpoint_runs(app):
+    checkpointer = database.CheckpointScheduler(database.DB_NAME, interval=60)
+    busy, _, _ = checkpointer.checkpoint()
+    assert busy == 0
+
+
+def test_migrations_recorded_and_idempotent(app):
+    database.init_db()  # second run on the same file
+
+    conn = database.get_connection()
+    versions = [
+        r["version"] for r in conn.execute("SELECT version FROM schema_version")
+    ]
+    conn.close()
+    assert versions == [v for v, _, _ in database.MIGRATIONS]
+
+
+def test_legacy_users_table_gets_is_active(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_NAME", str(tmp_path / "legacy.db"))
+    conn = database.get_connection()
+    conn.execute(
+        "CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL,"
+        " email TEXT UNIQUE NOT NULL, password TEXT NOT NULL, role TEXT)"
+    )
+    conn.execute("INSERT INTO users (name, email, password) VALUES ('o', 'o@x', 'p')")
+    conn.commit()
+    conn.close()
+
+    database.init_db()
+
+    conn = database.get_connection()
+    assert conn.execute("SELECT is_active FROM users").fetchone()[0] == 1
+    conn.close()
+    database.close_pools()
+
+
+def test_existing_books_become_single_copies(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_NAME", str(tmp_path / "copies.db"))
+    monkeypatch.setattr(database, "MIGRATIONS", database.MIGRATIONS[:8])
+    database.init_db()
+    conn = database.get_connection()
+    conn.execute("INSERT INTO books (title, author, available) VALUES ('A', 'x', 1)")
+    conn.execute("INSERT INTO books (title, author, available) VALUES ('B', 'x', 0)")
+    conn.execute(
+        "INSERT INTO checkout_history (user_id, book_id, checkout_date) "
+        "VALUES (1, 2, '2024-01-01')"
+    )
+    conn.commit()
+    conn.close()
+
+    monkeypatch.undo()
+    monkeypatch.setattr(database, "DB_NAME", str(tmp_path / "copies.db"))
+    database.init_db()
+
+    conn = database.get_connection()
+    copies = conn.execute("SELECT book_id, status FROM copies ORDER BY id").fetchall()
+    counters = conn.execute(
+        "SELECT total_copies, available_copies FROM books ORDER BY id"
+    ).fetchall()
+    loan = conn.execute("SELECT copy_id FROM checkout_history").fetchone()
+    conn.close()
+    database.close_pools()
+
+    assert [tuple(c) for c in copies] == [(1, "available"), (2, "on_loan")]
+    assert [tuple(c) for c in counters] == [(1, 1), (1, 0)]
+    assert loan["copy_id"] == 2
+
+
+def test_open_checkout_lookup_uses_partial_index(app):
+    conn = database.get_connection()
+    plan = " ".join(
+        r["detail"]
+        for r in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM checkout_history "
+            "WHERE user_id = 1 AND book_id = 2 AND return_date IS NULL"
+        )
+    )
+    conn.close()
+    assert "idx_checkout_open" in plan
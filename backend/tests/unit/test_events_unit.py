@@ -0,0 +1,104 @@
+# tests/unit/test_events_unit.py
+import json
+
+import pytest
+
+from controllers import book_controllers
+from utils import events
+from utils.events import Hub, MemoryBroker, SQLiteBroker, DROPPED
+
+
+def test_fan_out_reaches_every_subscriber():
+    hub = Hub(queue_size=4, max_subscribers=10)
+    broker = MemoryBroker(hub)
+    a, b = hub.subscribe(), hub.subscribe()
+
+    broker.publish({"type": "availability", "book_id": 1, "available": 0})
+
+    for sub in (a, b):
+        assert sub.queue.get_nowait() == {
+            "id": 1,
+            "type": "availability",
+            "book_id": 1,
+            "available": 0,
+        }
+
+
+def test_slow_subscriber_is_dropped_not_waited_for():
+    hub = Hub(queue_size=2, max_subscribers=10)
+    slow, fast = hub.subscribe(), hub.subscribe()
+
+    for i in range(3):
+        hub.fan_out({"id": i, "type": "book"})
+        fast.queue.get_nowait()
+
+    assert slow.dropped and hub.dropped == 1
+    assert slow.queue.get_nowait() is DROPPED
+    assert hub.count() == 1  # fast keeps its stream
+
+
+def test_subscriber_limit():
+    hub = Hub(queue_size=2, max_subscribers=1)
+    hub.subscribe()
+    with pytest.raises(events.TooManySubscribers):
+        hub.subscribe()
+
+
+def test_event_stream_frames_and_heartbeat():
+    hub = Hub(queue_size=4, max_subscribers=10)
+    sub = hub.subscribe()
+    stream = events.event_stream(sub, heartbeat=0.01)
+
+    assert next(stream).startswith("retry:")
+    assert next(stream) == ": keepalive\n\n"
+
+    sub.queue.put_nowait({"id": 7, "type": "availability", "book_id": 3})
+    frame = next(stream)
+    assert frame.startswith("id: 7\nevent: availability\ndata: ")
+    assert json.loads(frame.split("data: ")[1]) == {"book_id": 3}
+
+    sub.queue.put_nowait(DROPPED)
+    assert next(stream) == "event: dropped\ndata: {}\n\n"
+    with pytest.raises(StopIteration):
+        next(stream)
+
+
+def test_sqlite_broker_shares_events_between_processes(tmp_path):
+    path = str(tmp_path / "events.db")
+    # two brokers on one file stand in for two worker processes
+    hub_a, hub_b = Hub(4, 10), Hub(4, 10)
+    worker_a = SQLiteBroker(hub_a, path, poll_interval=60)
+    worker_b = SQLiteBroker(hub_b, path, poll_interval=60)
+    try:
+        sub = hub_b.subscribe()
+        worker_a.publish({"type": "book", "action": "added", "book_id": 5})
+        worker_b.poll()
+
+        event = sub.queue.get_nowait()
+        assert event["type"] == "book" and event["book_id"] == 5
+        assert event["id"] == 1
+    finally:
+        worker_a.close()
+        worker_b.close()
+
+
+def test_availability_not_read_without_listeners(app, monkeypatch):
+    book_controllers.add_book("Dune", "Herbert", 1965, "EN")
+    reads = []
+    real = book_controllers.get_connection
+    monkeypatch.setattr(
+        book_controllers,
+        "get_connection",
+        lambda: reads.append(1) or real(),
+    )
+
+    book_controllers.publish_availability([1])
+    assert reads == []
+
+    sub = events.subscribe()
+    try:
+        book_controllers.publish_availability([1])
+        assert reads == [1]
+        assert sub.queue.get_nowait()["total_copies"] == 1
+    finally:
+        events.unsubscribe(sub)
@@ -0,0 +1,60 @@
+# tests/unit/test_generate_data_unit.py
+import datetime
+
+import pytest
+
+import database
+import generate_data
+
+END = datetime.datetime(2025, 1, 1)
+
+
+def _dump():
+    conn = database.get_connection()
+    users = [tuple(r) for r in conn.execute("SELECT email, role FROM users")]
+    loans = [tuple(r) for r in conn.execute("SELECT * FROM checkout_history")]
+    conn.close()
+    return users, loans
+
+
+def test_generated_library_is_consistent(app):
+    summary = generate_data.generate(50, 200, 3000, days=365, end=END)
+    assert summary["users"] == 50 and summary["books"] == 200
+    assert 0 < summary["loans"] <= 3000
+
+    conn = database.get_connection()
+    # one open loan per unavailable book, none for available ones
+    mismatched = conn.execute(
+        """
+        SELECT COUNT(*) FROM books b
+        WHERE b.available != (
+            SELECT COUNT(*) = 0 FROM checkout_history c
+            WHERE c.book_id = b.id AND c.return_date IS NULL
+        )
+    """
+    ).fetchone()[0]
+    assert mismatched == 0
+    assert conn.execute(
+        "SELECT MAX(n) FROM (SELECT COUNT(*) n FROM checkout_history "
+        "WHERE return_date IS NULL GROUP BY book_id)"
+    ).fetchone()[0] == 1
+    assert conn.execute(
+        "SELECT value FROM stats_totals WHERE name = 'active_loans'"
+    ).fetchone()[0] == summary["open_loans"]
+    conn.close()
+
+
+def test_same_seed_same_rows(app, tmp_path):
+    generate_data.generate(20, 50, 500, end=END, seed=7)
+    first = _dump()
+
+    database.close_pools()
+    database.DB_NAME = str(tmp_path / "again.db")
+    generate_data.generate(20, 50, 500, end=END, seed=7)
+    assert _dump() == first
+
+
+def test_refuses_non_empty_database(app):
+    generate_data.generate(5, 5, 10, end=END)
+    with pytest.raises(ValueError):
+        generate_data.generate(5, 5, 10, end=END)
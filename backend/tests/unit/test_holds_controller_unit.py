@@ -0,0 +1,166 @@
+import database
+from controllers.users_controller import create_user, get_user_by_email
+from controllers.book_controllers import (
+    add_book,
+    add_copies,
+    get_all_books,
+    get_book,
+    get_copies,
+    merge_books,
+    remove_copy,
+)
+from controllers.checkout_controllers import checkout_book, return_book_for_user
+from controllers.holds_controller import (
+    book_queue,
+    cancel_hold,
+    expire_holds,
+    get_hold,
+    place_hold,
+    user_holds,
+)
+
+
+def _users(*names):
+    ids = []
+    for name in names:
+        create_user(name, f"{name}@test.com", "pass", "member")
+        ids.append(get_user_by_email(f"{name}@test.com")["id"])
+    return ids
+
+
+def _book(title="B1"):
+    add_book(title, "A1", 2020, "EN")
+    return [b for b in get_all_books() if b["title"] == title][0]["id"]
+
+
+def test_place_hold_only_when_every_copy_is_out(app):
+    a, b = _users("a", "b")
+    book_id = _book()
+
+    assert place_hold(a, book_id) == "available"
+    assert place_hold(a, 999) == "not_found"
+
+    checkout_book(a, book_id)
+    assert place_hold(a, book_id) == "on_loan"
+    assert place_hold(b, book_id) == 1
+    assert place_hold(b, book_id) == "already_held"
+    assert get_hold(b, book_id)["position"] == 1
+
+
+def test_return_hands_the_copy_to_the_queue_in_order(app):
+    a, b, c = _users("a", "b", "c")
+    book_id = _book()
+    checkout_book(a, book_id)
+    assert place_hold(b, book_id) == 1
+    assert place_hold(c, book_id) == 2
+
+    assert return_book_for_user(a, book_id) is True
+
+    # the copy went to b, not back on the shelf
+    book = get_book(book_id)
+    assert (book["available"], book["available_copies"]) == (0, 0)
+    assert [c["status"] for c in get_copies(book_id)] == ["held"]
+    assert get_hold(b, book_id)["status"] == "ready"
+    assert get_hold(b, book_id)["expires_at"] is not None
+    assert get_hold(c, book_id)["position"] == 1
+
+    # a walk-in can't take it; the holder can
+    assert checkout_book(a, book_id) == "unavailable"
+    assert checkout_book(b, book_id) is True
+    assert get_hold(b, book_id) is None
+    assert [c["status"] for c in get_copies(book_id)] == ["on_loan"]
+
+
+def test_cancel_ready_hold_passes_copy_on(app):
+    a, b, c = _users("a", "b", "c")
+    book_id = _book()
+    checkout_book(a, book_id)
+    place_hold(b, book_id)
+    place_hold(c, book_id)
+    return_book_for_user(a, book_id)
+
+    assert cancel_hold(b, book_id) is True
+    assert get_hold(c, book_id)["status"] == "ready"
+    assert cancel_hold(c, book_id) is True
+    assert cancel_hold(c, book_id) == "not_found"
+
+    # nobody left waiting: back on the shelf
+    assert get_book(book_id)["available_copies"] == 1
+    assert [c["status"] for c in get_copies(book_id)] == ["available"]
+
+
+def test_expire_holds_moves_uncollected_copy(app):
+    a, b, c = _users("a", "b", "c")
+    book_id = _book()
+    checkout_book(a, book_id)
+    place_hold(b, book_id)
+    place_hold(c, book_id)
+    return_book_for_user(a, book_id)
+
+    assert expire_holds(now="2000-01-01T00:00:00.000000") == 0
+    assert expire_holds(now="9999-01-01T00:00:00.000000") == 1
+    assert get_hold(b, book_id) is None
+    assert get_hold(c, book_id)["status"] == "ready"
+    assert [h["status"] for h in book_queue(book_id)] == ["ready"]
+
+    # c's pickup window started at that sweep
+    assert expire_holds(now="9999-01-01T00:00:00.000000") == 0
+    assert expire_holds(now="9999-02-01T00:00:00.000000") == 1
+    assert get_book(book_id)["available"] == 1
+
+
+def test_new_copies_go_to_waiting_readers(app):
+    a, b, c = _users("a", "b", "c")
+    book_id = _book()
+    checkout_book(a, book_id)
+    place_hold(b, book_id)
+    place_hold(c, book_id)
+
+    add_copies(book_id, count=3)
+
+    assert [h["status"] for h in user_holds(b)] == ["ready"]
+    assert [h["status"] for h in user_holds(c)] == ["ready"]
+    book = get_book(book_id)
+    assert (book["total_copies"], book["available_copies"]) == (4, 1)
+
+    held = [c["barcode"] for c in get_copies(book_id) if c["status"] == "held"]
+    assert remove_copy(book_id, held[0]) == "held"
+
+
+def test_merge_books_joins_queues(app):
+    a, b, c = _users("a", "b", "c")
+    keep = _book("Dune")
+    dup = _book("Dune copy")
+    checkout_book(a, keep)
+    checkout_book(a, dup)
+    place_hold(b, keep)
+    place_hold(c, dup)
+    place_hold(b, dup)
+
+    assert merge_books(keep, [dup]) is True
+    assert [h["status"] for h in book_queue(keep)] == ["waiting", "waiting"]
+    assert get_hold(c, keep)["position"] == 2
+
+    conn = database.get_connection()
+    cancelled = conn.execute(
+        "SELECT COUNT(*) FROM holds WHERE status = 'cancelled'"
+    ).fetchone()[0]
+    conn.close()
+    assert cancelled == 1
+
+
+def test_queue_uses_the_queue_index(app):
+    conn = database.get_connection()
+    plan = conn.execute(
+        """
+        EXPLAIN QUERY PLAN
+        SELECT id FROM holds
+        WHERE book_id = 1 AND status = 'waiting'
+        ORDER BY created_at, id
+        LIMIT 1
+    """
+    ).fetchall()
+    conn.close()
+    details = " ".join(row["detail"] for row in plan)
+    assert "idx_holds_queue" in details
+    assert "TEMP B-TREE" not in details
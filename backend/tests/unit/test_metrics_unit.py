@@ -0,0 +1,58 @@
+# tests/unit/test_metrics_unit.py
+import database
+from utils.metrics import Registry, statement_label
+
+
+def test_query_listener_sees_sql_rows_and_time(app):
+    seen = []
+
+    def listener(sql, params, seconds, rows, conn):
+        seen.append((sql, params, seconds, rows))
+
+    database.add_query_listener(listener)
+    try:
+        conn = database.get_connection()
+        cur = conn.cursor()
+        cur.execute("SELECT ? AS n UNION ALL SELECT ?", (1, 2))
+        assert len(cur.fetchall()) == 2
+        conn.close()
+    finally:
+        database.remove_query_listener(listener)
+
+    sql, params, seconds, rows = seen[-1]
+    assert sql == "SELECT ? AS n UNION ALL SELECT ?"
+    assert params == (1, 2)
+    assert rows == 2
+    assert seconds >= 0
+
+
+def test_removed_listener_is_not_called(app):
+    seen = []
+    listener = lambda *args: seen.append(args)  # noqa: E731
+
+    database.add_query_listener(listener)
+    database.remove_query_listener(listener)
+
+    conn = database.get_connection()
+    conn.execute("SELECT 1").fetchone()
+    conn.close()
+    assert seen == []
+
+
+def test_registry_renders_cumulative_histograms():
+    registry = Registry()
+    registry.observe_request("GET", "/books", 200, 0.003, 2)
+    registry.observe_request("GET", "/books", 200, 0.2, 1)
+    registry.observe_statement("SELECT *\n  FROM books", 0.001, 5)
+
+    text = registry.render()
+    labels = 'method="GET",endpoint="/books",status="200"'
+    assert f'http_request_duration_seconds_bucket{{{labels},le="0.005"}} 1' in text
+    assert f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2' in text
+    assert f"http_request_duration_seconds_count{{{labels}}} 2" in text
+    assert 'db_statement_total{sql="SELECT * FROM books"} 1' in text
+    assert 'db_statement_rows_total{sql="SELECT * FROM books"} 5' in text
+
+
+def test_statement_label_collapses_whitespace():
+    assert statement_label("  SELECT 1\n\tFROM x ") == "SELECT 1 FROM x"
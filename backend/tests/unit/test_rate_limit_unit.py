@@ -0,0 +1,71 @@
+# tests/unit/test_rate_limit_unit.py
+import controllers.users_controller as users_controller
+from app import create_app
+from middleware import rate_limit
+from middleware.rate_limit import MemoryStore, SQLiteStore, _slide
+
+
+def test_sliding_window_weights_previous_window():
+    # 10 hits in the previous 60s window, now 15s into the next one
+    start, prev, cur, estimate = _slide((0, 0, 10), now=75, window=60)
+    assert (start, prev, cur) == (60, 10, 0)
+    assert estimate == 10 * 45 / 60
+
+    # old enough to be forgotten entirely
+    assert _slide((0, 5, 10), now=200, window=60)[1:] == (0, 0, 0)
+
+
+def test_memory_store_limits_and_sweeps(monkeypatch):
+    store = MemoryStore()
+    results = [store.hit("k", limit=3, window=60)[0] for _ in range(5)]
+    assert results == [True, True, True, False, False]
+    assert store.hit("k", limit=3, window=60)[1] >= 1
+
+    monkeypatch.setattr(rate_limit, "SWEEP_INTERVAL", 0)
+    later = rate_limit.time.time() + 3600
+    monkeypatch.setattr(rate_limit.time, "time", lambda: later)
+    store.hit("other", limit=3, window=60)
+    assert len(store) == 1
+
+
+def test_sqlite_store_shared(app, tmp_path):
+    path = str(tmp_path / "rl.db")
+    one, two = SQLiteStore(path), SQLiteStore(path)
+    assert one.hit("k", limit=2, window=60)[0]
+    assert two.hit("k", limit=2, window=60)[0]
+    assert not one.hit("k", limit=2, window=60)[0]
+
+
+def test_login_throttled_per_email_before_db(client, monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        users_controller, "get_user_by_email", lambda email: calls.append(email)
+    )
+
+    limit = rate_limit.LOGIN_PER_EMAIL[0]
+    for _ in range(limit + 2):
+        r = client.post("/login", json={"email": "y@test.com", "password": "p"})
+
+    assert r.status_code == 429
+    assert "Retry-After" in r.headers
+    assert len(calls) == limit
+
+
+def test_per_ip_limit_uses_forwarded_for_behind_proxy(app, monkeypatch):
+    monkeypatch.setattr(rate_limit, "TRUSTED_PROXIES", 1)
+    monkeypatch.setattr(users_controller, "get_user_by_email", lambda email: None)
+    client = create_app(init_db=False).test_client()
+
+    def login(ip, n):
+        return client.post(
+            "/login",
+            json={"email": f"u{n}@test.com", "password": "p"},
+            headers={"X-Forwarded-For": ip},
+        )
+
+    limit = rate_limit.LOGIN_PER_IP[0]
+    codes = [login("10.0.0.1", n).status_code for n in range(limit + 1)]
+    assert codes[-1] == 429
+    assert rate_limit.limiter.rejected == 1
+    # another client behind the same proxy has its own bucket
+    assert login("10.0.0.2", 0).status_code == 401
@@ -0,0 +1,72 @@
+# tests/unit/test_slow_queries_unit.py
+import json
+
+import database
+from utils.slow_queries import slow_queries
+
+
+def test_slow_statement_recorded_with_params_and_plan(app, tmp_path):
+    log_path = tmp_path / "slow.log"
+    slow_queries.configure(0, 10, str(log_path))
+
+    conn = database.get_connection()
+    conn.execute(
+        "SELECT * FROM checkout_history WHERE user_id = ? ORDER BY checkout_date",
+        (7,),
+    ).fetchall()
+    conn.close()
+
+    entry = slow_queries.entries()[0]
+    assert entry["sql"].startswith("SELECT * FROM checkout_history")
+    # values are redacted unless asked for
+    assert entry["params"] == ["<int>"]
+    assert any("idx_checkout_user" in line for line in entry["plan"])
+
+    logged = [json.loads(line) for line in log_path.read_text().splitlines()]
+    assert entry in logged
+
+
+def test_fast_statements_are_ignored(app):
+    slow_queries.configure(10_000, 10, None)
+
+    conn = database.get_connection()
+    conn.execute("SELECT 1").fetchone()
+    conn.close()
+
+    assert slow_queries.entries() == []
+
+
+def test_ring_buffer_keeps_newest(app):
+    slow_queries.configure(0, 3, None, log_params=True)
+
+    conn = database.get_connection()
+    for i in range(5):
+        conn.execute("SELECT ?", (i,)).fetchone()
+    conn.close()
+
+    assert [e["params"] for e in slow_queries.entries()] == [[4], [3], [2]]
+
+
+def test_params_redacted_by_default(app):
+    slow_queries.configure(0, 10, None)
+
+    conn = database.get_connection()
+    conn.execute("SELECT id FROM users WHERE email = ?", ("a@b.org",)).fetchall()
+    conn.close()
+
+    assert slow_queries.entries()[0]["params"] == ["<str 7>"]
+
+
+def test_secrets_masked_even_when_logging_params(app):
+    slow_queries.configure(0, 10, None, log_params=True)
+    email = "reader@example.com"
+    digest = "scrypt$16384$8$1$" + "ab" * 16 + "$" + "cd" * 32
+
+    conn = database.get_connection()
+    conn.execute("SELECT ?, ?", (digest, email)).fetchall()
+    conn.execute("SELECT id FROM users WHERE password = ?", (email,)).fetchall()
+    conn.close()
+
+    by_sql = {e["sql"]: e["params"] for e in slow_queries.entries()}
+    assert by_sql["SELECT ?, ?"] == [f"<str {len(digest)}>", email]
+    assert by_sql["SELECT id FROM users WHERE password = ?"] == ["<str 18>"]
@@ -0,0 +1,98 @@
+# tests/unit/test_stats_controller_unit.py
+from datetime import date
+
+import database
+from controllers.users_controller import create_user, get_user_by_email
+from controllers.book_controllers import (
+    add_book,
+    add_copies,
+    delete_book,
+    get_all_books,
+    get_copies,
+    remove_copy,
+    set_availability,
+)
+from controllers.checkout_controllers import (
+    checkout_book,
+    return_book,
+    get_open_checkout_entry,
+)
+from controllers.stats_controller import dashboard_stats, rebuild_all_stats
+
+
+def _seed_loans():
+    create_user("U1", "u1@test.com", "p", "member")
+    create_user("U2", "u2@test.com", "p", "member")
+    u1 = get_user_by_email("u1@test.com")["id"]
+    u2 = get_user_by_email("u2@test.com")["id"]
+
+    add_book("B1", "A", 2020, "EN")
+    add_book("B2", "A", 2020, "EN")
+    b1, b2 = [b["id"] for b in get_all_books()]
+
+    checkout_book(u1, b1)
+    return_book(get_open_checkout_entry(u1, b1), b1)
+    checkout_book(u2, b1)
+    checkout_book(u2, b2)
+    return u1, u2, b1, b2
+
+
+def test_counters_follow_checkout_and_return(app):
+    u1, u2, b1, b2 = _seed_loans()
+
+    data = dashboard_stats()
+    assert data["totals"] == {
+        "total_books": 2,
+        "total_copies": 2,
+        "available_copies": 0,
+        "total_users": 2,
+        "active_loans": 2,
+    }
+    assert data["top_books"][0] == {"book_id": b1, "title": "B1", "count": 2}
+    assert data["top_users"][0]["user_id"] == u2
+    assert data["trend_7d"][-1] == {"date": date.today().isoformat(), "count": 3}
+
+
+def test_returning_twice_counts_once(app):
+    u1, _, b1, _ = _seed_loans()
+    conn = database.get_connection()
+    entry_id = conn.execute(
+        "SELECT id FROM checkout_history WHERE user_id = ? AND book_id = ?", (u1, b1)
+    ).fetchone()["id"]
+    conn.close()
+
+    assert return_book(entry_id, b1) == "not_open"
+    assert dashboard_stats()["totals"]["active_loans"] == 2
+
+
+def test_rebuild_matches_incremental(app):
+    _seed_loans()
+    before = dashboard_stats()
+
+    rebuild_all_stats()
+    assert dashboard_stats() == before
+
+
+def test_copy_totals_follow_copy_changes(app):
+    _seed_loans()
+    b1 = get_all_books()[0]["id"]
+
+    add_copies(b1, count=3)
+    remove_copy(b1, get_copies(b1)[-1]["barcode"])
+    set_availability(b1, False)
+    totals = dashboard_stats()["totals"]
+    assert (totals["total_copies"], totals["available_copies"]) == (4, 0)
+
+    set_availability(b1, True)
+    add_book("B3", "A", 2020, "EN", copies=2)
+    totals = dashboard_stats()["totals"]
+    assert (totals["total_copies"], totals["available_copies"]) == (6, 4)
+
+    delete_book(b1)
+    totals = dashboard_stats()["totals"]
+    assert (totals["total_copies"], totals["available_copies"]) == (3, 2)
+
+    # the same numbers as summing the per-book counters
+    before = dashboard_stats()
+    rebuild_all_stats()
+    assert dashboard_stats() == before
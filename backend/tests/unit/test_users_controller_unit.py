@@ -1,5 +1,11 @@
 # tests/unit/test_users_controller_unit.py
+import hashlib
+import threading
+
+import pytest
 import database
+from utils import passwords
+from utils.passwords import verify_password, needs_rehash
 from controllers.users_controller import (
     hash_password,
     create_user,
@@ -10,11 +16,46 @@ from controllers.users_controller import (
 )
 
 
-def test_hash_password_is_sha256():
+def test_hash_password_is_salted_and_versioned():
     h1 = hash_password("abc")
     h2 = hash_password("abc")
-    assert h1 == h2
-    assert len(h1) == 64
+    assert h1 != h2
+    assert h1.startswith("scrypt$")
+    assert verify_password("abc", h1)
+    assert not verify_password("abd", h1)
+
+
+def test_pbkdf2_scheme(monkeypatch):
+    monkeypatch.setattr(passwords, "PASSWORD_SCHEME", "pbkdf2_sha256")
+    monkeypatch.setattr(passwords, "PBKDF2_ITERATIONS", 1000)
+    h = hash_password("abc")
+    assert h.startswith("pbkdf2_sha256$1000$")
+    assert verify_password("abc", h)
+    assert not needs_rehash(h)
+
+
+def test_legacy_sha256_hash_upgraded_on_login(app):
+    create_user("A", "a@test.com", "pass123", "member")
+    legacy = hashlib.sha256(b"pass123").hexdigest()
+    conn = database.get_connection()
+    conn.execute("UPDATE users SET password = ?", (legacy,))
+    conn.commit()
+    conn.close()
+
+    assert needs_rehash(legacy)
+    assert validate_user("a@test.com", "pass123") is not None
+
+    upgraded = get_user_by_email("a@test.com")["password"]
+    assert upgraded.startswith("scrypt$")
+    assert validate_user("a@test.com", "pass123") is not None
+
+
+def test_hashing_pool_turns_callers_away_when_full(monkeypatch):
+    monkeypatch.setattr(passwords, "_pending", threading.BoundedSemaphore(1))
+    monkeypatch.setattr(passwords, "HASH_WAIT_TIMEOUT", 0.01)
+    passwords._pending.acquire()
+    with pytest.raises(passwords.HashingBusy):
+        hash_password("abc")
 
 
 def test_validate_user_success(app):
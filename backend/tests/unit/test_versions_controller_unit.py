@@ -0,0 +1,66 @@
+# tests/unit/test_versions_controller_unit.py
+from controllers.users_controller import create_user, get_user_by_email
+from controllers.users_controller import update_user_role
+from controllers.book_controllers import add_book, get_all_books, update_book
+from controllers.checkout_controllers import (
+    checkout_book,
+    return_book,
+    get_open_checkout_entry,
+)
+from controllers.versions_controller import (
+    current_versions,
+    BOOKS,
+    BOOK_TITLES,
+    EPOCH,
+    USERS,
+    book_key,
+    loans_key,
+    user_key,
+)
+
+
+def test_unknown_names_are_zero(app):
+    assert current_versions(["nothing", book_key(99)]) == [0, 0]
+    assert current_versions([EPOCH])[0] != 0
+
+
+def test_user_writes_bump_table_and_row(app):
+    create_user("U", "u@test.com", "p", "member")
+    user_id = get_user_by_email("u@test.com")["id"]
+    before = current_versions([USERS, user_key(user_id)])
+
+    update_user_role(user_id, "librarian")
+
+    after = current_versions([USERS, user_key(user_id)])
+    assert after[0] > before[0] and after[1] > before[1]
+
+
+def test_loans_bump_only_the_borrower(app):
+    create_user("U1", "u1@test.com", "p", "member")
+    create_user("U2", "u2@test.com", "p", "member")
+    u1 = get_user_by_email("u1@test.com")["id"]
+    u2 = get_user_by_email("u2@test.com")["id"]
+    add_book("B", "A", 2020, "EN")
+    book_id = get_all_books()[0]["id"]
+    names = [loans_key(u1), loans_key(u2), BOOKS, book_key(book_id)]
+
+    v0 = current_versions(names)
+    checkout_book(u1, book_id)
+    v1 = current_versions(names)
+    return_book(get_open_checkout_entry(u1, book_id), book_id)
+    v2 = current_versions(names)
+
+    assert v0[0] < v1[0] < v2[0]
+    assert v0[1] == v1[1] == v2[1]
+    assert v0[2] < v1[2] < v2[2]
+    assert v0[3] < v1[3] < v2[3]
+
+
+def test_update_book_bumps_titles(app):
+    add_book("B", "A", 2020, "EN")
+    book_id = get_all_books()[0]["id"]
+    before = current_versions([BOOK_TITLES])[0]
+
+    update_book(book_id, "B2", "A", 2020, "EN")
+
+    assert current_versions([BOOK_TITLES])[0] == before + 1
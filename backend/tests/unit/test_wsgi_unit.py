@@ -0,0 +1,53 @@
+# tests/unit/test_wsgi_unit.py
+import os
+import runpy
+
+import database
+from app import create_app
+
+CONF = os.path.join(os.path.dirname(__file__), "..", "..", "gunicorn.conf.py")
+
+
+def _tables():
+    conn = database.get_connection()
+    rows = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    names = {r["name"] for r in rows}
+    conn.close()
+    return names
+
+
+def test_create_app_can_skip_init_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_NAME", str(tmp_path / "fresh.db"))
+    create_app(init_db=False)
+    assert "books" not in _tables()
+    database.close_pools()
+
+
+def test_master_initialises_schema_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_NAME", str(tmp_path / "served.db"))
+    monkeypatch.setenv("LIBRARY_WORKERS", "4")
+    monkeypatch.setenv("LIBRARY_THREADS", "8")
+    for name in (
+        "LIBRARY_CACHE_BACKEND",
+        "LIBRARY_RATE_LIMIT_BACKEND",
+        "LIBRARY_EVENTS_BACKEND",
+        "LIBRARY_EVENTS_MAX_SUBSCRIBERS",
+        "LIBRARY_INIT_DB",
+    ):
+        # set first so monkeypatch restores the variables the conf file sets
+        monkeypatch.setenv(name, "")
+        monkeypatch.delenv(name)
+
+    conf = runpy.run_path(CONF)
+    assert conf["workers"] == 4
+    assert os.environ["LIBRARY_CACHE_BACKEND"] == "sqlite"
+    assert os.environ["LIBRARY_EVENTS_BACKEND"] == "sqlite"
+    # streams hold gthread threads; two stay free for other requests
+    assert os.environ["LIBRARY_EVENTS_MAX_SUBSCRIBERS"] == "6"
+
+    conf["on_starting"](None)
+    assert os.environ["LIBRARY_INIT_DB"] == "0"
+    # the master keeps no connections for workers to inherit
+    assert database.pool_stats() == {}
+    assert {"books", "users", "checkout_history"} <= _tables()
+    database.close_pools()
@@ -0,0 +1,339 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, request
+
+import database
+
+# ---------- SETTINGS ----------
+
+# "memory" (per process), "sqlite" (shared by all workers on one host) or "none"
+CACHE_BACKEND = os.environ.get("LIBRARY_CACHE_BACKEND", "memory")
+CACHE_MAX_ENTRIES = int(os.environ.get("LIBRARY_CACHE_MAX_ENTRIES", 1024))
+CACHE_DEFAULT_TTL = float(os.environ.get("LIBRARY_CACHE_TTL", 30))
+CACHE_DB_NAME = os.environ.get("LIBRARY_CACHE_DB", "cache.db")
+
+# users looked up by login_required. An entry is served without touching the
+# database for USER_CACHE_RECHECK seconds, then checked against the user's
+# version counter; the TTL only bounds memory. A change made in this process
+# applies at once, one made in another worker within USER_CACHE_RECHECK.
+USER_CACHE_TTL = float(os.environ.get("LIBRARY_USER_CACHE_TTL", 5))
+USER_CACHE_RECHECK = float(os.environ.get("LIBRARY_USER_CACHE_RECHECK", 1))
+USER_CACHE_MAX_ENTRIES = int(os.environ.get("LIBRARY_USER_CACHE_MAX_ENTRIES", 4096))
+
+# Invalidation is by tag: every cached entry records the version of each tag
+# it depends on, and invalidate() just bumps the version. Stale entries are
+# never read again and age out through the LRU / TTL.
+TAG_BOOKS = "books"
+TAG_LOANS = "loans"
+TAG_USERS = "users"
+
+
+class MemoryBackend:
+    """
+    In-process LRU with per-entry TTL.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.evictions += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def versions(self, tags):
+        with self._lock:
+            return [self._versions.get(tag, 0) for tag in tags]
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+    def size(self):
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """
+    Cache kept in its own SQLite file, so every worker process on the host
+    sees the same entries and the same invalidations. Values are stored as
+    JSON, so they must be JSON-serialisable.
+    """
+
+    # trim expired/oldest rows every this many writes
+    PRUNE_EVERY = 100
+
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        with self._connection() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cache_tags (
+                    tag TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL
+                )
+            """
+            )
+            conn.commit()
+
+    def _connection(self):
+        pool = database.get_pool(self.path)
+        return database.PooledConnection(pool.acquire(), pool.release)
+
+    def get(self, key):
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT value, expires_at FROM cache_entries WHERE key = ?", (key,)
+        ).fetchone()
+        conn.close()
+        if row is None:
+            return None
+        if row["expires_at"] <= time.time():
+            return None
+        try:
+            return json.loads(row["value"])
+        except ValueError:
+            # written in another format (e.g. by an older version)
+            return None
+
+    def set(self, key, value, ttl):
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_entries (key, value, expires_at) "
+            "VALUES (?, ?, ?)",
+            (key, json.dumps(value), time.time() + ttl),
+        )
+        conn.commit()
+
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % self.PRUNE_EVERY == 0
+        if prune:
+            self._prune(conn)
+        conn.close()
+
+    def _prune(self, conn):
+        cur = conn.execute(
+            "DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),)
+        )
+        removed = cur.rowcount
+        cur = conn.execute(
+            """
+            DELETE FROM cache_entries WHERE key IN (
+                SELECT key FROM cache_entries
+                ORDER BY expires_at DESC
+                LIMIT -1 OFFSET ?
+            )
+        """,
+            (self.max_entries,),
+        )
+        removed += cur.rowcount
+        conn.commit()
+        with self._lock:
+            self.evictions += removed
+
+    def versions(self, tags):
+        conn = self._connection()
+        rows = conn.execute(
+            f"SELECT tag, version FROM cache_tags "
+            f"WHERE tag IN ({','.join('?' * len(tags))})",
+            list(tags),
+        ).fetchall()
+        conn.close()
+        found = {r["tag"]: r["version"] for r in rows}
+        return [found.get(tag, 0) for tag in tags]
+
+    def bump(self, tags):
+        conn = self._connection()
+        conn.executemany(
+            """
+            INSERT INTO cache_tags (tag, version) VALUES (?, 1)
+            ON CONFLICT(tag) DO UPDATE SET version = version + 1
+        """,
+            [(tag,) for tag in tags],
+        )
+        conn.commit()
+        conn.close()
+
+    def clear(self):
+        conn = self._connection()
+        conn.execute("DELETE FROM cache_entries")
+        conn.execute("DELETE FROM cache_tags")
+        conn.commit()
+        conn.close()
+
+    def size(self):
+        conn = self._connection()
+        n = conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+        conn.close()
+        return n
+
+
+class ResponseCache:
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        # request threads count hits / misses concurrently
+        self._lock = threading.Lock()
+
+    def configure(self, backend_name, max_entries, path=None):
+        if backend_name == "none":
+            self.backend = None
+        elif backend_name == "memory":
+            self.backend = MemoryBackend(max_entries)
+        elif backend_name == "sqlite":
+            self.backend = SQLiteBackend(path or CACHE_DB_NAME, max_entries)
+        else:
+            raise ValueError(f"Unknown cache backend: {backend_name}")
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def record_hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def key(self, tags):
+        versions = self.backend.versions(tags)
+        tag_part = ",".join(f"{t}={v}" for t, v in zip(tags, versions))
+        args = "&".join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+        return f"{tag_part}|{request.path}?{args}"
+
+    def invalidate(self, *tags):
+        if self.backend is not None:
+            self.backend.bump(tags)
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        return {
+            "backend": type(self.backend).__name__ if self.backend else None,
+            "hits": hits,
+            "misses": misses,
+            "evictions": self.backend.evictions if self.backend else 0,
+            "entries": self.backend.size() if self.backend else 0,
+        }
+
+
+cache = ResponseCache()
+
+# user id -> users row, always in-process
+user_cache = MemoryBackend(USER_CACHE_MAX_ENTRIES)
+
+
+def invalidate(*tags):
+    cache.invalidate(*tags)
+
+
+def cached(*tags, ttl=None):
+    """
+    Cache successful (200) responses of a GET view, keyed on path + query
+    string + the current version of each tag. Put it under login_required /
+    require_role so access checks still run on every request.
+    """
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if cache.backend is None:
+                return fn(*args, **kwargs)
+
+            key = cache.key(tags)
+            hit = cache.backend.get(key)
+            if hit is not None:
+                cache.record_hit()
+                return Response(hit["body"], hit["status"], mimetype=hit["mimetype"])
+
+            cache.record_miss()
+            rv = fn(*args, **kwargs)
+            response = rv if isinstance(rv, Response) else None
+            if isinstance(rv, tuple):
+                response, status = rv[0], rv[1]
+                response.status_code = status
+
+            if (
+                response is not None
+                and response.status_code == 200
+                and not response.is_streamed
+            ):
+                cache.backend.set(
+                    key,
+                    {
+                        "body": response.get_data(as_text=True),
+                        "status": response.status_code,
+                        "mimetype": response.mimetype,
+                    },
+                    CACHE_DEFAULT_TTL if ttl is None else ttl,
+                )
+            return rv if response is None else response
+
+        return wrapper
+
+    return decorator
+
+
+def init_app(app):
+    user_cache.clear()
+    cache.configure(
+        app.config.get("CACHE_BACKEND", CACHE_BACKEND),
+        app.config.get("CACHE_MAX_ENTRIES", CACHE_MAX_ENTRIES),
+        app.config.get("CACHE_DB_NAME", CACHE_DB_NAME),
+    )
@@ -0,0 +1,61 @@
+import hashlib
+from functools import wraps
+
+from flask import Response, current_app, request
+
+from controllers.versions_controller import EPOCH, current_versions
+
+# These bodies depend on the session, so shared caches must not store them
+# and browsers must revalidate (which is where the 304s come from).
+CACHE_CONTROL = "private, no-cache"
+
+
+def etag_for(names):
+    """
+    Strong ETag for the current request from the versions of `names`, or
+    from a {name: version} dict of versions the caller already has.
+    Path, query string and Accept are part of it, since they pick the body.
+    """
+    known = names if isinstance(names, dict) else {}
+    names = (EPOCH, *names)
+    missing = [n for n in names if n not in known]
+    versions = dict(known, **dict(zip(missing, current_versions(missing))))
+    parts = [request.full_path, request.headers.get("Accept", "")]
+    parts += [f"{n}={versions[n]}" for n in names]
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:32]
+
+
+def conditional(versions_for):
+    """
+    ETag / If-None-Match for a GET view. versions_for(**view_kwargs) returns
+    the version names the body depends on (see versions_controller), a
+    {name: version} dict when the versions are already known, or None
+    to skip (e.g. the view is about to answer 403). A matching If-None-Match
+    gets a 304 without running the view, so put this above @cached.
+
+    Versions are read before the view runs: a write in between leaves an
+    ETag older than the body, which only costs the client one extra 200.
+    """
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            names = versions_for(**kwargs)
+            if names is None:
+                return fn(*args, **kwargs)
+
+            etag = etag_for(names)
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                response = current_app.make_response(fn(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            response.headers["Cache-Control"] = CACHE_CONTROL
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,306 @@
+import itertools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+import database
+
+# ---------- SETTINGS ----------
+
+# "memory" (this process only) or "sqlite" (every worker on one host, through
+# an events table that each worker polls)
+EVENTS_BACKEND = os.environ.get("LIBRARY_EVENTS_BACKEND", "memory")
+EVENTS_DB_NAME = os.environ.get("LIBRARY_EVENTS_DB", "events.db")
+# events buffered per open stream; a client that falls this far behind is
+# dropped and has to resync
+EVENTS_QUEUE_SIZE = int(os.environ.get("LIBRARY_EVENTS_QUEUE", 256))
+# open streams per process. Each one holds a server thread for as long as it
+# is open, so this has to stay well below the threads a worker has, or every
+# other request queues behind the streams (gunicorn.conf.py sets threads - 2)
+EVENTS_MAX_SUBSCRIBERS = int(os.environ.get("LIBRARY_EVENTS_MAX_SUBSCRIBERS", 6))
+# idle streams get a comment line this often so proxies keep them open
+EVENTS_HEARTBEAT = float(os.environ.get("LIBRARY_EVENTS_HEARTBEAT", 15))
+# how often the sqlite broker looks for events published by other workers
+EVENTS_POLL_INTERVAL = float(os.environ.get("LIBRARY_EVENTS_POLL", 0.5))
+# seconds of events the sqlite broker keeps around for slow pollers
+EVENTS_RETENTION = 60
+
+# what a reconnecting EventSource waits before retrying (ms)
+RETRY_MS = 3000
+# Retry-After (s) on the 503 when the process is out of stream slots
+BUSY_RETRY_AFTER = 30
+
+logger = logging.getLogger("library.events")
+
+# put in a subscriber's queue when it is dropped
+DROPPED = object()
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class Subscriber:
+    def __init__(self, queue_size):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = False
+
+
+class Hub:
+    """
+    In-process fan-out: every published event is offered to each open
+    stream's bounded queue. Publishing never blocks on a slow client; a
+    full queue drops that subscriber instead.
+    """
+
+    def __init__(self, queue_size=EVENTS_QUEUE_SIZE, max_subscribers=None):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers or EVENTS_MAX_SUBSCRIBERS
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.delivered = 0
+        self.dropped = 0
+
+    def subscribe(self):
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise TooManySubscribers()
+            sub = Subscriber(self.queue_size)
+            self._subscribers.add(sub)
+            return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def count(self):
+        return len(self._subscribers)
+
+    def fan_out(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        delivered = 0
+        for sub in subscribers:
+            try:
+                sub.queue.put_nowait(event)
+                delivered += 1
+            except queue.Full:
+                self._drop(sub)
+        # publishers fan out from several threads at once
+        with self._lock:
+            self.delivered += delivered
+
+    def _drop(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+            if sub.dropped:
+                return
+            sub.dropped = True
+            self.dropped += 1
+        # throw away the backlog so the stream sees the drop straight away
+        try:
+            while True:
+                sub.queue.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            sub.queue.put_nowait(DROPPED)
+        except queue.Full:
+            pass  # a racing publish refilled it; the stream checks sub.dropped
+
+
+class MemoryBroker:
+    def __init__(self, hub):
+        self.hub = hub
+        self._ids = itertools.count(1)
+
+    def publish(self, event):
+        self.hub.fan_out({"id": next(self._ids), **event})
+
+    def has_listeners(self):
+        return self.hub.count() > 0
+
+    def close(self):
+        pass
+
+
+class SQLiteBroker:
+    """
+    Events are appended to a table in their own SQLite file, shared by every
+    worker process on the host. One thread per process polls it and fans new
+    rows out to that process's streams, so event ids and order agree across
+    workers.
+    """
+
+    # trim old events every this many publishes
+    PRUNE_EVERY = 100
+
+    def __init__(self, hub, path, poll_interval=EVENTS_POLL_INTERVAL):
+        self.hub = hub
+        self.path = path
+        self.poll_interval = poll_interval
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        conn = self._connection()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                at REAL NOT NULL,
+                body TEXT NOT NULL
+            )
+        """
+        )
+        conn.commit()
+        # only events published from now on
+        self._last_id = conn.execute(
+            "SELECT COALESCE(MAX(id), 0) FROM events"
+        ).fetchone()[0]
+        conn.close()
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="library-events", daemon=True
+        )
+        self._thread.start()
+
+    def _connection(self):
+        pool = database.get_pool(self.path)
+        return database.PooledConnection(pool.acquire(), pool.release)
+
+    def publish(self, event):
+        conn = self._connection()
+        conn.execute(
+            "INSERT INTO events (at, body) VALUES (?, ?)",
+            (time.time(), json.dumps(event)),
+        )
+        conn.commit()
+
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % self.PRUNE_EVERY == 0
+        if prune:
+            conn.execute(
+                "DELETE FROM events WHERE at < ?", (time.time() - EVENTS_RETENTION,)
+            )
+            conn.commit()
+        conn.close()
+
+    def has_listeners(self):
+        # streams in other workers read the table too; no cheap way to know
+        return True
+
+    def poll(self):
+        conn = self._connection()
+        rows = conn.execute(
+            "SELECT id, body FROM events WHERE id > ? ORDER BY id", (self._last_id,)
+        ).fetchall()
+        conn.close()
+        for row in rows:
+            self._last_id = row["id"]
+            self.hub.fan_out({"id": row["id"], **json.loads(row["body"])})
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Polling %s failed", self.path)
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+
+hub = Hub()
+broker = MemoryBroker(hub)
+
+
+def configure(backend_name, path=None, queue_size=None, max_subscribers=None):
+    global hub, broker
+    broker.close()
+    hub = Hub(queue_size or EVENTS_QUEUE_SIZE, max_subscribers)
+    if backend_name == "memory":
+        broker = MemoryBroker(hub)
+    elif backend_name == "sqlite":
+        broker = SQLiteBroker(hub, path or EVENTS_DB_NAME)
+    else:
+        raise ValueError(f"Unknown events backend: {backend_name}")
+
+
+def publish(event_type, **data):
+    """
+    Push an event to every open stream. Call after the write has committed;
+    a failure here is logged, never raised into the write path.
+    """
+    try:
+        broker.publish({"type": event_type, **data})
+    except Exception:
+        logger.exception("Publishing %s event failed", event_type)
+
+
+def has_listeners():
+    """
+    False when nothing can receive an event, so a publisher can skip the
+    work of building it.
+    """
+    return broker.has_listeners()
+
+
+def subscribe():
+    return hub.subscribe()
+
+
+def unsubscribe(sub):
+    hub.unsubscribe(sub)
+
+
+def stats():
+    return {
+        "subscribers": hub.count(),
+        "delivered": hub.delivered,
+        "dropped": hub.dropped,
+    }
+
+
+def _frame(event):
+    data = {k: v for k, v in event.items() if k not in ("id", "type")}
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(data)}\n\n"
+
+
+def event_stream(sub, heartbeat=None):
+    """
+    text/event-stream body for one subscriber. Ends with a `dropped` event
+    if the subscriber fell behind.
+    """
+    heartbeat = EVENTS_HEARTBEAT if heartbeat is None else heartbeat
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        while True:
+            try:
+                event = sub.queue.get(timeout=heartbeat)
+            except queue.Empty:
+                if sub.dropped:
+                    event = DROPPED
+                else:
+                    yield ": keepalive\n\n"
+                    continue
+            if event is DROPPED:
+                yield "event: dropped\ndata: {}\n\n"
+                return
+            yield _frame(event)
+    finally:
+        unsubscribe(sub)
+
+
+def init_app(app):
+    configure(
+        app.config.get("EVENTS_BACKEND", EVENTS_BACKEND),
+        app.config.get("EVENTS_DB_NAME", EVENTS_DB_NAME),
+        app.config.get("EVENTS_QUEUE_SIZE", EVENTS_QUEUE_SIZE),
+        app.config.get("EVENTS_MAX_SUBSCRIBERS", EVENTS_MAX_SUBSCRIBERS),
+    )
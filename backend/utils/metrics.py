@@ -0,0 +1,183 @@
+import re
+import threading
+import time
+
+from flask import g, has_app_context, request
+
+import database
+
+# seconds; Prometheus-style cumulative buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+QUERIES_PER_REQUEST_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50)
+
+# statement text is used as a label; keep it short and whitespace-free
+STATEMENT_LABEL_LENGTH = 160
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """
+    In-process metrics, rendered in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = {}  # (method, endpoint, status) -> Histogram
+            self.queries_per_request = {}  # endpoint -> Histogram
+            self.statements = {}  # sql label -> [count, seconds, rows]
+
+    def observe_request(self, method, endpoint, status, seconds, queries):
+        with self._lock:
+            key = (method, endpoint, str(status))
+            hist = self.requests.get(key)
+            if hist is None:
+                hist = self.requests[key] = Histogram(LATENCY_BUCKETS)
+            hist.observe(seconds)
+
+            hist = self.queries_per_request.get(endpoint)
+            if hist is None:
+                hist = Histogram(QUERIES_PER_REQUEST_BUCKETS)
+                self.queries_per_request[endpoint] = hist
+            hist.observe(queries)
+
+    def observe_statement(self, sql, seconds, rows):
+        label = statement_label(sql)
+        with self._lock:
+            entry = self.statements.get(label)
+            if entry is None:
+                entry = self.statements[label] = [0, 0.0, 0]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] += rows
+
+    def render(self, extra_gauges=()):
+        lines = []
+        with self._lock:
+            _histogram_lines(
+                lines,
+                "http_request_duration_seconds",
+                "Request latency by route",
+                (
+                    ({"method": m, "endpoint": e, "status": s}, h)
+                    for (m, e, s), h in sorted(self.requests.items())
+                ),
+            )
+            _histogram_lines(
+                lines,
+                "db_queries_per_request",
+                "SQL statements executed per request",
+                (
+                    ({"endpoint": e}, h)
+                    for e, h in sorted(self.queries_per_request.items())
+                ),
+            )
+
+            stmts = sorted(self.statements.items())
+            lines.append("# HELP db_statement_total Executions per SQL statement")
+            lines.append("# TYPE db_statement_total counter")
+            for label, (count, _, _) in stmts:
+                lines.append(f"db_statement_total{_labels({'sql': label})} {count}")
+            lines.append("# HELP db_statement_seconds_total Time per SQL statement")
+            lines.append("# TYPE db_statement_seconds_total counter")
+            for label, (_, seconds, _) in stmts:
+                lines.append(
+                    f"db_statement_seconds_total{_labels({'sql': label})} {seconds:.6f}"
+                )
+            lines.append("# HELP db_statement_rows_total Rows returned or changed")
+            lines.append("# TYPE db_statement_rows_total counter")
+            for label, (_, _, rows) in stmts:
+                lines.append(f"db_statement_rows_total{_labels({'sql': label})} {rows}")
+
+        for name, help_text, samples in extra_gauges:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(labels)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+def statement_label(sql):
+    label = re.sub(r"\s+", " ", sql).strip()
+    return label[:STATEMENT_LABEL_LENGTH]
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _histogram_lines(lines, name, help_text, series):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for labels, hist in series:
+        cumulative = 0
+        for bound, count in zip(hist.buckets, hist.counts):
+            cumulative += count
+            le = {**labels, "le": f"{bound}"}
+            lines.append(f"{name}_bucket{_labels(le)} {cumulative}")
+        lines.append(f'{name}_bucket{_labels({**labels, "le": "+Inf"})} {hist.count}')
+        lines.append(f"{name}_sum{_labels(labels)} {hist.sum:.6f}")
+        lines.append(f"{name}_count{_labels(labels)} {hist.count}")
+
+
+registry = Registry()
+
+
+# ---------- HOOKS ----------
+
+
+def _on_statement(sql, params, seconds, rows, conn):
+    registry.observe_statement(sql, seconds, rows)
+    if has_app_context():
+        g._metrics_queries = g.get("_metrics_queries", 0) + 1
+
+
+def _before_request():
+    g._metrics_start = time.perf_counter()
+    g._metrics_queries = 0
+
+
+def _after_request(response):
+    start = g.get("_metrics_start")
+    if start is not None:
+        endpoint = request.url_rule.rule if request.url_rule else "<unmatched>"
+        registry.observe_request(
+            request.method,
+            endpoint,
+            response.status_code,
+            time.perf_counter() - start,
+            g.get("_metrics_queries", 0),
+        )
+    return response
+
+
+def init_app(app):
+    registry.reset()
+    database.add_query_listener(_on_statement)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
@@ -0,0 +1,136 @@
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+
+# ---------- SETTINGS ----------
+
+# "scrypt" or "pbkdf2_sha256"; used for new hashes and rehash-on-login
+PASSWORD_SCHEME = os.environ.get("LIBRARY_PASSWORD_SCHEME", "scrypt")
+
+SCRYPT_N = int(os.environ.get("LIBRARY_SCRYPT_N", 2**14))
+SCRYPT_R = int(os.environ.get("LIBRARY_SCRYPT_R", 8))
+SCRYPT_P = int(os.environ.get("LIBRARY_SCRYPT_P", 1))
+
+PBKDF2_ITERATIONS = int(os.environ.get("LIBRARY_PBKDF2_ITERATIONS", 600000))
+
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+# at most HASH_WORKERS hashes run at once and HASH_MAX_PENDING more may
+# queue; anyone beyond that waits HASH_WAIT_TIMEOUT seconds and is then
+# turned away (HashingBusy) instead of piling up behind a login storm
+HASH_WORKERS = int(os.environ.get("LIBRARY_HASH_WORKERS", os.cpu_count() or 1))
+HASH_MAX_PENDING = int(os.environ.get("LIBRARY_HASH_MAX_PENDING", 32))
+HASH_WAIT_TIMEOUT = float(os.environ.get("LIBRARY_HASH_WAIT_TIMEOUT", 5))
+# Retry-After (s) sent with the 503 for a HashingBusy
+HASH_RETRY_AFTER = 2
+
+
+class HashingBusy(Exception):
+    pass
+
+
+# Stored formats:
+#   scrypt$<n>$<r>$<p>$<salt hex>$<key hex>
+#   pbkdf2_sha256$<iterations>$<salt hex>$<key hex>
+#   <64 hex chars>                      legacy unsalted sha256
+
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(
+        password.encode(),
+        salt=salt,
+        n=n,
+        r=r,
+        p=p,
+        maxmem=256 * n * r + 1024 * 1024,
+        dklen=KEY_BYTES,
+    )
+
+
+def _pbkdf2(password, salt, iterations):
+    return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+
+
+def _hash(password):
+    salt = os.urandom(SALT_BYTES)
+    if PASSWORD_SCHEME == "scrypt":
+        key = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+        return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${salt.hex()}${key.hex()}"
+    if PASSWORD_SCHEME == "pbkdf2_sha256":
+        key = _pbkdf2(password, salt, PBKDF2_ITERATIONS)
+        return f"pbkdf2_sha256${PBKDF2_ITERATIONS}${salt.hex()}${key.hex()}"
+    raise ValueError(f"Unknown password scheme: {PASSWORD_SCHEME}")
+
+
+def _verify(password, stored):
+    if not stored:
+        return False
+
+    parts = stored.split("$")
+    if parts[0] == "scrypt" and len(parts) == 6:
+        n, r, p = int(parts[1]), int(parts[2]), int(parts[3])
+        key = _scrypt(password, bytes.fromhex(parts[4]), n, r, p)
+        return hmac.compare_digest(key.hex(), parts[5])
+
+    if parts[0] == "pbkdf2_sha256" and len(parts) == 4:
+        key = _pbkdf2(password, bytes.fromhex(parts[2]), int(parts[1]))
+        return hmac.compare_digest(key.hex(), parts[3])
+
+    if len(stored) == 64:
+        legacy = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(legacy, stored)
+
+    return False
+
+
+def needs_rehash(stored):
+    """
+    True for legacy hashes and for hashes made with other settings.
+    """
+    parts = (stored or "").split("$")
+    if PASSWORD_SCHEME == "scrypt":
+        return parts[:4] != ["scrypt", str(SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P)]
+    return parts[:2] != ["pbkdf2_sha256", str(PBKDF2_ITERATIONS)]
+
+
+# ---------- BOUNDED WORKER POOL ----------
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = threading.BoundedSemaphore(HASH_WORKERS + HASH_MAX_PENDING)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=HASH_WORKERS, thread_name_prefix="password-hash"
+                )
+    return _executor
+
+
+def _offload(fn, *args):
+    # waiting and hashing take a while; hand the request's pooled connection
+    # back first so a burst of logins can't starve the pool
+    database.release_idle_request_connection()
+    if not _pending.acquire(timeout=HASH_WAIT_TIMEOUT):
+        raise HashingBusy("Too many password checks in progress")
+    try:
+        return _get_executor().submit(fn, *args).result()
+    finally:
+        _pending.release()
+
+
+def hash_password(password):
+    return _offload(_hash, password)
+
+
+def verify_password(password, stored):
+    return _offload(_verify, password, stored)
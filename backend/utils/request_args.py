@@ -0,0 +1,24 @@
+# Query-string parsing shared by the Flask and Quart routes; both pass their
+# own request.args. A missing or empty value is None, a malformed one raises
+# ValueError (the routes answer 400).
+
+
+def int_arg(args, name):
+    value = args.get(name)
+    if value is None or value == "":
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+
+
+def bool_arg(args, name):
+    value = args.get(name)
+    if value is None or value == "":
+        return None
+    if value.lower() in ("1", "true", "yes"):
+        return True
+    if value.lower() in ("0", "false", "no"):
+        return False
+    raise ValueError(f"{name} must be true or false")
@@ -0,0 +1,149 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from logging.handlers import RotatingFileHandler
+
+import database
+
+# ---------- SETTINGS ----------
+
+# statements slower than this (execute + fetch) are recorded
+SLOW_QUERY_MS = float(os.environ.get("LIBRARY_SLOW_QUERY_MS", 100))
+# how many recent slow statements /admin/slow-queries keeps
+SLOW_QUERY_BUFFER = int(os.environ.get("LIBRARY_SLOW_QUERY_BUFFER", 200))
+# JSON lines, rotated by size; empty string disables the file
+SLOW_QUERY_LOG = os.environ.get("LIBRARY_SLOW_QUERY_LOG", "slow_queries.log")
+SLOW_QUERY_LOG_BYTES = int(os.environ.get("LIBRARY_SLOW_QUERY_LOG_BYTES", 5 << 20))
+SLOW_QUERY_LOG_BACKUPS = int(os.environ.get("LIBRARY_SLOW_QUERY_LOG_BACKUPS", 3))
+
+# Bound values are logged as type and length only, since they include
+# emails, password hashes and the like. Set to 1 to log the values on a
+# development box; hash-like values and statements that touch a password
+# column stay masked even then.
+SLOW_QUERY_LOG_PARAMS = os.environ.get("LIBRARY_SLOW_QUERY_LOG_PARAMS", "0") == "1"
+
+# long text params (imported blobs) are cut to this length when logged
+PARAM_PREVIEW = 200
+
+# "scheme$...$<hex>" password hashes, or a bare digest
+HASH_LIKE = re.compile(r"\$[0-9a-fA-F]{16,}|^[0-9a-fA-F]{32,}$")
+PASSWORD_SQL = re.compile(r"password", re.IGNORECASE)
+
+
+def _redacted(value):
+    if value is None:
+        return None
+    if isinstance(value, (str, bytes)):
+        return f"<{type(value).__name__} {len(value)}>"
+    return f"<{type(value).__name__}>"
+
+
+def _param(value, show=False):
+    if not show or (isinstance(value, str) and HASH_LIKE.search(value)):
+        return _redacted(value)
+    if isinstance(value, bytes):
+        return f"<{len(value)} bytes>"
+    if isinstance(value, str) and len(value) > PARAM_PREVIEW:
+        return value[:PARAM_PREVIEW] + "..."
+    return value
+
+
+def _params(params, sql="", show=None):
+    show = SLOW_QUERY_LOG_PARAMS if show is None else show
+    show = show and not PASSWORD_SQL.search(sql)
+    if isinstance(params, dict):
+        return {k: _param(v, show) for k, v in params.items()}
+    if isinstance(params, (list, tuple)):
+        return [_param(v, show) for v in params]
+    return params  # executemany summary, e.g. "<500 rows>"
+
+
+def explain(conn, sql, params):
+    """
+    EXPLAIN QUERY PLAN detail lines, or None when there is nothing to
+    explain (executemany batches) or the plan can't be produced.
+    """
+    if not isinstance(params, (list, tuple, dict)):
+        return None
+    try:
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    except Exception:
+        return None
+    return [row[3] for row in rows]
+
+
+class SlowQueryLog:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.threshold = SLOW_QUERY_MS / 1000
+        self.log_params = SLOW_QUERY_LOG_PARAMS
+        self._entries = deque(maxlen=SLOW_QUERY_BUFFER)
+        self.logger = logging.getLogger("library.slow_queries")
+        self.logger.propagate = False
+        self._handler = None
+
+    def configure(self, threshold_ms, buffer_size, path, log_params=False):
+        with self._lock:
+            self.threshold = threshold_ms / 1000
+            self.log_params = log_params
+            self._entries = deque(maxlen=buffer_size)
+
+            if self._handler is not None:
+                self.logger.removeHandler(self._handler)
+                self._handler.close()
+                self._handler = None
+            if path:
+                self._handler = RotatingFileHandler(
+                    path,
+                    maxBytes=SLOW_QUERY_LOG_BYTES,
+                    backupCount=SLOW_QUERY_LOG_BACKUPS,
+                    delay=True,
+                )
+                self.logger.addHandler(self._handler)
+                self.logger.setLevel(logging.WARNING)
+
+    def record(self, sql, params, seconds, rows, conn):
+        if seconds < self.threshold:
+            return
+        entry = {
+            "at": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime()),
+            "ms": round(seconds * 1000, 3),
+            "rows": rows,
+            "sql": " ".join(sql.split()),
+            "params": _params(params, sql, self.log_params),
+            "plan": explain(conn, sql, params),
+        }
+        with self._lock:
+            self._entries.append(entry)
+        if self._handler is not None:
+            self.logger.warning(json.dumps(entry, default=str))
+
+    def entries(self, limit=None):
+        """
+        newest first
+        """
+        with self._lock:
+            entries = list(self._entries)
+        entries.reverse()
+        return entries[:limit] if limit else entries
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+slow_queries = SlowQueryLog()
+
+
+def init_app(app):
+    slow_queries.configure(
+        app.config.get("SLOW_QUERY_MS", SLOW_QUERY_MS),
+        app.config.get("SLOW_QUERY_BUFFER", SLOW_QUERY_BUFFER),
+        app.config.get("SLOW_QUERY_LOG", SLOW_QUERY_LOG),
+        app.config.get("SLOW_QUERY_LOG_PARAMS", SLOW_QUERY_LOG_PARAMS),
+    )
+    database.add_query_listener(slow_queries.record)
@@ -0,0 +1,92 @@
+from flask import Response, current_app, request, stream_with_context
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+# serialised rows per chunk written to the socket
+CHUNK_ROWS = 200
+
+
+def wants_ndjson(req=None):
+    """
+    ?format=ndjson or Accept: application/x-ndjson; req defaults to Flask's
+    request (the async routes pass Quart's).
+    """
+    req = request if req is None else req
+    if req.args.get("format") == "ndjson":
+        return True
+    best = req.accept_mimetypes.best_match(["application/json", NDJSON_MIMETYPE])
+    return best == NDJSON_MIMETYPE
+
+
+class ChunkWriter:
+    """
+    Serialises rows for a JSON array or NDJSON body, CHUNK_ROWS at a time
+    (the caller sends the opening "["): add() returns a chunk when one is
+    full, finish() whatever is left.
+    """
+
+    def __init__(self, ndjson, dumps):
+        self.ndjson = ndjson
+        self.dumps = dumps
+        self.buf = []
+        self.first = True
+
+    def add(self, row):
+        if self.ndjson:
+            self.buf.append(self.dumps(row) + "\n")
+        else:
+            self.buf.append(self.dumps(row) if self.first else "," + self.dumps(row))
+            self.first = False
+
+        if len(self.buf) >= CHUNK_ROWS:
+            chunk, self.buf = "".join(self.buf), []
+            return chunk
+        return None
+
+    def finish(self):
+        if not self.ndjson:
+            self.buf.append("]")
+        chunk, self.buf = "".join(self.buf), []
+        return chunk
+
+
+def _chunks(rows, ndjson):
+    writer = ChunkWriter(ndjson, current_app.json.dumps)
+    if not ndjson:
+        yield "["
+    for row in rows:
+        chunk = writer.add(row)
+        if chunk:
+            yield chunk
+    chunk = writer.finish()
+    if chunk:
+        yield chunk
+
+
+async def async_chunks(rows, ndjson, dumps):
+    """
+    _chunks for an async iterator of rows (the async app's streams).
+    """
+    writer = ChunkWriter(ndjson, dumps)
+    if not ndjson:
+        yield "["
+    async for row in rows:
+        chunk = writer.add(row)
+        if chunk:
+            yield chunk
+    chunk = writer.finish()
+    if chunk:
+        yield chunk
+
+
+def stream_rows(rows):
+    """
+    Stream an iterable of dicts as a JSON array (default) or NDJSON
+    (?format=ndjson or Accept: application/x-ndjson) without building
+    the whole body in memory.
+    """
+    ndjson = wants_ndjson()
+    return Response(
+        stream_with_context(_chunks(rows, ndjson)),
+        mimetype=NDJSON_MIMETYPE if ndjson else "application/json",
+    )
@@ -0,0 +1,14 @@
+"""
+Production entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Any other WSGI server can serve `wsgi:app` too; the schema is then created
+or migrated here, in every worker, unless LIBRARY_INIT_DB=0.
+"""
+
+import os
+
+from app import create_app
+
+app = create_app(init_db=os.environ.get("LIBRARY_INIT_DB", "1") != "0")
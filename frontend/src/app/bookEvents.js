@@ -0,0 +1,52 @@
+import axiosClient from "./axiosClient";
+
+// GET /books/events  (login_required, text/event-stream)
+// Calls onChange() when books change on the server; bursts are coalesced
+// into one call. The caller refetches with the delta sync in bookSync.js,
+// which is also what makes a reconnect or a `dropped` stream safe.
+// Returns a function that closes the stream.
+export function subscribeBookEvents(
+  onChange,
+  { delayMs = 250, busyRetryMs = 30000 } = {}
+) {
+  let source = null;
+  let timer = null;
+  let reopenTimer = null;
+  let connected = false;
+
+  const schedule = () => {
+    if (timer) return;
+    timer = setTimeout(() => {
+      timer = null;
+      onChange();
+    }, delayMs);
+  };
+
+  const open = () => {
+    source = new EventSource(`${axiosClient.defaults.baseURL}/books/events`, {
+      withCredentials: true,
+    });
+    ["availability", "book", "catalogue", "dropped"].forEach((type) =>
+      source.addEventListener(type, schedule)
+    );
+    // EventSource reconnects by itself; catch up on whatever we missed
+    source.addEventListener("open", () => {
+      if (connected) schedule();
+      connected = true;
+    });
+    // ...except after an error status, e.g. the 503 when the server has no
+    // stream slots left: try again later
+    source.addEventListener("error", () => {
+      if (source.readyState !== EventSource.CLOSED) return;
+      reopenTimer = setTimeout(open, busyRetryMs);
+    });
+  };
+
+  open();
+
+  return () => {
+    clearTimeout(timer);
+    clearTimeout(reopenTimer);
+    source.close();
+  };
+}
@@ -0,0 +1,36 @@
+import axiosClient from "./axiosClient";
+
+// GET /books/changes?since=<version>  (login_required)
+// Pulls every page of changes after `since` (0 = the whole catalogue).
+export async function fetchBookChanges(since = 0) {
+  let version = since;
+  const books = [];
+  const deleted = [];
+
+  for (;;) {
+    let res;
+    try {
+      res = await axiosClient.get("/books/changes", {
+        params: { since: version },
+      });
+    } catch (err) {
+      // 400 when our version is ahead of the server (e.g. database reset)
+      if (since > 0 && err.response?.status === 400) return fetchBookChanges(0);
+      throw err;
+    }
+    books.push(...(res.data?.books || []));
+    deleted.push(...(res.data?.deleted || []));
+    version = res.data?.version ?? version;
+    if (!res.data?.has_more) break;
+  }
+
+  return { full: since === 0, books, deleted, version };
+}
+
+// Merge a fetchBookChanges() result into a list of books (sorted by id).
+export function applyBookChanges(items, { full, books, deleted }) {
+  const byId = new Map(full ? [] : items.map((b) => [b.id, b]));
+  books.forEach((b) => byId.set(b.id, b));
+  deleted.forEach((id) => byId.delete(id));
+  return [...byId.values()].sort((a, b) => a.id - b.id);
+}
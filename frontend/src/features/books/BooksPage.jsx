@@ -7,12 +7,14 @@ import {
   updateBookById,
   deleteBookById,
   toggleCheckoutReturn,
+  placeHold,
+  fetchMyHolds,
 } from "./booksSlice";
 import BookModal from "./BookModal";
 
 export default function BooksPage() {
   const dispatch = useDispatch();
-  const { items, isLoading } = useSelector((s) => s.books);
+  const { items, holds, isLoading } = useSelector((s) => s.books);
   const { role } = useSelector((s) => s.auth);
 
   // Admin can CRUD. Members (librarian treated as member) can only checkout/return + view/search.
@@ -27,6 +29,7 @@ export default function BooksPage() {
 
   useEffect(() => {
     dispatch(fetchBooks());
+    dispatch(fetchMyHolds());
   }, [dispatch]);
 
   const filtered = useMemo(() => {
@@ -93,6 +96,11 @@ export default function BooksPage() {
     dispatch(fetchBooks());
   };
 
+  const onHold = (book) => {
+    if (!canBorrow) return toast.error("You don’t have permission.");
+    dispatch(placeHold(book.id));
+  };
+
   return (
     <div className="space-y-5">
       {/* Header */}
@@ -106,7 +114,10 @@ export default function BooksPage() {
 
         <div className="flex gap-2">
           <button
-            onClick={() => dispatch(fetchBooks())}
+            onClick={() => {
+              dispatch(fetchBooks());
+              dispatch(fetchMyHolds());
+            }}
             className="rounded-2xl border border-border bg-card/60 px-4 py-2 font-semibold hover:bg-card/80 transition"
           >
             Refresh
@@ -175,6 +186,14 @@ export default function BooksPage() {
 
           {filtered.map((b) => {
             const available = Number(b.available) === 1;
+            const hold = holds[b.id];
+            // our copy is waiting for us: checking out collects it
+            const ready = hold?.status === "ready";
+            const borrowLabel = available
+              ? "Check out"
+              : ready
+              ? "Collect"
+              : "Return";
             return (
               <div key={b.id} className="px-5 py-4">
                 {/* Desktop row */}
@@ -205,14 +224,27 @@ export default function BooksPage() {
                         onClick={() => onToggleBorrow(b)}
                         className={`rounded-xl px-3 py-2 text-sm font-semibold transition
                           ${
-                            available
+                            available || ready
                               ? "bg-indigo-600 text-white hover:bg-indigo-700 dark:bg-indigo-400 dark:text-slate-900 dark:hover:bg-indigo-300"
                               : "bg-amber-600 text-white hover:bg-amber-700 dark:bg-amber-400 dark:text-slate-900 dark:hover:bg-amber-300"
                           }`}
                       >
-                        {available ? "Check out" : "Return"}
+                        {borrowLabel}
+                      </button>
+                    )}
+                    {canBorrow && !available && !hold && (
+                      <button
+                        onClick={() => onHold(b)}
+                        className="rounded-xl border border-border bg-background/30 px-3 py-2 text-sm font-semibold hover:bg-background/50 transition"
+                      >
+                        Hold
                       </button>
                     )}
+                    {hold?.status === "waiting" && (
+                      <span className="self-center text-xs text-foreground/60">
+                        #{hold.position} in queue
+                      </span>
+                    )}
 
                     {/* Admin-only CRUD */}
                     {canManage && (
@@ -256,14 +288,27 @@ export default function BooksPage() {
                         onClick={() => onToggleBorrow(b)}
                         className={`flex-1 rounded-2xl px-3 py-2 text-sm font-semibold transition
                           ${
-                            available
+                            available || ready
                               ? "bg-indigo-600 text-white dark:bg-indigo-400 dark:text-slate-900"
                               : "bg-amber-600 text-white dark:bg-amber-400 dark:text-slate-900"
                           }`}
                       >
-                        {available ? "Check out" : "Return"}
+                        {borrowLabel}
+                      </button>
+                    )}
+                    {canBorrow && !available && !hold && (
+                      <button
+                        onClick={() => onHold(b)}
+                        className="flex-1 rounded-2xl border border-border bg-background/30 px-3 py-2 text-sm font-semibold"
+                      >
+                        Hold
                       </button>
                     )}
+                    {hold?.status === "waiting" && (
+                      <span className="self-center text-xs text-foreground/60">
+                        #{hold.position} in queue
+                      </span>
+                    )}
 
                     {canManage && (
                       <>
@@ -1,22 +1,27 @@
 import { createAsyncThunk, createSlice } from "@reduxjs/toolkit";
 import toast from "react-hot-toast";
 import axiosClient from "../../app/axiosClient";
+import { applyBookChanges, fetchBookChanges } from "../../app/bookSync";
 import { fetchUserHistory } from "../history/historySlice";
 
 const initialState = {
   items: [],
+  // catalogue version of `items`; 0 = not loaded yet
+  version: 0,
+  // this user's open holds by book id: { status, position, expires_at }
+  holds: {},
   selected: null,
   isLoading: false,
   error: null,
 };
 
-// GET /books  (login_required)
+// GET /books/changes  (login_required)
+// First call loads the catalogue; later calls only fetch what changed.
 export const fetchBooks = createAsyncThunk(
   "books/fetchBooks",
-  async (_, { rejectWithValue }) => {
+  async (_, { rejectWithValue, getState }) => {
     try {
-      const res = await axiosClient.get("/books");
-      return Array.isArray(res.data) ? res.data : [];
+      return await fetchBookChanges(getState().books.version);
     } catch (err) {
       const msg =
         err.response?.data?.message ||
@@ -122,6 +127,8 @@ export const checkoutBookById = createAsyncThunk(
       const res = await axiosClient.post(`/books/checkout/${bookId}`);
       toast.success(res.data?.message || "Book checked out");
       dispatch(fetchBooks());
+      // a checkout also collects a ready hold
+      dispatch(fetchMyHolds());
       return bookId;
     } catch (err) {
       const msg =
@@ -135,6 +142,47 @@ export const checkoutBookById = createAsyncThunk(
   }
 );
 
+// GET /books/holds  (login_required)
+// The user's open holds; a "ready" one has a copy set aside to collect.
+export const fetchMyHolds = createAsyncThunk(
+  "books/fetchMyHolds",
+  async (_, { rejectWithValue }) => {
+    try {
+      const res = await axiosClient.get("/books/holds");
+      return res.data || [];
+    } catch (err) {
+      const msg =
+        err.response?.data?.message ||
+        err.response?.data?.error ||
+        err.message ||
+        "Failed to load holds";
+      return rejectWithValue(msg);
+    }
+  }
+);
+
+// POST /books/:id/hold  (login_required)
+// Joins the queue for a book whose copies are all out.
+export const placeHold = createAsyncThunk(
+  "books/placeHold",
+  async (bookId, { rejectWithValue, dispatch }) => {
+    try {
+      const res = await axiosClient.post(`/books/${bookId}/hold`);
+      toast.success(`Hold placed (#${res.data?.position} in the queue)`);
+      dispatch(fetchMyHolds());
+      return res.data;
+    } catch (err) {
+      const msg =
+        err.response?.data?.message ||
+        err.response?.data?.error ||
+        err.message ||
+        "Failed to place hold";
+      toast.error(msg);
+      return rejectWithValue(msg);
+    }
+  }
+);
+
 // POST /books/return/:entry_id/:book_id  (login_required)
 export const returnBookByEntry = createAsyncThunk(
   "books/returnBookByEntry",
@@ -169,8 +217,10 @@ export const toggleCheckoutReturn = createAsyncThunk(
       if (!bookId) return rejectWithValue("Invalid book.");
       if (!myId) return rejectWithValue("Not authenticated.");
 
-      // checkout
-      if (available) {
+      // checkout, or collect the copy set aside for our hold (the book
+      // itself shows as unavailable while it waits for us)
+      const ready = state?.books?.holds?.[bookId]?.status === "ready";
+      if (available || ready) {
         await dispatch(checkoutBookById(bookId)).unwrap();
         return { action: "checkout", bookId };
       }
@@ -238,7 +288,8 @@ const booksSlice = createSlice({
       })
       .addCase(fetchBooks.fulfilled, (state, action) => {
         state.isLoading = false;
-        state.items = Array.isArray(action.payload) ? action.payload : [];
+        state.items = applyBookChanges(state.items, action.payload);
+        state.version = action.payload.version;
       })
       .addCase(fetchBooks.rejected, (state, action) => {
         state.isLoading = false;
@@ -296,6 +347,12 @@ const booksSlice = createSlice({
         state.error = action.payload || "Failed to delete book";
       })
 
+      .addCase(fetchMyHolds.fulfilled, (state, action) => {
+        state.holds = Object.fromEntries(
+          action.payload.map((h) => [h.book_id, h])
+        );
+      })
+
       // checkout/return/toggle
       .addCase(checkoutBookById.pending, (state) => {
         state.isLoading = true;
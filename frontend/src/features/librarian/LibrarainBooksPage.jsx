@@ -5,6 +5,7 @@ import {
   fetchLibrarianBooks,
   librarianToggleCheckoutReturn,
 } from "./librarianBooksSlice";
+import { subscribeBookEvents } from "../../app/bookEvents";
 
 export default function LibrarianBooksPage() {
   const dispatch = useDispatch();
@@ -21,6 +22,11 @@ export default function LibrarianBooksPage() {
     dispatch(fetchLibrarianBooks());
   }, [dispatch, canUse]);
 
+  useEffect(() => {
+    if (!canUse) return;
+    return subscribeBookEvents(() => dispatch(fetchLibrarianBooks()));
+  }, [dispatch, canUse]);
+
   useEffect(() => {
     if (error) toast.error(error);
   }, [error]);
@@ -149,7 +155,9 @@ export default function LibrarianBooksPage() {
                       <AvailabilityPill available={b.available} />
                       <div>
                         <p className="font-semibold">{b.title}</p>
-                        <p className="text-xs text-foreground/60">#{b.id}</p>
+                        <p className="text-xs text-foreground/60">
+                          #{b.id} · {copiesLabel(b)}
+                        </p>
                       </div>
                     </div>
                   </div>
@@ -185,7 +193,9 @@ export default function LibrarianBooksPage() {
                     <div>
                       <p className="text-base font-semibold">{b.title}</p>
                       <p className="text-sm text-foreground/70">{b.author}</p>
-                      <p className="text-xs text-foreground/60">#{b.id}</p>
+                      <p className="text-xs text-foreground/60">
+                        #{b.id} · {copiesLabel(b)}
+                      </p>
                     </div>
                     <AvailabilityPill available={b.available} />
                   </div>
@@ -216,6 +226,13 @@ export default function LibrarianBooksPage() {
   );
 }
 
+// "2 of 5 copies" from the per-book counters
+function copiesLabel(b) {
+  const total = b.total_copies ?? 1;
+  const onShelf = b.available_copies ?? (Number(b.available) === 1 ? 1 : 0);
+  return `${onShelf} of ${total} ${total === 1 ? "copy" : "copies"}`;
+}
+
 function AvailabilityPill({ available }) {
   const isAvail = Number(available) === 1;
   return (
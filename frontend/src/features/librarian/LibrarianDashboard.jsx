@@ -8,6 +8,7 @@ import {
   returnBookByEntry,
 } from "../books/booksSlice";
 import { fetchUserHistory } from "../history/historySlice";
+import { subscribeBookEvents } from "../../app/bookEvents";
 
 export default function LibrarianDashboardPage() {
   const dispatch = useDispatch();
@@ -30,6 +31,12 @@ export default function LibrarianDashboardPage() {
     dispatch(fetchBooks());
   }, [dispatch]);
 
+  // live availability instead of refetching after our own actions only
+  useEffect(
+    () => subscribeBookEvents(() => dispatch(fetchBooks())),
+    [dispatch]
+  );
+
   useEffect(() => {
     if (!myUserId) return;
     dispatch(fetchUserHistory(myUserId));
@@ -40,8 +47,13 @@ export default function LibrarianDashboardPage() {
   }, [error]);
 
   const stats = useMemo(() => {
-    const total = books.length;
-    const available = books.filter((b) => Number(b.available) === 1).length;
+    // counted in copies; rows from before copies existed count as one
+    const total = books.reduce((n, b) => n + (b.total_copies ?? 1), 0);
+    const available = books.reduce(
+      (n, b) =>
+        n + (b.available_copies ?? (Number(b.available) === 1 ? 1 : 0)),
+      0
+    );
     const checkedOut = total - available;
 
     const myActive = history.filter((h) => !h.return_date).length;
@@ -134,7 +146,7 @@ export default function LibrarianDashboardPage() {
 
       {/* Stats */}
       <div className="grid gap-4 md:grid-cols-2 xl:grid-cols-5">
-        <StatCard title="Total books" value={stats.total} />
+        <StatCard title="Total copies" value={stats.total} />
         <StatCard
           title="Available now"
           value={stats.available}
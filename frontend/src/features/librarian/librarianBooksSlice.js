@@ -1,20 +1,23 @@
 import { createAsyncThunk, createSlice } from "@reduxjs/toolkit";
 import toast from "react-hot-toast";
 import axiosClient from "../../app/axiosClient";
+import { applyBookChanges, fetchBookChanges } from "../../app/bookSync";
 
 const initialState = {
   books: [],
+  // catalogue version of `books`; 0 = not loaded yet
+  version: 0,
   isLoading: false,
   error: null,
 };
 
-// GET /books  (login_required)
+// GET /books/changes  (login_required)
+// First call loads the catalogue; later calls only fetch what changed.
 export const fetchLibrarianBooks = createAsyncThunk(
   "librarianBooks/fetchLibrarianBooks",
-  async (_, { rejectWithValue }) => {
+  async (_, { rejectWithValue, getState }) => {
     try {
-      const res = await axiosClient.get("/books");
-      return Array.isArray(res.data) ? res.data : [];
+      return await fetchBookChanges(getState().librarianBooks.version);
     } catch (err) {
       const msg =
         err.response?.data?.message ||
@@ -120,7 +123,8 @@ const librarianBooksSlice = createSlice({
       .addCase(fetchLibrarianBooks.pending, pending)
       .addCase(fetchLibrarianBooks.fulfilled, (state, action) => {
         state.isLoading = false;
-        state.books = Array.isArray(action.payload) ? action.payload : [];
+        state.books = applyBookChanges(state.books, action.payload);
+        state.version = action.payload.version;
       })
       .addCase(fetchLibrarianBooks.rejected, rejected)
 